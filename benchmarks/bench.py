@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks labelSHARK on a synthetic project.
+
+The full plugin run and every approach on its own are measured by their throughput, the number of MongoDB
+queries per commit and the peak resident memory. The results can be stored as JSON and compared with the
+results of another revision, e.g.:
+
+    python benchmarks/bench.py --commits 5000 --output new.json --compare old.json -- --pipeline
+
+Arguments after -- are passed to the plugin. By default an in-memory mongomock database is used, the queries are
+then counted per collection method call. With a MongoDB URI, e.g., mongodb://localhost:27017, every started
+command is counted.
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'labelSHARK'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mongoengine import connect  # noqa: E402
+from pymongo import monitoring  # noqa: E402
+
+import smartshark_plugin  # noqa: E402
+from core import LabelSHARK  # noqa: E402
+from stats import CommandCounter  # noqa: E402
+from datasource import data_source  # noqa: E402
+from approaches.util.labelutils import its_cache  # noqa: E402
+from approaches.util.issuestore import issue_store  # noqa: E402
+from approaches.util.commitcontext import file_paths, commit_contexts  # noqa: E402
+from approaches.util.bzindex import bz_index  # noqa: E402
+from approaches.util.messageflags import message_flags  # noqa: E402
+from synthetic import SyntheticProject  # noqa: E402
+
+log = logging.getLogger('benchmark')
+
+# collection methods that send one query to the MongoDB, mongomock does not notify the command listeners
+MONGOMOCK_QUERY_METHODS = ('find', 'find_one', 'aggregate', 'count_documents', 'estimated_document_count', 'distinct',
+                           'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one', 'delete_one',
+                           'delete_many', 'bulk_write', 'find_one_and_update')
+
+
+def count_mongomock_queries(counter):
+    """Counts the calls of the query methods of the mongomock collections in the counter.
+
+    Calls from within another query method, e.g., find_one calling find, are not counted again.
+    """
+    import mongomock.collection
+    local = threading.local()
+
+    def wrap(method):
+        def wrapper(self, *args, **kwargs):
+            if getattr(local, 'active', False):
+                return method(self, *args, **kwargs)
+            counter.started(None)
+            local.active = True
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                local.active = False
+        return wrapper
+
+    for name in MONGOMOCK_QUERY_METHODS:
+        if hasattr(mongomock.collection.Collection, name):
+            setattr(mongomock.collection.Collection, name, wrap(getattr(mongomock.collection.Collection, name)))
+
+
+def reset_peak_rss():
+    """Resets the peak resident memory of the process, if the kernel supports it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of the process in MiB."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # the maximum of the whole process, in KiB on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+def clear_caches():
+    """Clears the caches that the approaches share, so that every phase starts cold."""
+    for cache in (its_cache, issue_store, file_paths, commit_contexts, bz_index, message_flags):
+        cache.clear()
+
+
+class Phase(object):
+    """Measures the time, queries and peak memory of a benchmark phase."""
+
+    def __init__(self, counter, name):
+        self._counter = counter
+        self.name = name
+        self.result = None
+
+    def __enter__(self):
+        clear_caches()
+        self._rss_reset = reset_peak_rss()
+        self._queries = sum(self._counter.counts.values())
+        self._start = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return False
+        elapsed = timeit.default_timer() - self._start
+        queries = sum(self._counter.counts.values()) - self._queries
+        commits = self.commits
+        self.result = OrderedDict([('commits', commits), ('time', round(elapsed, 5)),
+                                   ('commits_per_second', round(commits / elapsed, 3) if elapsed > 0 else 0.0),
+                                   ('queries', queries),
+                                   ('queries_per_commit', round(queries / commits, 3) if commits else 0.0),
+                                   ('peak_rss_mb', round(peak_rss_mb(), 2)),
+                                   ('peak_rss_reset', self._rss_reset)])
+        return False
+
+
+def import_approaches(approaches):
+    if approaches == 'all':
+        basepath = os.path.join(os.path.dirname(os.path.abspath(smartshark_plugin.__file__)), 'approaches')
+        approaches = ','.join(app[:-3] for app in sorted(os.listdir(basepath))
+                              if app.endswith('.py') and app != '__init__.py')
+    for app in approaches.split(','):
+        __import__('approaches.{}'.format(app))
+
+
+def bench_approach(app, config, plugin_args, vcs_id):
+    """Labels every commit with a fresh instance of the approach without writing the labels.
+
+    :return: number of labeled commits
+    """
+    labelshark = LabelSHARK()
+    labelshark.approaches = [type(app)()]
+    labelshark.configure(config)
+    count = 0
+    for page in data_source.commit_pages(vcs_id, labelshark.projection(), plugin_args.page_size):
+        for i in range(0, len(page), plugin_args.batch_size):
+            batch = page[i:i + plugin_args.batch_size]
+            labelshark.label_batch(batch)
+            count += len(batch)
+    return count
+
+
+def run(args, plugin_argv):
+    counter = CommandCounter()
+    mongomock = args.host.startswith('mongomock://')
+    if mongomock:
+        count_mongomock_queries(counter)
+    else:
+        # the listener has to be registered before the connection is created
+        monitoring.register(counter)
+    connect(args.database, host=args.host)
+
+    project = SyntheticProject(name=args.project_name, commits=args.commits, issues=args.issues, files=args.files,
+                               seed=args.seed)
+    generate_start = timeit.default_timer()
+    documents = project.generate()
+    log.info('generated %s in %.2fs', ', '.join('{} {}'.format(k, v) for k, v in documents.items()),
+             timeit.default_timer() - generate_start)
+
+    plugin_args = smartshark_plugin.build_parser().parse_args(
+        ['-n', args.project_name, '-DB', args.database, '--approaches', args.approaches] + plugin_argv)
+    results = OrderedDict([('host', 'mongomock' if mongomock else 'mongodb'), ('documents', documents),
+                           ('plugin_args', plugin_argv), ('phases', OrderedDict())])
+
+    # the plugin connects with the same settings and reuses the connection, which keeps the mongomock data
+    with Phase(counter, 'main') as phase:
+        smartshark_plugin.main(plugin_args, uri=args.host)
+        phase.commits = documents['commit']
+    results['phases']['main'] = phase.result
+    log.info('main: %s', phase.result)
+
+    import_approaches(args.approaches)
+    project_id = data_source.project(args.project_name).id
+    vcs = data_source.vcs_system(project_id)
+    config = dict(vars(plugin_args))
+    config['project_id'] = project_id
+    config['vcs_system_id'] = vcs.id
+    config['its'] = data_source.issue_systems(project_id)
+    for app in LabelSHARK.approaches:
+        name = app.__module__.replace('approaches.', '')
+        with Phase(counter, name) as phase:
+            phase.commits = bench_approach(app, config, plugin_args, vcs.id)
+        results['phases'][name] = phase.result
+        log.info('%s: %s', name, phase.result)
+    return results
+
+
+def compare(old, new):
+    """Logs the relative change of every metric of the phases of both results."""
+    log.info('{:<16} {:<20} {:>14} {:>14} {:>9}'.format('phase', 'metric', 'old', 'new', 'change'))
+    for name, phase in new['phases'].items():
+        old_phase = old['phases'].get(name)
+        if old_phase is None:
+            continue
+        for metric in ('commits_per_second', 'queries_per_commit', 'peak_rss_mb'):
+            before, after = old_phase[metric], phase[metric]
+            change = '{:+.1f}%'.format((after - before) / before * 100) if before else ''
+            log.info('{:<16} {:<20} {:>14} {:>14} {:>9}'.format(name, metric, before, after, change))
+
+
+def build_parser():
+    """Returns the parser of the benchmark arguments."""
+    parser = argparse.ArgumentParser(description='Benchmark labelSHARK on a synthetic project, arguments after -- '
+                                                 'are passed to the plugin.')
+    parser.add_argument('--host', help='mongomock://localhost or the URI of a MongoDB whose database is dropped.',
+                        default='mongomock://localhost')
+    parser.add_argument('--database', help='Name of the benchmark database.', default='labelshark_benchmark')
+    parser.add_argument('--project-name', help='Name of the synthetic project.', default='benchmark')
+    parser.add_argument('--commits', help='Number of commits.', default=1000, type=int)
+    parser.add_argument('--issues', help='Number of issues.', default=500, type=int)
+    parser.add_argument('--files', help='Number of files.', default=200, type=int)
+    parser.add_argument('--seed', help='Seed of the synthetic project.', default=1, type=int)
+    parser.add_argument('--approaches', help='Comma separated list of approaches or all.', default='all')
+    parser.add_argument('--output', help='Path of a JSON file to which the results are written.', default=None)
+    parser.add_argument('--compare', help='Path of the JSON results of an earlier benchmark to compare with.',
+                        default=None)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    plugin_argv = []
+    if '--' in argv:
+        plugin_argv = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # the progress of the plugin and the errors about issues that the approaches cannot label would drown the results
+    if '-ll' not in plugin_argv and '--log_level' not in plugin_argv:
+        plugin_argv = plugin_argv + ['--log_level', 'CRITICAL']
+    logging.getLogger('labelSHARK').setLevel(plugin_argv[plugin_argv.index('--log_level' if '--log_level' in plugin_argv
+                                                                           else '-ll') + 1])
+
+    results = run(args, plugin_argv)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Generates synthetic smartSHARK projects for the labelSHARK benchmarks.
+
+The documents are written directly with pymongo into the database of the current mongoengine connection, which
+can be a local mongod or mongomock. The database should only be used for benchmarks, because the generator drops
+the collections of the smartSHARK models before it writes a project.
+"""
+
+import random
+
+from bson import ObjectId
+from pycoshark.mongomodels import Project, VCSSystem, IssueSystem, Commit, Issue, Event, FileAction, File, Hunk, \
+    CodeEntityState, Refactoring
+
+ISSUE_SYSTEM_URLS = ['https://issues.apache.org/jira/projects/{}', 'https://bz.apache.org/bugzilla/{}',
+                     'https://api.github.com/repos/{}/issues']
+ISSUE_TYPES = ['Bug', 'bug', 'New Feature', 'Improvement', 'Task', 'Wish']
+ISSUE_STATUS = ['resolved', 'closed', 'Closed', 'open', 'in progress']
+ISSUE_RESOLUTIONS = ['fixed', 'Fixed', 'done', None, "won't fix", 'duplicate']
+EVENT_STATUS = ['status', 'Status', 'resolution', 'Resolution', 'comment', 'assignee']
+EVENT_VALUES = ['Resolved', 'closed', 'fixed', 'Fixed', 'open', 'reopened']
+MESSAGES = ['refactor the parser', 'Fix NPE in reader', 'rename method getValue', 'moved icons to resources',
+            'simplify the configuration', 'add feature for the export', 'update dependencies', 'extract method',
+            'Merge branch master', 'fix typo in variable name']
+PATHS = ['src/main/java/org/example/{}/Service{}.java', 'src/test/java/org/example/{}/Service{}Test.java',
+         'src/main/java/org/example/{}/util/Helper{}.java', 'docs/{}/chapter{}.md', 'src/main/resources/{}/{}.xml']
+IMPORTS = [['org.junit.Test', 'java.util.List'], ['org.mockito.Mockito'], ['java.util.List', 'java.io.File'],
+           ['org.example.util.Helper']]
+HUNK_LINES = ['+    int value = compute(input);', '-    int value = compute(input, 0);', '     return value;',
+              '+    // TODO handle the empty case', '-    // FIXME this is slow', '+    // XXX remove after the release',
+              '+    /**', '+     * Returns the value of the input.', '+     */', '-    /* old block comment */',
+              '+    String s = "// not a comment";', '+    call(); // inline comment', '+', '-    }', '+    }',
+              '     @Override']
+
+
+class SyntheticProject(object):
+    """Sizes of a synthetic project, the documents are generated deterministically from the seed."""
+
+    def __init__(self, name='benchmark', commits=1000, issues=500, parent_ratio=0.3, events_per_issue=4,
+                 files=200, file_actions_per_commit=4, hunks_per_file_action=3, hunk_lines=20, state_ratio=0.5,
+                 refactoring_ratio=0.2, seed=1):
+        """
+        :param str name: name of the project
+        :param int commits: number of commits
+        :param int issues: number of issues, spread over a JIRA, a Bugzilla and a GitHub issue system
+        :param float parent_ratio: share of issues with a parent issue
+        :param int events_per_issue: maximum number of events per issue
+        :param int files: number of files
+        :param int file_actions_per_commit: maximum number of file actions per commit
+        :param int hunks_per_file_action: maximum number of hunks per file action
+        :param int hunk_lines: maximum number of lines per hunk
+        :param float state_ratio: share of file actions with a file code entity state
+        :param float refactoring_ratio: share of commits with a refactoring
+        :param int seed: seed of the random generator
+        """
+        self.name = name
+        self.commits = commits
+        self.issues = issues
+        self.parent_ratio = parent_ratio
+        self.events_per_issue = events_per_issue
+        self.files = files
+        self.file_actions_per_commit = file_actions_per_commit
+        self.hunks_per_file_action = hunks_per_file_action
+        self.hunk_lines = hunk_lines
+        self.state_ratio = state_ratio
+        self.refactoring_ratio = refactoring_ratio
+        self.seed = seed
+
+    def generate(self, chunk_size=10000):
+        """Drops the collections of the smartSHARK models and writes the project.
+
+        :return: dict with the number of documents per collection
+        """
+        rnd = random.Random(self.seed)
+        self._drop()
+        docs = {model: [] for model in (Project, VCSSystem, IssueSystem, Commit, Issue, Event, FileAction, File,
+                                        Hunk, CodeEntityState, Refactoring)}
+
+        project_id = ObjectId()
+        vcs_id = ObjectId()
+        docs[Project].append({'_id': project_id, 'name': self.name})
+        docs[VCSSystem].append({'_id': vcs_id, 'project_id': project_id, 'repository_type': 'git',
+                                'url': 'https://github.com/example/{}.git'.format(self.name)})
+        its_ids = []
+        for url in ISSUE_SYSTEM_URLS:
+            its_ids.append(ObjectId())
+            docs[IssueSystem].append({'_id': its_ids[-1], 'project_id': project_id, 'url': url.format(self.name)})
+
+        issue_ids = []
+        for i in range(self.issues):
+            issue_id = ObjectId()
+            parent_id = rnd.choice(issue_ids) if issue_ids and rnd.random() < self.parent_ratio else None
+            docs[Issue].append({'_id': issue_id, 'issue_system_id': its_ids[i % len(its_ids)],
+                                'external_id': str(i), 'title': 'Issue {}'.format(i),
+                                'desc': 'Description of issue {} with some words.'.format(i),
+                                'issue_type': rnd.choice(ISSUE_TYPES), 'status': rnd.choice(ISSUE_STATUS),
+                                'resolution': rnd.choice(ISSUE_RESOLUTIONS),
+                                'issue_type_verified': rnd.choice(['bug', 'improvement', None]),
+                                'parent_issue_id': parent_id})
+            issue_ids.append(issue_id)
+            for j in range(rnd.randint(0, self.events_per_issue)):
+                docs[Event].append({'_id': ObjectId(), 'issue_id': issue_id, 'external_id': '{}_{}'.format(i, j),
+                                    'status': rnd.choice(EVENT_STATUS), 'new_value': rnd.choice(EVENT_VALUES)})
+
+        file_ids = []
+        for i in range(self.files):
+            file_ids.append(ObjectId())
+            path = rnd.choice(PATHS).format('module{}'.format(i % 10), i)
+            docs[File].append({'_id': file_ids[-1], 'vcs_system_id': vcs_id, 'path': path})
+        paths = {doc['_id']: doc['path'] for doc in docs[File]}
+
+        parent = None
+        for i in range(self.commits):
+            commit_id = ObjectId()
+            revision_hash = '{:040x}'.format(rnd.getrandbits(160))
+            docs[Commit].append({'_id': commit_id, 'vcs_system_id': vcs_id, 'revision_hash': revision_hash,
+                                 'parents': [parent] if parent else [], 'message': rnd.choice(MESSAGES),
+                                 'linked_issue_ids': rnd.sample(issue_ids, min(len(issue_ids), rnd.choice([0, 0, 1, 2]))),
+                                 'fixed_issue_ids': rnd.sample(issue_ids, min(len(issue_ids), rnd.choice([0, 0, 1]))),
+                                 'szz_issue_ids': rnd.sample(issue_ids, min(len(issue_ids), rnd.choice([0, 1])))})
+            for file_id in rnd.sample(file_ids, min(len(file_ids), rnd.randint(0, self.file_actions_per_commit))):
+                file_action_id = ObjectId()
+                docs[FileAction].append({'_id': file_action_id, 'commit_id': commit_id, 'file_id': file_id,
+                                         'mode': 'M', 'parent_revision_hash': parent})
+                for _ in range(rnd.randint(1, self.hunks_per_file_action)):
+                    lines = [rnd.choice(HUNK_LINES) for _ in range(rnd.randint(1, self.hunk_lines))]
+                    docs[Hunk].append({'_id': ObjectId(), 'file_action_id': file_action_id, 'new_start': 1,
+                                       'new_lines': len(lines), 'old_start': 1, 'old_lines': len(lines),
+                                       'content': '\n'.join(lines) + '\n'})
+                if rnd.random() < self.state_ratio:
+                    docs[CodeEntityState].append({'_id': ObjectId(), 's_key': str(ObjectId()), 'commit_id': commit_id,
+                                                  'file_id': file_id, 'long_name': paths[file_id], 'ce_type': 'file',
+                                                  'imports': rnd.choice(IMPORTS)})
+            if rnd.random() < self.refactoring_ratio:
+                docs[Refactoring].append({'_id': ObjectId(), 'commit_id': commit_id, 'type': 'rename_method'})
+            parent = revision_hash
+
+        counts = {}
+        for model, model_docs in docs.items():
+            collection = model._get_collection()
+            for i in range(0, len(model_docs), chunk_size):
+                collection.insert_many(model_docs[i:i + chunk_size], ordered=False)
+            counts[model._get_collection_name()] = len(model_docs)
+        return counts
+
+    def _drop(self):
+        for model in (Project, VCSSystem, IssueSystem, Commit, Issue, Event, FileAction, File, Hunk, CodeEntityState,
+                      Refactoring):
+            model._get_collection().drop()
+        # the fingerprints of the labels of the dropped commits
+        Commit._get_db()['label_state'].drop()
@@ -14,10 +14,20 @@ class AdjustedSZZ(BaseLabelApproach):
     1: When Do Changes Induce Fixes? Jacek Śliwerski et al. 2005
     """
 
+    commit_fields = ('szz_issue_ids',)
+    default_labels = [('bugfix', False)]
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = None
 
+    def is_relevant(self, commit):
+        return bool(commit.szz_issue_ids)
+
+    def input_state(self, commits):
+        # the labels only depend on the szz_issue_ids of the commit
+        return {}
+
     def set_commit(self, commit):
         self._labels = []
         isbugfix = bool(commit.szz_issue_ids and len(commit.szz_issue_ids))
@@ -1,9 +1,9 @@
 import logging
 import re
 
-from pycoshark.mongomodels import Hunk, File, FileAction
-
 from core import LabelSHARK, BaseLabelApproach
+from approaches.util.commitcontext import commit_contexts
+from approaches.util.hunkscanner import scan_java_hunk
 
 
 @LabelSHARK.approach
@@ -11,15 +11,27 @@ class DocumentationChangeLabel(BaseLabelApproach):
     """This labels commits as documentation changes based on hunks
     """
 
+    commit_fields = ('parents',)
+    label_names = ('javadoc', 'javainline', 'technicaldept_add', 'technicaldept_remove')
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
+        self.counters = {'unscanned_file_actions': 0}
         self._filename_pattern_java = re.compile('.*\.java$')
-        self._java_string = re.compile(r"(\"(?:[^\"\\]|\\\"|\\)*\")")
-        self._mutliline_comment = re.compile(r"^(-|\+)\s*((/\*)|(\*)).*$", re.MULTILINE)
-        self._java_inlinecomment = re.compile(r"^(-|\+).*//.*$", re.MULTILINE)
-        self._java_inlinetechnicaldept_add = re.compile(r"^\+.*//\s*(TODO|XXX|FIXME).*$", re.MULTILINE)
-        self._java_inlinetechnicaldept_remove = re.compile(r"^-.*//\s*(TODO|XXX|FIXME).*$", re.MULTILINE)
+
+    def configure(self, config):
+        commit_contexts.configure(config)
+
+    def input_state(self, commits):
+        return commit_contexts.input_states(commits)
+
+    def label_batch(self, commits):
+        # load the file actions of the whole chunk and the hunks of all java files at once
+        contexts = commit_contexts.load(commits)
+        commit_contexts.prefetch_hunks([file_action for context in contexts for file_action in context.file_actions
+                                        if self._is_java(context.path(file_action))])
+        return super().label_batch(commits)
 
     def set_commit(self, commit):
         self._labels = []
@@ -27,24 +39,23 @@ class DocumentationChangeLabel(BaseLabelApproach):
         has_inline_change = False
         has_technical_dept_add = False
         has_technical_dept_remove = False
-        if len(commit.parents)>0:
-            file_actions = FileAction.objects(commit_id=commit.id, parent_revision_hash=commit.parents[0])
-        else:
-            file_actions = FileAction.objects(commit_id=commit.id)
-        for file_action in file_actions:
-            file = File.objects(id=file_action.file_id).get()
-            is_filename_match = self._filename_pattern_java.match(file.path) is not None
-            if is_filename_match:
-                for hunk in Hunk.objects(file_action_id=file_action.id):
-                    content = hunk.content
-                    # First drop all Java strings from the code
-                    content = re.sub(self._java_string, "", content)
-                    has_javadoc_change |= self._ismatch(self._mutliline_comment, content)
-                    # drop multiline comments
-                    content = re.sub(self._mutliline_comment, "", content)
-                    has_inline_change |= self._ismatch(self._java_inlinecomment, content)
-                    has_technical_dept_add |= self._ismatch(self._java_inlinetechnicaldept_add, content)
-                    has_technical_dept_remove |= self._ismatch(self._java_inlinetechnicaldept_remove, content)
+        context = commit_contexts.get(commit)
+        java_file_actions = [file_action for file_action in context.file_actions
+                             if self._is_java(context.path(file_action))]
+        for i, file_action in enumerate(java_file_actions):
+            for hunk in context.hunks(file_action):
+                flags = scan_java_hunk(hunk.content)
+                has_javadoc_change |= flags.javadoc
+                has_inline_change |= flags.inline
+                has_technical_dept_add |= flags.technicaldept_add
+                has_technical_dept_remove |= flags.technicaldept_remove
+                if has_javadoc_change and has_inline_change and has_technical_dept_add and has_technical_dept_remove:
+                    break
+            else:
+                continue
+            # every flag is set, the hunks of the remaining files are not scanned, they were prefetched with the batch
+            self.counters['unscanned_file_actions'] += len(java_file_actions) - i - 1
+            break
 
         self._labels.append(('javadoc', has_javadoc_change))
         self._labels.append(('javainline', has_javadoc_change))
@@ -54,14 +65,9 @@ class DocumentationChangeLabel(BaseLabelApproach):
     def get_labels(self):
         return self._labels
 
+    def _is_java(self, path):
+        return path is not None and self._filename_pattern_java.match(path) is not None
+
     def _error(self, message):
         # we log to warn because error gets to stdout in servershark
         self._log.warning(message)
-
-    @staticmethod
-    def _ismatch(regex, string):
-        matches = regex.finditer(string)
-        match_num = 0
-        for match in matches:
-            match_num = match_num + 1
-        return match_num > 0
@@ -1,12 +1,16 @@
 import logging
 import pathlib
 import pickle
-import pandas as pd
+import timeit
+from collections import OrderedDict
 
-from pycoshark.mongomodels import Issue
+import pandas as pd
 
 from core import LabelSHARK, BaseLabelApproach
 from approaches.util import labelutils
+from approaches.util.issuestore import issue_store
+
+log = logging.getLogger('labelSHARK')
 
 
 @LabelSHARK.approach
@@ -16,50 +20,164 @@ class IssueFasttext(BaseLabelApproach):
     classifier
     """
 
+    commit_fields = ('linked_issue_ids',)
+    default_labels = [('bugfix', False)]
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
-        basepath = pathlib.Path(__file__).parent.parent.absolute()
-        try:
-            self._text_clf = pickle.load(open('{}/classifier/ft_text_clf.p'.format(basepath), 'rb'))
-            self._title_clf = pickle.load(open('{}/classifier/ft_title_clf.p'.format(basepath), 'rb'))
-        except Exception as e:
-            self._text_clf = None
-            self._title_clf = None
-            self._log.warning('Approach issuefasttext not working. could not load ft classifiers. '
+        self._predictions = {}
+        self.counters = {'unchecked_issues': 0}
+        self._text_clf = None
+        self._title_clf = None
+        # the classifiers are only loaded once the first issue needs to be scored
+        self._clf_path = pathlib.Path(__file__).parent.parent.absolute() / 'classifier'
+        self._enabled = (self._clf_path / 'ft_text_clf.p').is_file() and (self._clf_path / 'ft_title_clf.p').is_file()
+        if not self._enabled:
+            self._log.warning('Approach issuefasttext not working. could not find ft classifiers. '
                               'You need to download the classifiers () and place them in the labelSHARK/classifiers '
                               'folder.')
-            self._log.exception(e)
-            pass
+
+    def configure(self, config):
+        issue_store.configure(config)
+        labelutils.configure(config)
+        if config.get('preload_classifiers'):
+            self._load_classifiers()
+
+    def is_relevant(self, commit):
+        # without the classifiers no commit gets a label, not even the default
+        return not self._enabled or bool(commit.linked_issue_ids)
+
+    def input_state(self, commits):
+        # the labels also change with the classifiers
+        classifiers = [[path.name, path.stat().st_size, path.stat().st_mtime]
+                       for path in (self._clf_path / 'ft_text_clf.p', self._clf_path / 'ft_title_clf.p')
+                       if path.is_file()]
+        return {commit_id: [classifiers, issues]
+                for commit_id, issues in issue_store.input_states(commits, 'linked_issue_ids').items()}
+
+    def label_batch(self, commits):
+        if not self._enabled:
+            return super().label_batch(commits)
+
+        # fetch the linked issues and their parents of the whole chunk at once
+        issue_store.load([issue_id for commit in commits for issue_id in (commit.linked_issue_ids or [])])
+
+        # every commit needs its issues only up to the first validated bug, the next bug of every open commit
+        # is scored together in rounds with one call per classifier
+        bugfixes = {}
+        issues = OrderedDict((commit.id, list(self._issues(commit))) for commit in commits)
+        positions = dict.fromkeys(issues, 0)
+        labels = {}
+        while positions:
+            candidates = {}
+            for commit_id in list(positions):
+                position = self._next_bug(issues[commit_id], positions[commit_id], bugfixes)
+                if position is None:
+                    labels[commit_id] = False
+                    del positions[commit_id]
+                else:
+                    candidates[commit_id] = issues[commit_id][position]
+                    positions[commit_id] = position + 1
+            if candidates and not self._load_classifiers():
+                return super().label_batch(commits)
+            self._predict(candidates.values())
+            for commit_id, issue in candidates.items():
+                if self._predictions[issue.id]:
+                    labels[commit_id] = True
+                    self.counters['unchecked_issues'] += len(issues[commit_id]) - positions[commit_id]
+                    del positions[commit_id]
+
+        return {commit.id: [('bugfix', labels[commit.id])] for commit in commits}
 
     def set_commit(self, commit):
-        if self._text_clf is None or self._title_clf is None:
+        self._labels = []
+        if not self._enabled:
             return  # do nothing without the classifiers
 
-        self._labels = []
+        self._labels.append(('bugfix', self._is_validated_bugfix(commit, {})))
 
-        isbugfix = False
+    def _issues(self, commit):
+        """Yields the linked issues of the commit and their parents."""
         if commit.linked_issue_ids is not None and len(commit.linked_issue_ids) > 0:
-            for issue in Issue.objects(id__in=commit.linked_issue_ids):
-                isbugfix |= labelutils.isbugfix(issue) and self._validate_bugfix(issue)
-                if issue.parent_issue_id:
-                    parent_issue = Issue.objects(id=issue.parent_issue_id).get()
-                    isbugfix |= labelutils.isbugfix(parent_issue) and self._validate_bugfix(issue)
+            for issue in issue_store.get_many(commit.linked_issue_ids):
+                yield issue
+                parent_issue = issue_store.get_parent(issue)
+                if parent_issue is not None:
+                    yield parent_issue
+
+    @staticmethod
+    def _next_bug(issues, start, bugfixes):
+        """Returns the position of the next fixed bug in the issues from start on or None.
+
+        :param list issues: issues of a commit
+        :param int start: position of the first issue that is checked
+        :param dict bugfixes: cache of the bugfix check by issue id
+        """
+        for position in range(start, len(issues)):
+            issue = issues[position]
+            if issue.id not in bugfixes:
+                bugfixes[issue.id] = labelutils.isbugfix(issue)
+            if bugfixes[issue.id]:
+                return position
+        return None
 
-        self._labels.append(('bugfix', isbugfix))
+    def _is_validated_bugfix(self, commit, bugfixes):
+        issues = list(self._issues(commit))
+        for position, issue in enumerate(issues):
+            if issue.id not in bugfixes:
+                bugfixes[issue.id] = labelutils.isbugfix(issue)
+            if bugfixes[issue.id] and self._validate_bugfix(issue):
+                self.counters['unchecked_issues'] += len(issues) - position - 1
+                return True
+        return False
 
     def _validate_bugfix(self, issue):
-        desc = issue.desc
-        title = issue.title
-        if desc is None:
-            desc = ''
-        if title is None:
-            title = ''
-        X = pd.DataFrame({'description': [desc.replace('\n', '')], 'title': [title.replace('\n', '')]})
+        if issue.id not in self._predictions:
+            if not self._load_classifiers():
+                raise Exception('ft classifiers not available')
+            self._predict([issue])
+        return self._predictions[issue.id]
+
+    def _load_classifiers(self):
+        """Loads both classifiers on first use.
+
+        :return: True if the classifiers are available
+        """
+        if self._enabled and self._text_clf is None:
+            start = timeit.default_timer()
+            try:
+                with open(str(self._clf_path / 'ft_text_clf.p'), 'rb') as f:
+                    text_clf = pickle.load(f)
+                with open(str(self._clf_path / 'ft_title_clf.p'), 'rb') as f:
+                    title_clf = pickle.load(f)
+            except Exception as e:
+                self._enabled = False
+                self._log.warning('Approach issuefasttext not working. could not load ft classifiers.')
+                self._log.exception(e)
+                return False
+            self._text_clf = text_clf
+            self._title_clf = title_clf
+            log.info('loaded ft classifiers in {:.5f}s'.format(timeit.default_timer() - start))
+        return self._enabled
+
+    def _predict(self, issues):
+        """Scores every issue that was not scored before with one predict_proba call per classifier.
+
+        The predictions are kept for the whole run, so that no issue is scored twice.
+        """
+        issues = list({issue.id: issue for issue in issues if issue.id not in self._predictions}.values())
+        if not issues:
+            return
+
+        X = pd.DataFrame({'description': [(issue.desc or '').replace('\n', '') for issue in issues],
+                          'title': [(issue.title or '').replace('\n', '') for issue in issues]})
         proba_text = self._text_clf.predict_proba(X)
         proba_title = self._title_clf.predict_proba(X)
         proba_total = (proba_text + proba_title) / 2
-        return bool(proba_total[0, 1] > 0.5)
+        for issue, proba in zip(issues, proba_total[:, 1]):
+            self._predictions[issue.id] = bool(proba > 0.5)
+        self._log.debug('scored {} issues'.format(len(issues)))
 
     def get_labels(self):
         return self._labels
@@ -5,6 +5,7 @@ from pycoshark.mongomodels import Issue, Event
 
 from core import LabelSHARK, BaseLabelApproach
 from approaches.util import labelutils
+from approaches.util.issuestore import issue_store
 
 
 def remove_index(cls):
@@ -25,27 +26,63 @@ class IssueOnly(BaseLabelApproach):
     """This labels commits as bugfix only based on linked issues.
     """
 
+    commit_fields = ('linked_issue_ids',)
+    default_labels = [('bugfix', False), ('featureadd', False)]
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
+        self.counters = {'unevaluated_checks': 0}
+
+    def configure(self, config):
+        issue_store.configure(config)
+        labelutils.configure(config)
+
+    def is_relevant(self, commit):
+        return bool(commit.linked_issue_ids)
+
+    def input_state(self, commits):
+        return issue_store.input_states(commits, 'linked_issue_ids')
+
+    def label_batch(self, commits):
+        # fetch the linked issues and their parents of the whole chunk at once
+        issue_store.load([issue_id for commit in commits for issue_id in (commit.linked_issue_ids or [])])
+        return super().label_batch(commits)
 
     def set_commit(self, commit):
         self._labels = []
 
         isbugfix = False
         isfeatureadd = False
-        if commit.linked_issue_ids is not None and len(commit.linked_issue_ids) > 0:
-            for issue in Issue.objects(id__in=commit.linked_issue_ids):
-                isbugfix |= labelutils.isbugfix(issue)
-                isfeatureadd |= labelutils.isfeatureadd(issue)
-                if issue.parent_issue_id:
-                    parent_issue = Issue.objects(id=issue.parent_issue_id).get()
-                    isbugfix |= labelutils.isbugfix(parent_issue)
-                    isfeatureadd |= labelutils.isfeatureadd(parent_issue)
+        issues = self._issues(commit)
+        checks = 0
+        for issue in issues:
+            its_type = labelutils.its_cache.get_type(issue.issue_system_id)
+            # the checks may query the events of the issue, they are skipped once the result is known
+            if not isbugfix:
+                isbugfix = labelutils.isbugfix(issue, its_type)
+                checks += 1
+            if not isfeatureadd:
+                isfeatureadd = labelutils.isfeatureadd(issue, its_type)
+                checks += 1
+            if isbugfix and isfeatureadd:
+                break
+        self.counters['unevaluated_checks'] += 2 * len(issues) - checks
 
         self._labels.append(('bugfix', isbugfix))
         self._labels.append(('featureadd', isbugfix))
 
+    def _issues(self, commit):
+        """Returns the linked issues of the commit, each followed by its parent."""
+        issues = []
+        if commit.linked_issue_ids is not None and len(commit.linked_issue_ids) > 0:
+            for issue in issue_store.get_many(commit.linked_issue_ids):
+                issues.append(issue)
+                parent_issue = issue_store.get_parent(issue)
+                if parent_issue is not None:
+                    issues.append(parent_issue)
+        return issues
+
     def get_labels(self):
         return self._labels
 
@@ -1,9 +1,9 @@
 import logging
 import re
 
-from pycoshark.mongomodels import Refactoring
-
 from core import LabelSHARK, BaseLabelApproach
+from datasource import data_source
+from approaches.util.messageflags import message_flags
 
 
 @LabelSHARK.approach
@@ -11,19 +11,51 @@ class RefactoringLabels(BaseLabelApproach):
     """This labels commits as refactorings based on keywords and detected refactorings
     """
 
+    commit_fields = ('message',)
+    label_names = ('keyword', 'codebased')
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
+        self._counts = {}
+        self._keyword_flag = 1
         self._keywords = re.compile(
             r"\b(refact|refactor|refactored|migrated|refactoring|restructure|encapsulate|param|parameters|abstract|rename\s+(method|variable|class)|(method|variable|class)\s+name|extract\s+(method|class|interface|code)|(moved|move)(?!.*(icon|icons|version))|getter|setter|checkstyle|pmd|typo.*(variable|method|class|code)|pull up|push down|merge.*(method|funcation|class)|convention|simple|simplify|replace|nest|inline|(remove|delete)\s+duplicate|split|wrapper|private|protect|delegate)\b")
 
+    def configure(self, config):
+        message_flags.configure(config)
+        self._keyword_flag = 1 << message_flags.register(self._keywords)
+        if message_flags.preload_messages:
+            # the flags are read from the preloaded table, the keyword flag is part of the input state instead
+            self.commit_fields = ()
+
+    def input_state(self, commits):
+        # the labels also depend on the number of refactorings of the commit
+        self._counts = self._refactoring_counts(commits)
+        keywords = self._has_keywords(commits)
+        return {commit.id: [self._counts.get(commit.id, 0), keywords[commit.id]] for commit in commits}
+
     def set_commit(self, commit):
-        self._labels = []
+        has_refactoring_keywords = self._has_keywords([commit])[commit.id]
+        has_code_refactoring = commit.id in data_source.refactoring_counts([commit.id])
+        self._labels = [('keyword', has_refactoring_keywords), ('codebased', has_code_refactoring)]
+
+    def label_batch(self, commits):
+        # one query for the commits of the chunk instead of one count per commit, the counts are already loaded
+        # if the input state of the batch was requested
+        if any(commit.id not in self._counts for commit in commits):
+            self._counts = self._refactoring_counts(commits)
+        keywords = self._has_keywords(commits)
+        return {commit.id: [('keyword', keywords[commit.id]), ('codebased', self._counts.get(commit.id, 0) > 0)]
+                for commit in commits}
+
+    def _has_keywords(self, commits):
+        flags = message_flags.get_many(commits)
+        return {commit.id: bool(flags.get(commit.id, 0) & self._keyword_flag) for commit in commits}
 
-        has_refactoring_keywords = self._keywords.match(commit.message.lower()) is not None
-        has_code_refactoring = Refactoring.objects(commit_id=commit.id).count() > 0
-        self._labels.append(('keyword', has_refactoring_keywords))
-        self._labels.append(('codebased', has_code_refactoring))
+    def _refactoring_counts(self, commits):
+        counts = data_source.refactoring_counts([commit.id for commit in commits])
+        return {commit.id: counts.get(commit.id, 0) for commit in commits}
 
     def get_labels(self):
         return self._labels
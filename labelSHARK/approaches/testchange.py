@@ -1,8 +1,9 @@
 import logging
 import re
 
-from pycoshark.mongomodels import CodeEntityState, Hunk, File, FileAction
 from core import LabelSHARK, BaseLabelApproach
+from datasource import data_source
+from approaches.util.commitcontext import commit_contexts
 
 
 @LabelSHARK.approach
@@ -10,9 +11,15 @@ class TestChangeLabel(BaseLabelApproach):
     """This labels commits as test changes based on the file actions
     """
 
+    commit_fields = ('parents', 'code_entity_states')
+    label_names = ('javacode',)
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
+        self.counters = {'unscanned_file_actions': 0}
+        self._file_imports = {}
+        self._import_matches = {}
         self._test_import_pattern_java = re.compile(
             'org\.junit|junit\.framework|android\.test|android\.support\.test|com\.jayway\.android\.robotium|org\.easymock|org\.mockejb|org\.mockito|org\.powermock')
         self._test_filename_pattern_java = re.compile('((.*(Test|test))|((Test|test).*))\.(java)')
@@ -22,6 +29,25 @@ class TestChangeLabel(BaseLabelApproach):
         self._single_line_comments = re.compile("//.*?\n")
         self._start_plus_minus = re.compile("^(\+|-)", re.MULTILINE)
 
+    def configure(self, config):
+        commit_contexts.configure(config)
+
+    def input_state(self, commits):
+        # the labels also depend on the imports of the changed files
+        file_states = commit_contexts.input_states(commits)
+        self._load_file_imports(commit_contexts.load(commits))
+        return {commit.id: [file_states[commit.id], self._file_imports[commit.id]] for commit in commits}
+
+    def label_batch(self, commits):
+        # load the file actions of the whole chunk and the hunks of all test files at once
+        contexts = commit_contexts.load(commits)
+        commit_contexts.prefetch_hunks([file_action for context in contexts for file_action in context.file_actions
+                                        if self._is_test_filename(context.path(file_action))])
+        # the imports are already loaded if the input state of the batch was requested
+        if any(commit.id not in self._file_imports for commit in commits):
+            self._load_file_imports(contexts)
+        return super().label_batch(commits)
+
     def set_commit(self, commit):
         self._labels = []
         self._labels.append(('javacode', self._is_java_test_change(commit)))
@@ -29,37 +55,70 @@ class TestChangeLabel(BaseLabelApproach):
     def get_labels(self):
         return self._labels
 
+    def _is_test_filename(self, path):
+        return path is not None and self._test_filename_pattern_java.match(path) is not None
+
+    def _is_test_import(self, package):
+        # the same packages are imported by many files
+        if package not in self._import_matches:
+            self._import_matches[package] = self._test_import_pattern_java.match(package) is not None
+        return self._import_matches[package]
+
+    def _load_file_imports(self, contexts):
+        """Loads the imports of the files changed by the commits with one query per kind of reference.
+
+        The code entity states of a commit are referenced by the commit itself if it has code_entity_states,
+        otherwise by their commit_id.
+
+        :param list contexts: CommitContext of the commits
+        :return: dict of commit id to dict of long_name to imports
+        """
+        self._file_imports = {context.commit.id: {} for context in contexts}
+        paths = list(set(context.path(file_action) for context in contexts for file_action in context.file_actions
+                         if context.path(file_action) is not None))
+        if not paths:
+            return
+
+        # a code entity state is referenced by every commit in which it did not change
+        by_state_id = {}
+        by_commit_id = []
+        for context in contexts:
+            if context.commit.code_entity_states:
+                for state_id in context.commit.code_entity_states:
+                    by_state_id.setdefault(state_id, []).append(context.commit.id)
+            else:
+                by_commit_id.append(context.commit.id)
+
+        if by_commit_id:
+            for code_entity in data_source.file_states_by_commit(by_commit_id, paths):
+                self._add_imports(code_entity.commit_id, code_entity)
+        if by_state_id:
+            for code_entity in data_source.file_states_by_id(by_state_id.keys(), paths):
+                for commit_id in by_state_id[code_entity.id]:
+                    self._add_imports(commit_id, code_entity)
+
+    def _add_imports(self, commit_id, code_entity):
+        imports = self._file_imports[commit_id].setdefault(code_entity.long_name, [])
+        if code_entity.imports is not None:
+            imports.extend(code_entity.imports)
+
     def _error(self, message):
         # we log to warn because error gets to stdout in servershark
         self._log.warning(message)
 
     def _is_java_test_change(self, commit):
-        if commit.code_entity_states is None or len(commit.code_entity_states) == 0:
-            code_entities = CodeEntityState.objects(commit_id=commit.id, ce_type='file').only('id', 'long_name',
-                                                                                              'imports')
-        else:
-            code_entities = CodeEntityState.objects(id__in=commit.code_entity_states, ce_type='file').only('id',
-                                                                                                           'long_name',
-                                                                                                           'imports')
-        if len(commit.parents)>0:
-            file_actions = FileAction.objects(commit_id=commit.id, parent_revision_hash=commit.parents[0])
-        else:
-            file_actions = FileAction.objects(commit_id=commit.id)
-        for file_action in file_actions:
-            file = File.objects(id=file_action.file_id).get()
-            if code_entities.filter(long_name=file.path).count() > 0:
-                code_entity = code_entities.filter(long_name=file.path).get()
-            else:
-                code_entity = None
-            is_filename_match = self._test_filename_pattern_java.match(file.path) is not None
-            is_import_match = False
-            if code_entity is not None and code_entity.imports is not None:
-                for package in code_entity.imports:
-                    if self._test_import_pattern_java.match(package) is not None:
-                        is_import_match = True
-                        break
+        context = commit_contexts.get(commit)
+        if commit.id not in self._file_imports:
+            self._load_file_imports([context])
+        file_imports = self._file_imports[commit.id]
+        for i, file_action in enumerate(context.file_actions):
+            path = context.path(file_action)
+            if path is None:
+                continue
+            is_filename_match = self._is_test_filename(path)
+            is_import_match = any(self._is_test_import(package) for package in file_imports.get(path, []))
             if is_filename_match or is_import_match:
-                for hunk in Hunk.objects(file_action_id=file_action.id):
+                for hunk in context.hunks(file_action):
                     # check if hunk is logical change
                     content = hunk.content
                     content = re.sub(self._streamed_comments, "", content)
@@ -67,5 +126,8 @@ class TestChangeLabel(BaseLabelApproach):
                     content = re.sub(self._start_plus_minus, "", content)
                     content = re.sub(self._empty_line_regex, "", content)
                     if len(content) > 0:
+                        # the remaining files are not scanned, the hunks of test files were prefetched with the batch,
+                        # only those of files that match by their imports alone are not fetched
+                        self.counters['unscanned_file_actions'] += len(context.file_actions) - i - 1
                         return True
         return False
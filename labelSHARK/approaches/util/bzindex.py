@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+
+from bson import ObjectId
+
+from datasource import data_source
+
+log = logging.getLogger('labelSHARK')
+
+
+class BugzillaEventIndex(object):
+    """Index of the Bugzilla bugs that were ever resolved/closed and ever fixed according to their events.
+
+    The index is built with one aggregation over the events of all bugs of an issue system the first time
+    a bug of that issue system is checked. If a path is configured, the index of every issue system is stored
+    there together with the event stamp of the data source, i.e., the number of events and the latest event.
+    Later runs reuse a stored index as long as the events did not change, otherwise it is built again.
+    """
+
+    def __init__(self, path=None):
+        self._resolved = {}
+        self._fixed = {}
+        self._stamp = None
+        self.path = path
+
+    def configure(self, config):
+        """:param dict config: labelSHARK config with the optional bz_index_path"""
+        self.path = config.get('bz_index_path', self.path)
+
+    def lookup(self, issue):
+        """Returns if the events of the issue ever resolved/closed it and if they ever fixed it.
+
+        :param issue: the issue, needs the id and the issue_system_id
+        :return: tuple (resolved, fixed)
+        """
+        if issue.issue_system_id not in self._resolved:
+            self._load(issue.issue_system_id)
+        return issue.id in self._resolved[issue.issue_system_id], issue.id in self._fixed[issue.issue_system_id]
+
+    def clear(self):
+        self._resolved = {}
+        self._fixed = {}
+        self._stamp = None
+
+    def _load(self, issue_system_id):
+        filename = None
+        if self.path:
+            filename = os.path.join(self.path, 'bz_events_{}.json'.format(issue_system_id))
+        if filename:
+            # the events of the whole run are the same, the stamp is read once
+            if self._stamp is None:
+                self._stamp = data_source.event_stamp()
+            if os.path.isfile(filename):
+                with open(filename, 'r') as f:
+                    index = json.load(f)
+                if index.get('stamp') == self._stamp:
+                    self._resolved[issue_system_id] = set(ObjectId(issue_id) for issue_id in index['resolved'])
+                    self._fixed[issue_system_id] = set(ObjectId(issue_id) for issue_id in index['fixed'])
+                    log.info('loaded bugzilla event index for issue system %s from %s' % (issue_system_id, filename))
+                    return
+                log.info('bugzilla event index %s is outdated, the events changed' % filename)
+
+        self._build(issue_system_id)
+
+        if filename:
+            os.makedirs(self.path, exist_ok=True)
+            with open(filename, 'w') as f:
+                json.dump({'stamp': self._stamp,
+                           'resolved': [str(issue_id) for issue_id in self._resolved[issue_system_id]],
+                           'fixed': [str(issue_id) for issue_id in self._fixed[issue_system_id]]}, f)
+
+    def _build(self, issue_system_id):
+        num_bugs, resolved, fixed = data_source.resolved_and_fixed_bugs(issue_system_id)
+        self._resolved[issue_system_id] = resolved
+        self._fixed[issue_system_id] = fixed
+        log.info('built bugzilla event index for issue system %s: %i bugs, %i resolved, %i fixed'
+                 % (issue_system_id, num_bugs, len(resolved), len(fixed)))
+
+
+bz_index = BugzillaEventIndex()
@@ -0,0 +1,196 @@
+import logging
+from collections import OrderedDict
+
+from datasource import data_source
+
+log = logging.getLogger('labelSHARK')
+
+
+class FilePathCache(object):
+    """Bounded LRU cache of file paths by file id, shared by every diff based approach.
+
+    The same files are changed by many commits, so their paths are only fetched once. The cache is either
+    filled lazily in bulk or preloaded with one scan over the files of the VCS system.
+    """
+
+    def __init__(self, max_size=200000):
+        self._paths = OrderedDict()
+        self._preload = False
+        self._preloaded = set()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config):
+        """:param dict config: labelSHARK config with file_cache_size and preload_file_paths"""
+        self.max_size = config.get('file_cache_size', self.max_size)
+        self._preload = config.get('preload_file_paths', self._preload)
+
+    def preload(self, vcs_system_id):
+        """Loads the paths of the files of the VCS system until the cache is full."""
+        self._preloaded.add(vcs_system_id)
+        for file in data_source.files_of_vcs_system(vcs_system_id):
+            if len(self._paths) >= self.max_size:
+                log.warning('file path cache is full, preloaded only the first %i paths' % self.max_size)
+                break
+            self._paths[file.id] = file.path
+        log.info('preloaded %i file paths' % len(self._paths))
+
+    def get_many(self, file_ids, vcs_system_id=None):
+        """Returns the paths of the files, missing paths are fetched with one query.
+
+        :param file_ids: iterable of File ids
+        :param vcs_system_id: id of the VCSSystem of the files, used for the preload
+        :return: dict of file id to path
+        """
+        if self._preload and vcs_system_id is not None and vcs_system_id not in self._preloaded:
+            self.preload(vcs_system_id)
+
+        ret = {}
+        missing = set()
+        for file_id in file_ids:
+            if file_id in self._paths:
+                self.hits += 1
+                self._paths.move_to_end(file_id)
+                ret[file_id] = self._paths[file_id]
+            else:
+                missing.add(file_id)
+        if missing:
+            self.misses += len(missing)
+            for file in data_source.files(missing):
+                ret[file.id] = file.path
+                self._paths[file.id] = file.path
+            while len(self._paths) > self.max_size:
+                self._paths.popitem(last=False)
+        return ret
+
+    def stats(self):
+        return {'size': len(self._paths), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self._paths = OrderedDict()
+        self._preloaded = set()
+
+
+file_paths = FilePathCache()
+
+
+class CommitContext(object):
+    """File actions, file paths and hunks of a commit, shared by every diff based approach."""
+
+    def __init__(self, commit, file_actions, store):
+        self.commit = commit
+        self.file_actions = file_actions
+        self._store = store
+
+    def path(self, file_action):
+        """Returns the path of the file of the file action."""
+        return self._store.path(file_action.file_id)
+
+    def hunks(self, file_action):
+        """Returns the hunks of the file action."""
+        return self._store.hunks(file_action)
+
+
+class CommitContextStore(object):
+    """Loads the contexts of a batch of commits with bulk queries.
+
+    The file actions of the whole batch are loaded with one query, the file paths come from the shared
+    file_paths cache. Hunks are loaded when they are requested, either in bulk with prefetch_hunks or for a single
+    file action. Only the contexts of the current batch are kept.
+    """
+
+    def __init__(self):
+        self._contexts = {}
+        self._paths = {}
+        self._hunks = {}
+        self._hunk_counts = {}
+
+    def configure(self, config):
+        file_paths.configure(config)
+
+    def load(self, commits):
+        """Loads the contexts of the commits, nothing is loaded if the commits are part of the current batch.
+
+        :param list commits: Commit objects from pycoshark models
+        :return: list of CommitContext
+        """
+        if any(commit.id not in self._contexts for commit in commits):
+            self._load(commits)
+        return [self._contexts[commit.id] for commit in commits]
+
+    def get(self, commit):
+        """Returns the context of the commit."""
+        return self.load([commit])[0]
+
+    def path(self, file_id):
+        return self._paths.get(file_id)
+
+    def prefetch_hunks(self, file_actions):
+        """Loads the hunks of every file action that are not yet loaded with one query.
+
+        :param list file_actions: file actions from the contexts of the current batch
+        """
+        missing = [file_action.id for file_action in file_actions if file_action.id not in self._hunks]
+        if not missing:
+            return
+        hunks = OrderedDict((file_action_id, []) for file_action_id in missing)
+        for hunk in data_source.hunks(missing):
+            hunks[hunk.file_action_id].append(hunk)
+        self._hunks.update(hunks)
+
+    def input_states(self, commits):
+        """Returns the state of the file actions every commit is labeled from.
+
+        The state of a file action consists of its id, the path of its file and the number of its hunks, it is
+        part of the fingerprints of the diff based approaches, so that their labels are computed again once file
+        actions or hunks are added or removed. The hunks that are not loaded are counted with one query.
+
+        :param list commits: Commit objects from pycoshark models
+        :return: dict of commit id to a list with the state of every file action of the commit
+        """
+        contexts = self.load(commits)
+        missing = [file_action.id for context in contexts for file_action in context.file_actions
+                   if file_action.id not in self._hunks and file_action.id not in self._hunk_counts]
+        if missing:
+            counts = data_source.hunk_counts(missing)
+            self._hunk_counts.update({file_action_id: counts.get(file_action_id, 0) for file_action_id in missing})
+        return {context.commit.id: [[file_action.id, context.path(file_action), self._hunk_count(file_action.id)]
+                                    for file_action in context.file_actions]
+                for context in contexts}
+
+    def hunks(self, file_action):
+        if file_action.id not in self._hunks:
+            self.prefetch_hunks([file_action])
+        return self._hunks[file_action.id]
+
+    def clear(self):
+        self._contexts = {}
+        self._paths = {}
+        self._hunks = {}
+        self._hunk_counts = {}
+
+    def _hunk_count(self, file_action_id):
+        if file_action_id in self._hunks:
+            return len(self._hunks[file_action_id])
+        return self._hunk_counts[file_action_id]
+
+    def _load(self, commits):
+        self.clear()
+        file_actions = OrderedDict((commit.id, []) for commit in commits)
+        parents = {commit.id: commit.parents[0] if commit.parents else None for commit in commits}
+        for file_action in data_source.file_actions(file_actions.keys()):
+            # only the diff to the first parent is used
+            parent = parents[file_action.commit_id]
+            if parent is None or file_action.parent_revision_hash == parent:
+                file_actions[file_action.commit_id].append(file_action)
+
+        file_ids = set(file_action.file_id for commit_file_actions in file_actions.values()
+                       for file_action in commit_file_actions)
+        self._paths = file_paths.get_many(file_ids, commits[0].vcs_system_id if commits else None)
+
+        for commit in commits:
+            self._contexts[commit.id] = CommitContext(commit, file_actions[commit.id], self)
+
+
+commit_contexts = CommitContextStore()
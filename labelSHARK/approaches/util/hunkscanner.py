@@ -0,0 +1,82 @@
+import re
+from collections import namedtuple
+
+HunkFlags = namedtuple('HunkFlags', ['javadoc', 'inline', 'technicaldept_add', 'technicaldept_remove'])
+
+_java_string = re.compile(r"(\"(?:[^\"\\]|\\\"|\\)*\")")
+_technical_dept_markers = ('TODO', 'XXX', 'FIXME')
+
+
+def _next_text(lines, start):
+    """Returns the first line from start on that is not only whitespace without the leading whitespace and its
+    index, i.e., what a \\s* that crosses line breaks would stop at."""
+    for i in range(start, len(lines)):
+        text = lines[i].lstrip()
+        if text:
+            return text, i
+    return '', len(lines) - 1
+
+
+def _remove_comments(lines):
+    """Replaces every comment line of the hunk with an empty line and returns if there was any.
+
+    A comment line is an added or removed line that starts with /* or *, the whitespace in front of it may span
+    several lines in which case all of them are replaced.
+    """
+    has_comment = False
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line[:1] in ('+', '-'):
+            text, end = _next_text(lines, i + 1) if not line[1:].strip() else (line[1:].lstrip(), i)
+            if text.startswith('*') or text.startswith('/*'):
+                has_comment = True
+                for j in range(i, end + 1):
+                    lines[j] = ''
+                i = end
+        i += 1
+    return has_comment
+
+
+def _is_technical_dept(lines, i):
+    """Checks if any // on the line is followed by a TODO, XXX or FIXME, optionally on a later line."""
+    line = lines[i]
+    pos = line.find('//', 1)
+    while pos >= 0:
+        text = line[pos + 2:].lstrip()
+        if not text:
+            text = _next_text(lines, i + 1)[0]
+        if text.startswith(_technical_dept_markers):
+            return True
+        pos = line.find('//', pos + 1)
+    return False
+
+
+def scan_java_hunk(content):
+    """Scans the content of a hunk of a Java file for documentation changes.
+
+    Java strings are removed first because they may span several lines, afterwards every line is visited at most
+    twice: once to remove the comment lines and once for the inline comments, the scan stops as soon as every flag
+    is set. The result is the same as the regular expressions used by the documentation approach before.
+
+    :param str content: content of the hunk
+    :return: HunkFlags
+    """
+    if '"' in content:
+        content = _java_string.sub('', content)
+    lines = content.split('\n')
+    javadoc = _remove_comments(lines)
+
+    inline = technical_dept_add = technical_dept_remove = False
+    for i, line in enumerate(lines):
+        first = line[:1]
+        if first not in ('+', '-') or line.find('//', 1) < 0:
+            continue
+        inline = True
+        if first == '+':
+            technical_dept_add = technical_dept_add or _is_technical_dept(lines, i)
+        else:
+            technical_dept_remove = technical_dept_remove or _is_technical_dept(lines, i)
+        if technical_dept_add and technical_dept_remove:
+            break
+    return HunkFlags(javadoc, inline, technical_dept_add, technical_dept_remove)
@@ -0,0 +1,160 @@
+import logging
+from collections import OrderedDict
+
+from datasource import data_source
+
+log = logging.getLogger('labelSHARK')
+
+# every field of an issue that is used by the issue based approaches
+ISSUE_FIELDS = ('id', 'issue_system_id', 'issue_type', 'status', 'resolution', 'title', 'desc', 'parent_issue_id',
+                'issue_type_verified')
+
+
+class IssueStore(object):
+    """Bounded LRU store for issues that is shared by the issue based approaches.
+
+    Issues are either preloaded for the issue systems of the project or fetched lazily in bulk,
+    parents of the fetched issues are resolved with one additional query.
+    Only the ISSUE_FIELDS are loaded.
+    """
+
+    def __init__(self, max_size=100000):
+        self._issues = OrderedDict()
+        self._event_marks = {}
+        self._preloaded = False
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config):
+        """Configures the size of the store and preloads the issues of the project if requested.
+
+        Called by every issue based approach, the preload is only done once.
+
+        :param dict config: labelSHARK config with issue_cache_size, preload_issues and its
+        """
+        self.max_size = config.get('issue_cache_size', self.max_size)
+        if config.get('preload_issues') and not self._preloaded:
+            self.preload([its.id for its in config.get('its', [])])
+
+    def preload(self, issue_system_ids):
+        """Loads the issues of the issue systems until the store is full.
+
+        :param list issue_system_ids: ids of the IssueSystems
+        """
+        self._preloaded = True
+        for issue in data_source.issues_of_systems(issue_system_ids, ISSUE_FIELDS):
+            if len(self._issues) >= self.max_size:
+                log.warning('issue store is full, preloaded only the first %i issues' % self.max_size)
+                break
+            self._issues[issue.id] = issue
+        log.info('preloaded %i issues' % len(self._issues))
+
+    def load(self, issue_ids):
+        """Fetches every issue that is not yet stored and their parents with one query each.
+
+        :param issue_ids: iterable of Issue ids
+        """
+        issues = self.get_many(issue_ids)
+        self._load(set(issue.parent_issue_id for issue in issues if issue.parent_issue_id))
+
+    def get_many(self, issue_ids):
+        """Returns every existing issue for the ids, missing issues are fetched with one query.
+
+        :param issue_ids: iterable of Issue ids
+        """
+        issue_ids = list(OrderedDict.fromkeys(issue_ids))
+        fetched = self._load(issue_ids)
+        ret = []
+        for issue_id in issue_ids:
+            # fetched issues may already be evicted again if the store is smaller than the request
+            issue = fetched[issue_id] if issue_id in fetched else self._get(issue_id)
+            if issue is not None:
+                ret.append(issue)
+        return ret
+
+    def get(self, issue_id):
+        """Returns the issue for the id or None if it does not exist.
+
+        :param obj issue_id: id of the Issue
+        """
+        issues = self.get_many([issue_id])
+        return issues[0] if issues else None
+
+    def get_parent(self, issue):
+        """Returns the parent of the issue or None if it has no parent."""
+        if not issue.parent_issue_id:
+            return None
+        return self.get(issue.parent_issue_id)
+
+    def input_states(self, commits, field):
+        """Returns the state of the issues every commit is labeled from.
+
+        The state of an issue consists of its ISSUE_FIELDS and the number and latest id of its events, it is
+        part of the fingerprints of the issue based approaches, so that their labels are computed again once an
+        issue changes or gets new events. The event marks are fetched with one query for every issue that has none
+        stored.
+
+        :param list commits: Commit objects from pycoshark models
+        :param str field: commit field with the ids of the issues, e.g., linked_issue_ids
+        :return: dict of commit id to a list with the state of every issue of the commit and its parent
+        """
+        issue_ids = [issue_id for commit in commits for issue_id in (getattr(commit, field) or [])]
+        self.load(issue_ids)
+        commit_issues = {}
+        for commit in commits:
+            issues = []
+            for issue in self.get_many(getattr(commit, field) or []):
+                issues.append(issue)
+                parent_issue = self.get_parent(issue)
+                if parent_issue is not None:
+                    issues.append(parent_issue)
+            commit_issues[commit.id] = issues
+
+        missing = set(issue.id for issues in commit_issues.values() for issue in issues
+                      if issue.id not in self._event_marks)
+        if missing:
+            marks = data_source.event_marks(missing)
+            self._event_marks.update({issue_id: marks.get(issue_id, [0, None]) for issue_id in missing})
+
+        return {commit_id: [[getattr(issue, name) for name in ISSUE_FIELDS] + self._event_marks[issue.id]
+                            for issue in issues]
+                for commit_id, issues in commit_issues.items()}
+
+    def clear(self):
+        self._issues = OrderedDict()
+        self._event_marks = {}
+        self._preloaded = False
+
+    def stats(self):
+        return {'size': len(self._issues), 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._issues)
+
+    def _get(self, issue_id):
+        issue = self._issues.get(issue_id)
+        if issue is not None:
+            self._issues.move_to_end(issue_id)
+        return issue
+
+    def _load(self, issue_ids):
+        missing = set()
+        for issue_id in issue_ids:
+            if issue_id in self._issues:
+                self.hits += 1
+            else:
+                missing.add(issue_id)
+        if not missing:
+            return {}
+
+        self.misses += len(missing)
+        fetched = {issue.id: issue for issue in data_source.issues(missing, ISSUE_FIELDS)}
+        self._issues.update(fetched)
+        while len(self._issues) > self.max_size:
+            evicted_id, _ = self._issues.popitem(last=False)
+            self._event_marks.pop(evicted_id, None)
+        return fetched
+
+
+issue_store = IssueStore()
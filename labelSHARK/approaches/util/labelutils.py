@@ -1,30 +1,147 @@
 import logging
 
-from pycoshark.mongomodels import Event, IssueSystem
-from pycoshark.utils import jira_is_resolved_and_fixed
+from pycoshark.utils import jira_is_resolved_and_fixed as pycoshark_jira_is_resolved_and_fixed
+
+from datasource import data_source, MongoDataSource
+from approaches.util.bzindex import bz_index
 
 log = logging.getLogger('labelSHARK')
 
+# copied from pycoshark.utils (pycoSHARK 1.4.5) for snapshot_jira_is_resolved_and_fixed, they are private there,
+# tests/labelutils_tests.py compares them with the installed pycoshark
+_CLOSED_STATUS = {'resolved', 'closed'}
+_RESOLVED_TYPES = {'workaround', 'auto closed', 'delivered', 'resolved', 'fixed', 'implemented', 'done'}
+_WONT_FIX_TYPES = {"won't do", 'not a bug', 'cannot reproduce', "won't fix", 'works for me', 'not a problem',
+                   'duplicate', 'invalid'}
+
+
+class IssueSystemCache(object):
+    """Resolves every issue system only once per run and keeps its type (jira, bugzilla or github).
+
+    A project only has a handful of issue systems, so this saves one query per checked issue.
+    """
+
+    def __init__(self):
+        self._systems = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_type(self, issue_system_id):
+        """Returns the type of the issue system, i.e., jira, bugzilla, github or None if the type is unknown.
+
+        :param obj issue_system_id: id of the IssueSystem
+        """
+        return self._get(issue_system_id)[0]
+
+    def get_url(self, issue_system_id):
+        return self._get(issue_system_id)[1]
+
+    def clear(self):
+        self._systems = {}
+
+    def stats(self):
+        return {'size': len(self._systems), 'hits': self.hits, 'misses': self.misses}
+
+    def _get(self, issue_system_id):
+        if issue_system_id in self._systems:
+            self.hits += 1
+        else:
+            self.misses += 1
+            its = data_source.issue_system(issue_system_id)
+            self._systems[issue_system_id] = (its_type_from_url(its.url), its.url)
+        return self._systems[issue_system_id]
+
+
+its_cache = IssueSystemCache()
+
+
+def configure(config):
+    """Configures the shared helpers of the labelutils.
+
+    :param dict config: labelSHARK config
+    """
+    bz_index.configure(config)
 
-def isbugfix(issue):
-    its = IssueSystem.objects(id=issue.issue_system_id).get()
-    if 'jira' in its.url:
+
+def its_type_from_url(url):
+    if 'jira' in url:
+        return 'jira'
+    elif 'bugzilla' in url:
+        return 'bugzilla'
+    elif 'github' in url:
+        return 'github'
+    return None
+
+
+def jira_is_resolved_and_fixed(issue):
+    """Checks if the JIRA issue was closed and resolved as fixed at least once.
+
+    On the MongoDB this is jira_is_resolved_and_fixed of pycoshark. It queries the Event model directly, so a
+    snapshot uses snapshot_jira_is_resolved_and_fixed instead.
+
+    :param issue: the issue
+    """
+    if isinstance(data_source.backend, MongoDataSource):
+        return pycoshark_jira_is_resolved_and_fixed(issue)
+    return snapshot_jira_is_resolved_and_fixed(issue)
+
+
+def snapshot_jira_is_resolved_and_fixed(issue):
+    """Copy of jira_is_resolved_and_fixed of pycoshark that reads the events from the data source.
+
+    :param issue: the issue
+    """
+    # first we check if the issue itself contains information about its state
+    if issue.resolution and issue.resolution.lower() in _WONT_FIX_TYPES:
+        return False
+    if issue.resolution and issue.resolution.lower() in _RESOLVED_TYPES and issue.status and \
+            issue.status.lower() in _CLOSED_STATUS:
+        return True
+
+    # then we check all events related to the issue
+    current_status = None
+    current_resolution = None
+    for e in data_source.events(issue.id):
+        if e.status is not None and e.status.lower() == 'status' and e.new_value is not None:
+            current_status = e.new_value.lower()
+        if e.status is not None and e.status.lower() == 'resolution' and e.new_value is not None:
+            current_resolution = e.new_value.lower()
+        if current_status in _CLOSED_STATUS and current_resolution in _RESOLVED_TYPES:
+            return True
+    return False
+
+
+def isbugfix(issue, its_type=None):
+    """Checks if the issue is a fixed bug.
+
+    :param issue: the issue
+    :param str its_type: type of the issue system of the issue, looked up in the its_cache if not given
+    """
+    if its_type is None:
+        its_type = its_cache.get_type(issue.issue_system_id)
+    if its_type == 'jira':
         return _jira_isbugfix(issue)
-    elif 'bugzilla' in its.url:
+    elif its_type == 'bugzilla':
         return _bz_isbugfix(issue)
-    elif 'github' in its.url:
+    elif its_type == 'github':
         return _gh_isbugfix(issue)
     else:
-        log.error('unknown ITS type for ITS url %s for bugfix labels' % its.url)
+        log.error('unknown ITS type for ITS url %s for bugfix labels' % its_cache.get_url(issue.issue_system_id))
         return False
 
 
-def isfeatureadd(issue):
-    its = IssueSystem.objects(id=issue.issue_system_id).get()
-    if 'jira' in its.url:
+def isfeatureadd(issue, its_type=None):
+    """Checks if the issue is an added feature.
+
+    :param issue: the issue
+    :param str its_type: type of the issue system of the issue, looked up in the its_cache if not given
+    """
+    if its_type is None:
+        its_type = its_cache.get_type(issue.issue_system_id)
+    if its_type == 'jira':
         return _is_jira_featureadd(issue)
     else:
-        log.error('unknown ITS type for ITS url %s for feature add labels' % its.url)
+        log.error('unknown ITS type for ITS url %s for feature add labels' % its_cache.get_url(issue.issue_system_id))
         return False
 
 def _is_jira_featureadd(issue):
@@ -57,10 +174,10 @@ def _bz_isbugfix(issue):
                 resolved = True
                 fixed |= issue.resolution == 'fixed'
 
-            for e in Event.objects.filter(issue_id=issue.id):
-                resolved |= e.status is not None and e.status.lower() == 'status' and e.new_value is not None and e.new_value.lower() in [
-                    'resolved', 'closed']
-                fixed |= e.status is not None and e.status.lower() == 'resolution' and e.new_value is not None and e.new_value.lower() == 'fixed'
+            # the events of all bugs of the issue system are indexed with one aggregation
+            events_resolved, events_fixed = bz_index.lookup(issue)
+            resolved |= events_resolved
+            fixed |= events_fixed
     return resolved and fixed
 
 
@@ -0,0 +1,127 @@
+import logging
+from collections import OrderedDict
+
+import pandas as pd
+
+from datasource import data_source
+
+log = logging.getLogger('labelSHARK')
+
+
+def classify(messages, patterns):
+    """Classifies the messages with every pattern using pandas string operations.
+
+    Every pattern is matched against the lower case message like re.match, i.e., at the start of the message.
+    Equal messages, e.g., of merge commits, are only classified once.
+
+    :param messages: iterable of commit messages
+    :param list patterns: compiled regular expressions
+    :return: list with the flags of every message, bit i is set if pattern i matches
+    """
+    messages = pd.Series(list(messages), dtype=object).fillna('').str.lower()
+    if messages.empty:
+        return []
+    unique = pd.Series(messages.unique(), dtype=object)
+    flags = pd.Series(0, index=unique.index)
+    for i, pattern in enumerate(patterns):
+        flags |= unique.str.match(pattern).astype(int) * (1 << i)
+    flags.index = unique
+    return [int(value) for value in messages.map(flags)]
+
+
+class MessageFlags(object):
+    """Bounded table of the keyword flags of commit messages by commit id, shared by the message based approaches.
+
+    The approaches register their patterns when they are configured and read the flags of their commits from the
+    table. With preload_messages the table is filled with one pass over the messages of the VCS system, the
+    commits are then loaded without their message. Otherwise the flags of every batch are classified from the
+    messages of its commits.
+    """
+
+    def __init__(self, max_size=200000, chunk_size=10000):
+        self._patterns = []
+        self._flags = OrderedDict()
+        self._preloaded = set()
+        self.preload_messages = False
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config):
+        """:param dict config: labelSHARK config with message_table_size and preload_messages"""
+        self.max_size = config.get('message_table_size', self.max_size)
+        self.preload_messages = config.get('preload_messages', self.preload_messages)
+
+    def register(self, pattern):
+        """Registers a pattern before the first commit and returns the bit of its flag.
+
+        :param pattern: compiled regular expression that is matched against the lower case message
+        """
+        if pattern not in self._patterns:
+            if self._flags:
+                raise Exception('patterns have to be registered before the first commit')
+            self._patterns.append(pattern)
+        return self._patterns.index(pattern)
+
+    def preload(self, vcs_system_id):
+        """Classifies the messages of the commits of the VCS system in chunks until the table is full."""
+        self._preloaded.add(vcs_system_id)
+        chunk = []
+        for commit in data_source.commit_messages(vcs_system_id):
+            chunk.append(commit)
+            if len(chunk) == self.chunk_size:
+                self._add(chunk)
+                chunk = []
+                if len(self._flags) >= self.max_size:
+                    log.warning('message table is full, preloaded only the first %i messages' % self.max_size)
+                    break
+        else:
+            self._add(chunk)
+        log.info('preloaded the flags of %i messages' % len(self._flags))
+
+    def get_many(self, commits):
+        """Returns the flags of the commits, the messages that are not in the table are classified together.
+
+        :param list commits: Commit objects from pycoshark models, with their message unless the messages are
+                             preloaded
+        :return: dict of commit id to the flags, bit i is set if the i-th registered pattern matches
+        """
+        if self.preload_messages and commits and commits[0].vcs_system_id not in self._preloaded:
+            self.preload(commits[0].vcs_system_id)
+
+        ret = {}
+        missing = []
+        for commit in commits:
+            if commit.id in self._flags:
+                self.hits += 1
+                self._flags.move_to_end(commit.id)
+                ret[commit.id] = self._flags[commit.id]
+            else:
+                missing.append(commit)
+        if missing:
+            self.misses += len(missing)
+            if self.preload_messages:
+                # the commits are loaded without their message, e.g., if the table was full
+                missing = list(data_source.commit_messages(missing[0].vcs_system_id,
+                                                           [commit.id for commit in missing]))
+            ret.update(self._add(missing))
+        return ret
+
+    def stats(self):
+        return {'size': len(self._flags), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self._flags = OrderedDict()
+        self._preloaded = set()
+
+    def _add(self, commits):
+        flags = dict(zip((commit.id for commit in commits),
+                         classify((commit.message for commit in commits), self._patterns)))
+        self._flags.update(flags)
+        while len(self._flags) > self.max_size:
+            self._flags.popitem(last=False)
+        return flags
+
+
+message_flags = MessageFlags()
@@ -1,10 +1,8 @@
 import logging
 
-from pycoshark.mongomodels import Issue
-from pycoshark.utils import jira_is_resolved_and_fixed
-
 from core import LabelSHARK, BaseLabelApproach
-from approaches.util import labelutils
+from approaches.util.issuestore import issue_store
+from approaches.util.labelutils import jira_is_resolved_and_fixed
 
 
 @LabelSHARK.approach
@@ -12,20 +10,37 @@ class IssueOnly(BaseLabelApproach):
     """This labels commits as bugfix only based on linked issues.
     """
 
+    commit_fields = ('fixed_issue_ids',)
+    default_labels = [('bugfix', False)]
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self._labels = []
 
+    def configure(self, config):
+        issue_store.configure(config)
+
+    def is_relevant(self, commit):
+        return bool(commit.fixed_issue_ids)
+
+    def input_state(self, commits):
+        return issue_store.input_states(commits, 'fixed_issue_ids')
+
+    def label_batch(self, commits):
+        # fetch the fixed issues and their parents of the whole chunk at once
+        issue_store.load([issue_id for commit in commits for issue_id in (commit.fixed_issue_ids or [])])
+        return super().label_batch(commits)
+
     def set_commit(self, commit):
         self._labels = []
 
         isbugfix = False
         if commit.fixed_issue_ids is not None and len(commit.fixed_issue_ids) > 0:
-            for issue in Issue.objects(id__in=commit.fixed_issue_ids):
+            for issue in issue_store.get_many(commit.fixed_issue_ids):
                 if issue.issue_type_verified and issue.issue_type_verified.lower() == 'bug':
                     isbugfix |= jira_is_resolved_and_fixed(issue)
-                if issue.parent_issue_id:
-                    parent_issue = Issue.objects(id=issue.parent_issue_id).get()
+                parent_issue = issue_store.get_parent(issue)
+                if parent_issue is not None:
                     if parent_issue.issue_type_verified and parent_issue.issue_type_verified.lower() == 'bug':
                         isbugfix |= jira_is_resolved_and_fixed(parent_issue)
         self._labels.append(('bugfix', isbugfix))
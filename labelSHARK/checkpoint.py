@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The checkpoint module keeps track of the progress of a labeling run so that it can be resumed."""
+
+import json
+import logging
+import os
+
+from bson import ObjectId
+
+
+class Checkpoint(object):
+    """Progress of a labeling run.
+
+    The progress is kept as a list of inclusive ranges of commit ids whose labels are written. It is stored as
+    JSON file whenever it advances and removed once the run is finished. A checkpoint is only resumed by a run
+    for the same VCS system, approaches and shard.
+    """
+
+    def __init__(self, path, vcs_system_id, approaches, shard=None):
+        """
+        :param str path: path of the checkpoint file
+        :param obj vcs_system_id: id of the VCSSystem
+        :param list approaches: names of the approaches of the run
+        :param str shard: shard of the run, e.g., 0/4
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self._key = {'vcs_system_id': str(vcs_system_id), 'approaches': sorted(approaches), 'shard': shard}
+        self._current = None
+        self.ranges = []
+
+    def load(self):
+        """Loads the progress of a previous run.
+
+        :return: True if the progress was loaded
+        """
+        if not os.path.isfile(self.path):
+            self._log.info('no checkpoint found at {}'.format(self.path))
+            return False
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        if any(data.get(k) != v for k, v in self._key.items()):
+            self._log.warning('checkpoint {} is from a run with other settings, it is ignored'.format(self.path))
+            return False
+        self.ranges = [[ObjectId(first), ObjectId(last)] for first, last in data['ranges']]
+        return True
+
+    def add(self, first, last):
+        """Adds a finished range of commit ids and stores the checkpoint."""
+        self.ranges.append([first, last])
+        self.save()
+
+    def advance(self, first, last):
+        """Extends the range of this run, for runs that label the commits ordered by their id.
+
+        :param first: id of the first commit of the page
+        :param last: id of the last commit of the page
+        """
+        if self._current is None:
+            self._current = [first, last]
+            self.ranges.append(self._current)
+        else:
+            self._current[1] = last
+        self.save()
+
+    def save(self):
+        data = dict(self._key, ranges=[[str(first), str(last)] for first, last in self.ranges])
+        # write and rename, so that a crash never leaves a broken checkpoint behind
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -6,11 +6,66 @@ and the LabelSHARK class which provides the rough plugin structure for approache
 """
 
 import abc
+import contextlib
+import functools
+import hashlib
+import json
 import logging
 
 
 class BaseLabelApproach(metaclass=abc.ABCMeta):
-    """Abstract base class for labeling approaches."""
+    """Abstract base class for labeling approaches.
+
+    The version, the commit_fields and the input_state are used for incremental labeling: the labels of a commit
+    are only computed again if the version of the approach, the values of the commit fields or the state of the
+    other documents the labels are computed from changed. Approaches that do not implement input_state are
+    never skipped.
+    The version should be increased whenever the approach computes different labels.
+    If commit_fields is None every loaded field of the commit is taken into account.
+    The commit_fields are also the fields of the commits that are loaded for the approach, if any approach does
+    not declare them the commits are loaded with every field.
+    Approaches that only compute something for some commits, e.g., commits with linked issues, declare the
+    default_labels of every other commit and decide in is_relevant which commits they get.
+    Approaches can keep a dict of counters, e.g., of the work they skipped, which is added to the run statistics.
+    The label_names are the names of every label the approach returns, if they are not declared the names of the
+    default_labels are used. They give the columns of file sinks with a fixed schema, e.g., Parquet.
+    """
+
+    version = '1'
+    commit_fields = None
+    default_labels = None
+    label_names = None
+    counters = None
+
+    def configure(self, config):
+        """Called once before the first commit with the labelSHARK config.
+
+        :param dict config: the command line arguments, the project_id, the vcs_system_id and the IssueSystems
+                            of the project under the key its
+        """
+        pass
+
+    def is_relevant(self, commit):
+        """Returns if the approach has to label the commit, only used if the approach declares default_labels.
+
+        The decision must only depend on the commit_fields of the commit.
+
+        :param commit: Commit object from pycoshark models
+        """
+        return True
+
+    def input_state(self, commits):
+        """Returns the state of the documents besides the commit from which the labels of the commits are computed.
+
+        The state becomes part of the fingerprint of the labels, e.g., the status and the latest event of the linked
+        issues, so that the labels are computed again once these documents change. Approaches that read nothing
+        but the commit fields return an empty dict. The default returns None, i.e., the inputs of the approach
+        are unknown and its labels are always computed again.
+
+        :param list commits: Commit objects from pycoshark models
+        :return: dict of commit id to a JSON serializable state or None
+        """
+        return None
 
     @abc.abstractmethod
     def set_commit(self, commit):
@@ -20,6 +75,43 @@ class BaseLabelApproach(metaclass=abc.ABCMeta):
     def get_labels(self):
         pass
 
+    def label_batch(self, commits):
+        """Labels a chunk of commits at once.
+
+        Approaches can override this to fetch everything they need for the whole chunk with one query
+        instead of one query per commit. The default falls back to set_commit and get_labels for every commit.
+
+        :param list commits: Commit objects from pycoshark models.
+        :return: dict of commit id to the list of (key, value) tuples for that commit
+        """
+        ret = {}
+        for commit in commits:
+            self.set_commit(commit)
+            ret[commit.id] = self.get_labels()
+        return ret
+
+
+def fingerprint(app_name, app, commit, state=None):
+    """Fingerprint of the approach version, the commit fields and the state of the other documents the approach
+    depends on.
+
+    If the approach does not declare its commit_fields every loaded field of the commit except for the labels
+    is used.
+
+    :param str app_name: name of the approach
+    :param app: the approach
+    :param commit: Commit object from pycoshark models
+    :param state: state of the other documents from input_state of the approach
+    """
+    if app.commit_fields is None:
+        values = commit.to_mongo().to_dict()
+        # the labels are written by the run itself
+        values.pop('labels', None)
+    else:
+        values = {field: getattr(commit, field) for field in app.commit_fields}
+    data = json.dumps([app_name, app.version, values, state], default=str, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
 
 class LabelSHARK(object):
     """LabelSHARK plugin structure.
@@ -27,9 +119,55 @@ class LabelSHARK(object):
     This class calls every registered labeling approach plugin.
     """
     approaches = []
+    # the fields of the commits that labelSHARK and the shared utilities need, e.g., for the log and the file paths,
+    # and the stored labels so that unchanged labels are not written again
+    commit_fields = ('id', 'revision_hash', 'vcs_system_id', 'labels')
 
-    def __init__(self):
+    def __init__(self, stats=None):
+        """
+        :param stats: optional RunStatistics which record the time and MongoDB commands of every approach
+        """
         self._log = logging.getLogger(self.__class__.__name__)
+        self.stats = stats
+        self.default_labeled = {}
+
+    def projection(self):
+        """Returns the fields of the commits that the approaches need or None if every field is needed."""
+        fields = list(self.commit_fields)
+        for app in self.approaches:
+            if app.commit_fields is None:
+                return None
+            fields.extend(field for field in app.commit_fields if field not in fields)
+        return tuple(fields)
+
+    def label_keys(self):
+        """Returns the prefixed keys of every label declared by the approaches, see label_names."""
+        keys = []
+        for app in self.approaches:
+            app_name = app.__module__.replace('approaches.', '')
+            names = app.label_names
+            if names is None and app.default_labels is not None:
+                names = [name for name, _ in app.default_labels]
+            keys.extend('{}_{}'.format(app_name, name) for name in names or [])
+        return keys
+
+    def configure(self, config):
+        """Passes the config to every registered approach.
+
+        :param dict config: the command line arguments, the project_id, the vcs_system_id and the IssueSystems
+                            of the project under the key its
+        """
+
+        for app in self.approaches:
+            app_name = app.__module__.replace('approaches.', '')
+            self._log.debug('configuring {}'.format(app_name))
+            app.configure(config)
+            if self.stats is not None and app.counters is not None:
+                self.stats.add_source(app_name, functools.partial(dict, app.counters))
+            if app.default_labels is not None:
+                self.default_labeled[app_name] = 0
+        if self.stats is not None and self.default_labeled:
+            self.stats.add_source('default_labels', functools.partial(dict, self.default_labeled))
 
     def set_commit(self, commit):
         """Passes the current commit model to the approach class.
@@ -41,7 +179,8 @@ class LabelSHARK(object):
             app_name = app.__module__.replace('approaches.', '')
             self._log.debug('setting commit for {}'.format(app_name))
             try:
-                app.set_commit(commit)
+                with self._measure(app_name, 1):
+                    app.set_commit(commit)
             except Exception as e:
                 self._log.exception('error setting commit in {}'.format(app_name))
 
@@ -60,13 +199,97 @@ class LabelSHARK(object):
             # every plugin should return a list of tuples
             # this hould result in a list of: (approach_key, value)
             try:
-                for k, v in app.get_labels():
+                with self._measure(app_name, 0):
+                    labels = app.get_labels()
+                for k, v in labels:
                     ret.append(('{}_{}'.format(app_name, k), v))
             except Exception as e:
                 self._log.error('error getting labels from {}'.format(app_name))
                 self._log.exception(e)
         return ret
 
+    def label_batch(self, commits, label_state=None):
+        """Calls every registered commit labeling approach for a chunk of commits.
+
+        If the batch call of an approach fails the chunk is labeled commit by commit for this approach,
+        so that a single broken commit does not cost us the labels of the whole chunk.
+        Every collected label is prefixed with the name of the approach.
+
+        If a label_state is given, every approach that describes its inputs only gets the commits whose labels were
+        computed from different inputs and the fingerprints of the new labels are recorded in the label_state.
+        Approaches with default_labels only get their relevant commits, the other commits get the default labels.
+
+        :param list commits: Commit objects from pycoshark models.
+        :param label_state: optional LabelState with the fingerprints of the stored labels
+        :return: dict of commit id to the list of (approach_key, value) tuples for that commit
+        """
+
+        ret = {commit.id: [] for commit in commits}
+        for app in self.approaches:
+            app_name = app.__module__.replace('approaches.', '')
+            app_commits = commits
+            fingerprints = None
+            if label_state is not None:
+                with self._measure(app_name, 0):
+                    states = app.input_state(commits)
+                if states is None:
+                    # without the state of its inputs the labels of the approach are always computed again
+                    label_state.outdated += len(commits)
+                else:
+                    fingerprints = {commit.id: fingerprint(app_name, app, commit, states.get(commit.id))
+                                    for commit in commits}
+                    app_commits = [commit for commit in commits
+                                   if not label_state.is_current(commit.id, app_name, fingerprints[commit.id])]
+                    if not app_commits:
+                        continue
+
+            labels = {}
+            relevant_commits = app_commits
+            if app.default_labels is not None:
+                relevant_commits = []
+                for commit in app_commits:
+                    if app.is_relevant(commit):
+                        relevant_commits.append(commit)
+                    else:
+                        labels[commit.id] = app.default_labels
+                self.default_labeled[app_name] += len(labels)
+
+            if relevant_commits:
+                self._log.debug('labeling batch of {} commits with {}'.format(len(relevant_commits), app_name))
+                with self._measure(app_name, len(relevant_commits)):
+                    try:
+                        labels.update(app.label_batch(relevant_commits))
+                    except Exception as e:
+                        self._log.exception('error labeling batch in {}, falling back to single commits'
+                                            .format(app_name))
+                        labels.update(self._label_single(app, app_name, relevant_commits))
+
+            for commit in app_commits:
+                # no labels means nothing was computed, e.g., because of an error
+                if not labels.get(commit.id):
+                    continue
+                for k, v in labels[commit.id]:
+                    ret[commit.id].append(('{}_{}'.format(app_name, k), v))
+                if fingerprints is not None:
+                    label_state.record(commit.id, app_name, fingerprints[commit.id])
+        return ret
+
+    def _measure(self, app_name, num_commits):
+        if self.stats is None:
+            return contextlib.ExitStack()
+        return self.stats.measure(app_name, num_commits)
+
+    def _label_single(self, app, app_name, commits):
+        labels = {}
+        for commit in commits:
+            try:
+                app.set_commit(commit)
+                labels[commit.id] = app.get_labels()
+            except Exception as e:
+                self._log.error('error getting labels from {} for commit {}'.format(app_name, commit.revision_hash))
+                self._log.exception(e)
+        return labels
+
     @classmethod
     def approach(cls, approach):
         """Registers an approach with LabelSHARK.
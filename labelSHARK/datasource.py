@@ -0,0 +1,539 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The datasource module provides the documents that labelSHARK and the approaches read.
+
+The documents are either read from the MongoDB or from a snapshot of one project on the local disk that was
+created with export_snapshot. Both backends return the same types, so the approaches do not need to know which
+one is used. The commits and the documents that the approaches read for them are returned as lightweight records
+with the loaded fields, or as pycoshark documents if the backend is created with raw=False, e.g., for approaches
+that need the document methods. The project, VCS system and issue systems are always documents.
+"""
+
+import functools
+import logging
+import mmap
+import os
+from datetime import datetime
+
+from bson import json_util
+from mongoengine import DoesNotExist
+from pycoshark.mongomodels import Project, VCSSystem, IssueSystem, Commit, Issue, Event, FileAction, File, Hunk, \
+    CodeEntityState, Refactoring
+
+from records import record_type
+
+log = logging.getLogger('labelSHARK')
+
+# every field that labelSHARK reads, only these are exported to a snapshot
+SNAPSHOT_FIELDS = {
+    Commit: ('id', 'revision_hash', 'vcs_system_id', 'message', 'linked_issue_ids', 'parents', 'fixed_issue_ids',
+             'szz_issue_ids', 'code_entity_states'),
+    Issue: ('id', 'issue_system_id', 'issue_type', 'status', 'resolution', 'title', 'desc', 'parent_issue_id',
+            'issue_type_verified'),
+    Event: ('id', 'issue_id', 'status', 'new_value', 'created_at'),
+    FileAction: ('id', 'commit_id', 'file_id', 'parent_revision_hash'),
+    File: ('id', 'vcs_system_id', 'path'),
+    Hunk: ('id', 'file_action_id', 'content'),
+    CodeEntityState: ('id', 'commit_id', 'long_name', 'imports', 'ce_type'),
+    Refactoring: ('id', 'commit_id'),
+}
+
+EVENT_FIELDS = SNAPSHOT_FIELDS[Event]
+FILE_ACTION_FIELDS = ('id', 'commit_id', 'file_id', 'parent_revision_hash')
+FILE_FIELDS = ('id', 'path')
+HUNK_FIELDS = ('id', 'file_action_id', 'content')
+CODE_ENTITY_STATE_FIELDS = ('id', 'commit_id', 'long_name', 'imports')
+
+# naive UTC dates like the documents that pymongo returns
+JSON_OPTIONS = json_util.JSONOptions(tz_aware=False)
+
+
+def _projection(model, fields):
+    return {model._fields[field].db_field: 1 for field in fields}
+
+
+def _exclude_query(ranges):
+    return {'$nor': [{'_id': {'$gte': first, '$lte': last}} for first, last in ranges]}
+
+
+class MongoDataSource(object):
+    """Reads the documents from the MongoDB, with raw pymongo queries or with the pycoshark models."""
+
+    chunk_size = 10000
+
+    def __init__(self, raw=True):
+        """
+        :param bool raw: return records instead of pycoshark documents
+        """
+        self.raw = raw
+
+    def _find(self, model, query, fields, sort=None, limit=0):
+        """Returns the documents of the query with the fields as records, or as pycoshark documents if the
+        data source is not raw or fields is None.
+
+        :param model: pycoshark model
+        :param dict query: raw MongoDB query
+        :param fields: names of the model fields that are loaded, every field if None
+        :param list sort: optional list of (db field, direction) tuples
+        :param int limit: maximum number of documents, 0 for no limit
+        """
+        if not self.raw or fields is None:
+            documents = model.objects(__raw__=query)
+            if sort:
+                documents = documents.order_by(*(('-' if direction < 0 else '') + model._reverse_db_field_map[key]
+                                                 for key, direction in sort))
+            if limit:
+                documents = documents.limit(limit)
+            return documents if fields is None else documents.only(*fields)
+        record = record_type(model, tuple(fields))
+        cursor = model._get_collection().find(query, _projection(model, fields), sort=sort, limit=limit)
+        return map(record, cursor)
+
+    def project(self, name):
+        return Project.objects(name=name).get()
+
+    def vcs_system(self, project_id):
+        return VCSSystem.objects(project_id=project_id).get()
+
+    def issue_systems(self, project_id):
+        return list(IssueSystem.objects(project_id=project_id))
+
+    def issue_system(self, issue_system_id):
+        return IssueSystem.objects(id=issue_system_id).only('id', 'url').get()
+
+    def commit_ids(self, vcs_system_id):
+        """Returns the ids of the commits of the VCS system ordered by id."""
+        return list(Commit.objects(vcs_system_id=vcs_system_id).order_by('id').scalar('id'))
+
+    def commit_messages(self, vcs_system_id, commit_ids=None):
+        """Returns the ids and messages of the commits of the VCS system, of every commit if no ids are given."""
+        query = {'vcs_system_id': vcs_system_id}
+        if commit_ids is not None:
+            query['_id'] = {'$in': list(commit_ids)}
+        return self._find(Commit, query, ('id', 'vcs_system_id', 'message'))
+
+    def count_commits(self, vcs_system_id, exclude=()):
+        commits = Commit.objects(vcs_system_id=vcs_system_id)
+        if exclude:
+            commits = commits.filter(__raw__=_exclude_query(exclude))
+        return commits.count()
+
+    def commit_pages(self, vcs_system_id, fields, page_size, first_id=None, last_id=None, exclude=()):
+        """Yields the commits of the VCS system ordered by their id in pages.
+
+        Every page is read with its own short query that continues after the last id of the previous page, so
+        that no cursor has to be kept open on the server while the commits are labeled.
+
+        :param vcs_system_id: id of the VCSSystem
+        :param fields: fields of the commits that are loaded, every field if None
+        :param int page_size: number of commits per page
+        :param first_id: optional id of the first commit
+        :param last_id: optional id of the last commit
+        :param exclude: inclusive ranges of commit ids that are skipped
+        """
+        query = {'vcs_system_id': vcs_system_id}
+        if exclude:
+            query.update(_exclude_query(exclude))
+        id_query = {}
+        if first_id is not None:
+            id_query['$gte'] = first_id
+        if last_id is not None:
+            id_query['$lte'] = last_id
+        last = None
+        while True:
+            page_id_query = id_query if last is None else dict(id_query, **{'$gt': last})
+            page_query = dict(query, _id=page_id_query) if page_id_query else query
+            page = list(self._find(Commit, page_query, fields, sort=[('_id', 1)], limit=page_size))
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last = page[-1].id
+
+    def issues(self, issue_ids, fields):
+        return list(self._find(Issue, {'_id': {'$in': list(issue_ids)}}, fields))
+
+    def issues_of_systems(self, issue_system_ids, fields):
+        return self._find(Issue, {'issue_system_id': {'$in': list(issue_system_ids)}}, fields)
+
+    def events(self, issue_id):
+        """Returns the events of the issue ordered by their creation."""
+        return self._find(Event, {'issue_id': issue_id}, EVENT_FIELDS, sort=[('created_at', 1)])
+
+    def event_marks(self, issue_ids):
+        """Returns the number of events and the id of the latest event of every issue with events.
+
+        :return: dict of issue id to [number of events, id of the latest event]
+        """
+        pipeline = [{'$match': {'issue_id': {'$in': list(issue_ids)}}},
+                    {'$group': {'_id': '$issue_id', 'count': {'$sum': 1}, 'latest': {'$max': '$_id'}}}]
+        return {row['_id']: [row['count'], str(row['latest'])]
+                for row in Event._get_collection().aggregate(pipeline, allowDiskUse=True)}
+
+    def event_stamp(self):
+        """Returns the number of events and the id of the latest event, both change with every collection run.
+
+        Both are read from the _id index and the collection metadata, i.e., without a scan of the events.
+        """
+        collection = Event._get_collection()
+        latest = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        return {'events': collection.estimated_document_count(),
+                'latest_event_id': str(latest['_id']) if latest is not None else None}
+
+    def resolved_and_fixed_bugs(self, issue_system_id):
+        """Returns the number of bugs of the issue system and the ids of the bugs that were ever resolved/closed
+        and that were ever fixed according to their events.
+
+        The events are grouped with one aggregation per chunk of bugs.
+        """
+        resolved = set()
+        fixed = set()
+        bug_ids = list(Issue.objects(issue_system_id=issue_system_id, issue_type__iexact='bug').scalar('id'))
+        for i in range(0, len(bug_ids), self.chunk_size):
+            pipeline = [
+                {'$match': {'issue_id': {'$in': bug_ids[i:i + self.chunk_size]}}},
+                {'$project': {'issue_id': 1, 'status': {'$toLower': '$status'},
+                              'new_value': {'$toLower': '$new_value'}}},
+                {'$match': {'$or': [{'status': 'status', 'new_value': {'$in': ['resolved', 'closed']}},
+                                    {'status': 'resolution', 'new_value': 'fixed'}]}},
+                {'$group': {'_id': {'issue_id': '$issue_id', 'status': '$status'}}},
+            ]
+            for row in Event._get_collection().aggregate(pipeline, allowDiskUse=True):
+                if row['_id']['status'] == 'status':
+                    resolved.add(row['_id']['issue_id'])
+                else:
+                    fixed.add(row['_id']['issue_id'])
+        return len(bug_ids), resolved, fixed
+
+    def file_actions(self, commit_ids):
+        return self._find(FileAction, {'commit_id': {'$in': list(commit_ids)}}, FILE_ACTION_FIELDS)
+
+    def files(self, file_ids):
+        return self._find(File, {'_id': {'$in': list(file_ids)}}, FILE_FIELDS)
+
+    def files_of_vcs_system(self, vcs_system_id):
+        return self._find(File, {'vcs_system_id': vcs_system_id}, FILE_FIELDS)
+
+    def hunks(self, file_action_ids):
+        return self._find(Hunk, {'file_action_id': {'$in': list(file_action_ids)}}, HUNK_FIELDS)
+
+    def hunk_counts(self, file_action_ids):
+        """Returns the number of hunks of every file action with hunks."""
+        pipeline = [{'$match': {'file_action_id': {'$in': list(file_action_ids)}}},
+                    {'$group': {'_id': '$file_action_id', 'count': {'$sum': 1}}}]
+        return {row['_id']: row['count'] for row in Hunk._get_collection().aggregate(pipeline)}
+
+    def file_states_by_commit(self, commit_ids, long_names):
+        """Returns the file code entity states of the commits with one of the long names."""
+        return self._find(CodeEntityState, {'commit_id': {'$in': list(commit_ids)}, 'ce_type': 'file',
+                                            'long_name': {'$in': list(long_names)}}, CODE_ENTITY_STATE_FIELDS)
+
+    def file_states_by_id(self, state_ids, long_names):
+        """Returns the file code entity states with one of the ids and one of the long names."""
+        return self._find(CodeEntityState, {'_id': {'$in': list(state_ids)}, 'ce_type': 'file',
+                                            'long_name': {'$in': list(long_names)}}, CODE_ENTITY_STATE_FIELDS)
+
+    def refactoring_counts(self, commit_ids):
+        """Returns the number of refactorings of every commit with at least one refactoring."""
+        pipeline = [{'$match': {'commit_id': {'$in': list(commit_ids)}}},
+                    {'$group': {'_id': '$commit_id', 'count': {'$sum': 1}}}]
+        return {row['_id']: row['count'] for row in Refactoring._get_collection().aggregate(pipeline)}
+
+
+class SnapshotTable(object):
+    """Documents of one collection in the JSONL file of a snapshot.
+
+    The file is memory-mapped and only the offsets of the documents are kept in memory, indexed by the given keys.
+    Documents are decoded when they are accessed and turned into the type of the table, e.g., a record type or the
+    _from_son of the model.
+    """
+
+    def __init__(self, path, record, keys=()):
+        self._record = record
+        self._offsets = []
+        self._ids = []
+        self._index = {key: {} for key in keys}
+        self._mmap = None
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = 0
+        while start < len(self._mmap):
+            end = self._mmap.find(b'\n', start)
+            if end < 0:
+                end = len(self._mmap)
+            if end > start:
+                doc = json_util.loads(self._mmap[start:end], json_options=JSON_OPTIONS)
+                for key, index in self._index.items():
+                    index.setdefault(doc.get(key), []).append(len(self._offsets))
+                self._offsets.append((start, end))
+                self._ids.append(doc.get('_id'))
+            start = end + 1
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def ids(self, key, value):
+        """Returns the ids of the documents whose key is the value without decoding them."""
+        return [self._ids[i] for i in self._index[key].get(value, [])]
+
+    def all_ids(self):
+        """Returns the ids of every document without decoding them."""
+        return list(self._ids)
+
+    def contains(self, key, value):
+        return value in self._index[key]
+
+    def find(self, key, value, record=None):
+        """Returns the documents whose key is the value.
+
+        :param record: optional type of the returned documents instead of the type of the table
+        """
+        return [self._get(i, record) for i in self._index[key].get(value, [])]
+
+    def find_many(self, key, values, record=None):
+        """Returns the documents whose key is one of the values, like $in every document only once."""
+        return [doc for value in dict.fromkeys(values) for doc in self.find(key, value, record)]
+
+    def all(self):
+        for i in range(len(self._offsets)):
+            yield self._get(i)
+
+    def _get(self, i, record=None):
+        start, end = self._offsets[i]
+        return (record or self._record)(json_util.loads(self._mmap[start:end], json_options=JSON_OPTIONS))
+
+
+class SnapshotDataSource(object):
+    """Reads the documents from a snapshot of one project that was created with export_snapshot.
+
+    The tables are opened on first use. The tables of the models in SNAPSHOT_FIELDS return records, the others
+    pycoshark documents.
+    """
+
+    tables = {
+        'project': (Project, ('name',)),
+        'vcs_system': (VCSSystem, ('project_id',)),
+        'issue_system': (IssueSystem, ('_id', 'project_id')),
+        'commit': (Commit, ('_id', 'vcs_system_id')),
+        'issue': (Issue, ('_id', 'issue_system_id')),
+        'event': (Event, ('issue_id',)),
+        'file_action': (FileAction, ('commit_id',)),
+        'file': (File, ('_id', 'vcs_system_id')),
+        'hunk': (Hunk, ('file_action_id',)),
+        'code_entity_state': (CodeEntityState, ('_id', 'commit_id')),
+        'refactoring': (Refactoring, ('commit_id',)),
+    }
+
+    def __init__(self, path, raw=True):
+        """
+        :param str path: directory of the snapshot
+        :param bool raw: return records instead of pycoshark documents
+        """
+        self.path = path
+        self.raw = raw
+        self._tables = {}
+
+    def table(self, name):
+        if name not in self._tables:
+            model, keys = self.tables[name]
+            self._tables[name] = SnapshotTable(os.path.join(self.path, '{}.jsonl'.format(name)),
+                                               self._record_type(model, SNAPSHOT_FIELDS.get(model)), keys)
+        return self._tables[name]
+
+    def _record_type(self, model, fields):
+        if self.raw and fields is not None:
+            return record_type(model, tuple(fields))
+        return functools.partial(model._from_son, created=False)
+
+    def _get(self, name, key, value):
+        docs = self.table(name).find(key, value)
+        if not docs:
+            raise DoesNotExist('{} with {} {} not found in snapshot {}'.format(name, key, value, self.path))
+        return docs[0]
+
+    def project(self, name):
+        return self._get('project', 'name', name)
+
+    def vcs_system(self, project_id):
+        return self._get('vcs_system', 'project_id', project_id)
+
+    def issue_systems(self, project_id):
+        return self.table('issue_system').find('project_id', project_id)
+
+    def issue_system(self, issue_system_id):
+        return self._get('issue_system', '_id', issue_system_id)
+
+    def commit_ids(self, vcs_system_id):
+        return sorted(self.table('commit').ids('vcs_system_id', vcs_system_id))
+
+    def commit_messages(self, vcs_system_id, commit_ids=None):
+        commits = self.table('commit')
+        record = self._record_type(Commit, ('id', 'vcs_system_id', 'message'))
+        if commit_ids is None:
+            return commits.find('vcs_system_id', vcs_system_id, record)
+        return [commit for commit in commits.find_many('_id', commit_ids, record)
+                if commit.vcs_system_id == vcs_system_id]
+
+    def count_commits(self, vcs_system_id, exclude=()):
+        return len(self._commit_ids(vcs_system_id, None, None, exclude))
+
+    def commit_pages(self, vcs_system_id, fields, page_size, first_id=None, last_id=None, exclude=()):
+        commit_ids = self._commit_ids(vcs_system_id, first_id, last_id, exclude)
+        commits = self.table('commit')
+        record = self._record_type(Commit, fields)
+        for i in range(0, len(commit_ids), page_size):
+            yield commits.find_many('_id', commit_ids[i:i + page_size], record)
+
+    def _commit_ids(self, vcs_system_id, first_id, last_id, exclude):
+        return [commit_id for commit_id in self.commit_ids(vcs_system_id)
+                if (first_id is None or commit_id >= first_id) and (last_id is None or commit_id <= last_id)
+                and not any(first <= commit_id <= last for first, last in exclude)]
+
+    def issues(self, issue_ids, fields):
+        return self.table('issue').find_many('_id', issue_ids)
+
+    def issues_of_systems(self, issue_system_ids, fields):
+        return self.table('issue').find_many('issue_system_id', issue_system_ids)
+
+    def events(self, issue_id):
+        # like the MongoDB, missing creation dates first and the stored order for equal dates
+        return sorted(self.table('event').find('issue_id', issue_id),
+                      key=lambda event: (event.created_at is not None, event.created_at or datetime.min))
+
+    def event_marks(self, issue_ids):
+        events = self.table('event')
+        ret = {}
+        for issue_id in issue_ids:
+            event_ids = events.ids('issue_id', issue_id)
+            if event_ids:
+                ret[issue_id] = [len(event_ids), str(max(event_ids))]
+        return ret
+
+    def event_stamp(self):
+        events = self.table('event')
+        return {'events': len(events), 'latest_event_id': str(max(events.all_ids())) if len(events) else None}
+
+    def resolved_and_fixed_bugs(self, issue_system_id):
+        resolved = set()
+        fixed = set()
+        bug_ids = [issue.id for issue in self.table('issue').find('issue_system_id', issue_system_id)
+                   if issue.issue_type is not None and issue.issue_type.lower() == 'bug']
+        for event in self.table('event').find_many('issue_id', bug_ids):
+            status = (event.status or '').lower()
+            new_value = (event.new_value or '').lower()
+            if status == 'status' and new_value in ('resolved', 'closed'):
+                resolved.add(event.issue_id)
+            elif status == 'resolution' and new_value == 'fixed':
+                fixed.add(event.issue_id)
+        return len(bug_ids), resolved, fixed
+
+    def file_actions(self, commit_ids):
+        return self.table('file_action').find_many('commit_id', commit_ids)
+
+    def files(self, file_ids):
+        return self.table('file').find_many('_id', file_ids)
+
+    def files_of_vcs_system(self, vcs_system_id):
+        return self.table('file').find('vcs_system_id', vcs_system_id)
+
+    def hunks(self, file_action_ids):
+        return self.table('hunk').find_many('file_action_id', file_action_ids)
+
+    def hunk_counts(self, file_action_ids):
+        hunks = self.table('hunk')
+        return {file_action_id: len(hunks.ids('file_action_id', file_action_id)) for file_action_id in file_action_ids
+                if hunks.contains('file_action_id', file_action_id)}
+
+    def file_states_by_commit(self, commit_ids, long_names):
+        long_names = set(long_names)
+        return [state for state in self.table('code_entity_state').find_many('commit_id', commit_ids)
+                if state.ce_type == 'file' and state.long_name in long_names]
+
+    def file_states_by_id(self, state_ids, long_names):
+        long_names = set(long_names)
+        return [state for state in self.table('code_entity_state').find_many('_id', state_ids)
+                if state.ce_type == 'file' and state.long_name in long_names]
+
+    def refactoring_counts(self, commit_ids):
+        refactorings = self.table('refactoring')
+        return {commit_id: len(refactorings.ids('commit_id', commit_id)) for commit_id in commit_ids
+                if refactorings.contains('commit_id', commit_id)}
+
+
+class DataSourceProxy(object):
+    """Passes every call to the backend in use, the MongoDB unless a snapshot is used."""
+
+    def __init__(self):
+        self.backend = MongoDataSource()
+
+    def use(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+data_source = DataSourceProxy()
+
+
+def _export(path, name, model, query, chunks=None, chunk_key=None, append=False, skip=None):
+    """Writes the documents of the query to the JSONL file of the collection, with chunks the query is run once
+    per chunk of values of the chunk_key. With append the documents are added to the file, documents for which
+    skip returns True are left out."""
+    collection = model._get_collection()
+    projection = _projection(model, SNAPSHOT_FIELDS[model]) if model in SNAPSHOT_FIELDS else None
+    count = 0
+    with open(os.path.join(path, '{}.jsonl'.format(name)), 'a' if append else 'w') as f:
+        for chunk in (chunks if chunks is not None else [None]):
+            chunk_query = dict(query) if chunk is None else dict(query, **{chunk_key: {'$in': chunk}})
+            for doc in collection.find(chunk_query, projection).sort('_id', 1):
+                if skip is not None and skip(doc):
+                    continue
+                f.write(json_util.dumps(doc))
+                f.write('\n')
+                count += 1
+    log.info('exported %i documents of %s' % (count, name))
+
+
+def export_snapshot(path, project_name, chunk_size=10000):
+    """Exports every document of the project that labelSHARK reads to JSONL files in the directory.
+
+    :param str path: directory of the snapshot
+    :param str project_name: name of the project
+    :param int chunk_size: number of ids per query for the collections that are queried by the ids of others
+    """
+    def chunked(ids):
+        return [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    os.makedirs(path, exist_ok=True)
+    project = Project.objects(name=project_name).get()
+    vcs = VCSSystem.objects(project_id=project.id).get()
+    its_ids = list(IssueSystem.objects(project_id=project.id).scalar('id'))
+    commit_ids = chunked(list(Commit.objects(vcs_system_id=vcs.id).order_by('id').scalar('id')))
+
+    _export(path, 'project', Project, {'_id': project.id})
+    _export(path, 'vcs_system', VCSSystem, {'_id': vcs.id})
+    _export(path, 'issue_system', IssueSystem, {'project_id': project.id})
+    _export(path, 'commit', Commit, {'vcs_system_id': vcs.id})
+    _export(path, 'issue', Issue, {'issue_system_id': {'$in': its_ids}})
+    issue_ids = chunked(list(Issue.objects(issue_system_id__in=its_ids).scalar('id')))
+    _export(path, 'event', Event, {}, issue_ids, 'issue_id')
+    _export(path, 'file_action', FileAction, {}, commit_ids, 'commit_id')
+    _export(path, 'file', File, {'vcs_system_id': vcs.id})
+    file_action_ids = chunked([file_action_id for chunk in commit_ids
+                               for file_action_id in FileAction.objects(commit_id__in=chunk).scalar('id')])
+    _export(path, 'hunk', Hunk, {}, file_action_ids, 'file_action_id')
+    _export(path, 'code_entity_state', CodeEntityState, {'ce_type': 'file'}, commit_ids, 'commit_id')
+    # commits with code_entity_states reference the states by their id, these may belong to other commits
+    project_commit_ids = set(commit_id for chunk in commit_ids for commit_id in chunk)
+    state_ids = set()
+    for doc in Commit._get_collection().find({'vcs_system_id': vcs.id, 'code_entity_states.0': {'$exists': True}},
+                                             {'code_entity_states': 1}):
+        state_ids.update(doc['code_entity_states'])
+    _export(path, 'code_entity_state', CodeEntityState, {'ce_type': 'file'}, chunked(sorted(state_ids)), '_id',
+            append=True, skip=lambda doc: doc.get('commit_id') in project_commit_ids)
+    _export(path, 'refactoring', Refactoring, {}, commit_ids, 'commit_id')
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The incremental module keeps track of the inputs from which the labels of every commit were computed."""
+
+import logging
+
+from mongoengine.connection import get_db
+from pymongo import UpdateOne
+
+
+class LabelState(object):
+    """Fingerprints of the labels of every commit of a VCS system.
+
+    The fingerprints are stored in their own collection (label_state) with one document per commit, the stored
+    fingerprints are loaded once at the start. The fingerprints of newly computed labels are collected until
+    the labels of the commit are written.
+    """
+
+    collection_name = 'label_state'
+
+    def __init__(self, vcs_system_id, full=False):
+        """
+        :param obj vcs_system_id: id of the VCSSystem
+        :param bool full: if True every stored fingerprint is ignored, i.e., every commit is labeled again
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self._vcs_system_id = vcs_system_id
+        self._full = full
+        self._stored = {}
+        self._pending = {}
+        self.current = 0
+        self.outdated = 0
+
+    @property
+    def collection(self):
+        # looked up on every use, worker processes have their own connection
+        return get_db()[self.collection_name]
+
+    def load(self):
+        """Loads the stored fingerprints of the VCS system."""
+        if self._full:
+            return
+        for doc in self.collection.find({'vcs_system_id': self._vcs_system_id}, {'fingerprints': 1}):
+            self._stored[doc['_id']] = doc.get('fingerprints', {})
+
+    def is_current(self, commit_id, app_name, commit_fingerprint):
+        """Checks if the stored labels of the approach for the commit were computed from the same inputs."""
+        if self._stored.get(commit_id, {}).get(app_name) == commit_fingerprint:
+            self.current += 1
+            return True
+        self.outdated += 1
+        return False
+
+    def record(self, commit_id, app_name, commit_fingerprint):
+        """Records the fingerprint of newly computed labels, they are written together with the labels."""
+        self._pending.setdefault(commit_id, {})[app_name] = commit_fingerprint
+
+    def pop(self, commit_id):
+        """Returns and removes the recorded fingerprints of the commit."""
+        return self._pending.pop(commit_id, None)
+
+    def update_op(self, commit_id, fingerprints):
+        """Returns the update operation for the recorded fingerprints of the commit."""
+        update = {'vcs_system_id': self._vcs_system_id}
+        update.update({'fingerprints.{}'.format(k): v for k, v in fingerprints.items()})
+        return UpdateOne({'_id': commit_id}, {'$set': update}, upsert=True)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The pipeline module runs reading and writing in background threads connected by bounded queues."""
+
+import queue
+import threading
+import timeit
+from collections import OrderedDict
+
+
+class QueueStatistics(object):
+    """Counts how often and how long the producers and consumers of the pipeline queues had to wait.
+
+    A producer stall means the queue was full, i.e., the consumer is the bottleneck. A consumer stall means the
+    queue was empty, i.e., the consumer waited for the producer.
+    """
+
+    def __init__(self):
+        self._counters = OrderedDict()
+
+    def register(self, name):
+        for key in ('producer_stalls', 'producer_wait', 'consumer_stalls', 'consumer_wait'):
+            self._counters.setdefault('{}_{}'.format(name, key), 0)
+
+    def record(self, name, side, wait):
+        self._counters['{}_{}_stalls'.format(name, side)] += 1
+        self._counters['{}_{}_wait'.format(name, side)] += wait
+
+    def stats(self):
+        return OrderedDict((k, round(v, 5) if isinstance(v, float) else v) for k, v in self._counters.items())
+
+
+queue_stats = QueueStatistics()
+
+
+class InstrumentedQueue(queue.Queue):
+    """Bounded queue that records the stalls of its producer and consumer in the queue_stats."""
+
+    def __init__(self, name, maxsize):
+        super().__init__(maxsize)
+        self.name = name
+        queue_stats.register(name)
+
+    def put(self, item, block=True, timeout=None):
+        if not self.full():
+            return super().put(item, block, timeout)
+        start = timeit.default_timer()
+        try:
+            return super().put(item, block, timeout)
+        finally:
+            queue_stats.record(self.name, 'producer', timeit.default_timer() - start)
+
+    def get(self, block=True, timeout=None):
+        if not self.empty():
+            return super().get(block, timeout)
+        start = timeit.default_timer()
+        try:
+            return super().get(block, timeout)
+        finally:
+            queue_stats.record(self.name, 'consumer', timeit.default_timer() - start)
+
+
+_DONE = object()
+
+
+def read_ahead(iterable, depth, name='read'):
+    """Iterates the iterable in a background thread while the caller processes the previous items.
+
+    At most depth items are read ahead. Exceptions of the background thread are raised by the caller.
+
+    :param iterable: iterable, e.g., the pages of commits
+    :param int depth: maximum number of items that are read ahead
+    :param str name: name of the queue in the statistics
+    """
+    items = InstrumentedQueue(name, depth)
+    stop = threading.Event()
+
+    def run():
+        try:
+            for item in iterable:
+                items.put((item, None))
+                if stop.is_set():
+                    return
+            items.put((_DONE, None))
+        except Exception as e:
+            items.put((_DONE, e))
+
+    thread = threading.Thread(target=run, name='labelSHARK-{}'.format(name), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        # the reader puts at most one more item after it is stopped, which fits into the drained queue
+        stop.set()
+        while not items.empty():
+            items.get_nowait()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The records module provides lightweight read-only replacements for the pycoshark documents.
+
+Building a mongoengine document for every commit, issue, file action and hunk takes a large share of the CPU
+time of a labeling run. A record only keeps the loaded fields of a raw MongoDB document as attributes with the
+names of the model fields, fields that were not loaded have the default of the model field like a document
+loaded with only().
+"""
+
+import functools
+
+
+class Record(object):
+    """Base class of the record types created by record_type."""
+
+    __slots__ = ()
+    model = None
+    # (field name, db field, default) of every field of the record type, the default is None for nullable fields
+    _fields = ()
+
+    def __init__(self, son):
+        """
+        :param dict son: raw MongoDB document
+        """
+        for name, db_field, default in self._fields:
+            value = son.get(db_field)
+            # like the documents, missing and null values get the default
+            if value is None and default is not None:
+                value = default() if callable(default) else default
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # like a document loaded with only(), the fields that were not loaded have their default
+        field = self.model._fields.get(name) if self.model is not None else None
+        if field is None:
+            raise AttributeError('{} has no field {}'.format(self.__class__.__name__, name))
+        default = _default(field)
+        return default() if callable(default) else default
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is read-only'.format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.id is not None and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, self.id)
+
+
+def _default(field):
+    # mongoengine keeps None for nullable fields
+    return None if field.null else field.default
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(model, fields):
+    """Returns the record type for the fields of the model, the id is always included.
+
+    :param model: pycoshark model, e.g., Commit
+    :param tuple fields: names of the model fields
+    """
+    if 'id' not in fields:
+        fields = ('id',) + tuple(fields)
+    return type('{}Record'.format(model.__name__), (Record,), {
+        '__slots__': tuple(fields),
+        'model': model,
+        '_fields': tuple((name, model._fields[name].db_field, _default(model._fields[name])) for name in fields),
+    })
+
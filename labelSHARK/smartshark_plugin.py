@@ -7,11 +7,22 @@ import sys
 import logging
 import timeit
 import copy
+import multiprocessing
 
 from core import LabelSHARK
+from writer import SINKS, MongoLabelWriter, ParquetLabelWriter
+from incremental import LabelState
+from checkpoint import Checkpoint
+from pipeline import read_ahead, queue_stats
+from datasource import data_source, MongoDataSource, SnapshotDataSource, export_snapshot
+from stats import run_stats
+from approaches.util.labelutils import its_cache
+from approaches.util.issuestore import issue_store
+from approaches.util.commitcontext import file_paths
+from approaches.util.messageflags import message_flags
 
-from mongoengine import connect, DoesNotExist
-from pycoshark.mongomodels import VCSSystem, Commit, Project
+from mongoengine import connect, disconnect, DoesNotExist
+from pycoshark.mongomodels import VCSSystem, Commit
 from pycoshark.utils import create_mongodb_uri_string
 from pycoshark.utils import get_base_argparser
 
@@ -42,29 +53,174 @@ log.addHandler(i)
 log.addHandler(e)
 
 
-def main(args):
+# set in the parent process before the worker processes are forked
+_worker_state = {}
+
+
+def save_labels(writer, commits, batch_labels):
+    """Passes the labels of a labeled batch of commits to the write buffer.
+
+    :param writer: LabelWriter of the sink
+    :param list commits: the labeled commits with their stored labels
+    :param dict batch_labels: commit id to the list of (approach_key, value) tuples for that commit
+    """
+    for commit in commits:
+        writer.add(commit, batch_labels[commit.id])
+
+
+def create_writer(args, label_state, queue_depth=0, label_keys=None):
+    """Returns the LabelWriter of the sink given by the arguments.
+
+    :param args: command line arguments with the sink, sink_path and write_batch_size
+    :param label_state: LabelState with the recorded fingerprints of the labels
+    :param int queue_depth: maximum number of batches waiting for the writer thread
+    :param list label_keys: keys of the labels declared by the approaches, the columns of the parquet sink
+    """
+    if args.sink == 'mongo':
+        return MongoLabelWriter(Commit._get_collection(), args.write_batch_size, label_state, queue_depth)
+    if args.sink == 'parquet':
+        return ParquetLabelWriter(args.sink_path, args.write_batch_size, label_state, queue_depth, label_keys)
+    return SINKS[args.sink](args.sink_path, args.write_batch_size, label_state, queue_depth)
+
+
+def split_ranges(commit_ids, num):
+    """Splits the sorted commit ids into num contiguous ranges of about the same size.
+
+    :param list commit_ids: sorted ids of the commits
+    :param int num: number of ranges
+    :return: list of (first_id, last_id) tuples
+    """
+    ranges = []
+    size, rest = divmod(len(commit_ids), num)
+    start = 0
+    for i in range(num):
+        end = start + size + (1 if i < rest else 0)
+        if end > start:
+            ranges.append((commit_ids[start], commit_ids[end - 1]))
+        start = end
+    return ranges
+
+
+def parse_shard(shard):
+    """Parses the shard argument i/N into a tuple (i, N) with 0 <= i < N."""
+    try:
+        i, num = (int(part) for part in shard.split('/'))
+    except ValueError:
+        raise ValueError('shard has to be given as i/N, got: {}'.format(shard))
+    if num < 1 or not 0 <= i < num:
+        raise ValueError('shard i/N requires 0 <= i < N, got: {}'.format(shard))
+    return i, num
+
+
+def label_commits(labelshark, pages, args, label_state, commit_count=None, checkpoint=None):
+    """Labels the commits in batches and writes the labels in bulk.
+
+    :param labelshark: configured LabelSHARK instance
+    :param pages: iterable of pages of commits ordered by their id, e.g., from data_source.commit_pages
+    :param args: command line arguments
+    :param label_state: LabelState with the fingerprints of the stored labels
+    :param int commit_count: total number of commits for the progress log, no progress is logged if None
+    :param checkpoint: optional Checkpoint that is advanced after every page
+    :return: dict with the number of labeled commits, the number of commits with written, unchanged, skipped and
+             failed labels and the number of current and outdated labels of the approaches
+    """
+    count = 0
+    current, outdated = label_state.current, label_state.outdated
+    write_queue_depth = 0
+    if args.pipeline:
+        # the next pages are read and the previous labels are written while the current page is labeled
+        pages = read_ahead(pages, args.read_queue_depth)
+        write_queue_depth = args.write_queue_depth
+    with create_writer(args, label_state, write_queue_depth, labelshark.label_keys()) as writer:
+        for page in pages:
+            for i in range(0, len(page), args.batch_size):
+                batch = page[i:i + args.batch_size]
+                save_labels(writer, batch, labelshark.label_batch(batch, label_state))
+                count += len(batch)
+                if commit_count is not None:
+                    log.info("%i/%i  commits finished", count, commit_count)
+            if checkpoint is not None:
+                # the checkpoint must not advance past labels that are not written yet
+                writer.call_after_writes(checkpoint.advance, page[0].id, page[-1].id)
+    return {'commits': count, 'written': writer.written, 'unchanged': writer.unchanged, 'skipped': writer.skipped,
+            'failed': writer.failed, 'current': label_state.current - current,
+            'outdated': label_state.outdated - outdated}
+
+
+def _init_worker(uri, args, labelshark, label_state, vcs_id, exclude):
+    # every worker needs its own connection, the approaches and label state are inherited from the parent process
+    connect(args.db_database, host=uri)
+    _worker_state.update({'args': args, 'labelshark': labelshark, 'label_state': label_state, 'vcs_id': vcs_id,
+                          'exclude': exclude})
+
+
+def _label_range(commit_range):
+    first_id, last_id = commit_range
+    args = _worker_state['args']
+    labelshark = _worker_state['labelshark']
+    pages = data_source.commit_pages(_worker_state['vcs_id'], labelshark.projection(), args.page_size, first_id,
+                                     last_id, _worker_state['exclude'])
+    result = label_commits(labelshark, pages, args, _worker_state['label_state'])
+    # the statistics of a worker add up over all its ranges
+    return commit_range, result, os.getpid(), run_stats.snapshot()
+
+
+def main(args, uri=None):
+    """Labels the commits of the project.
+
+    :param args: command line arguments
+    :param str uri: optional MongoDB URI, by default it is created from the database arguments
+    """
     # timing
     start = timeit.default_timer()
 
     if args.log_level and hasattr(logging, args.log_level):
         log.setLevel(getattr(logging, args.log_level))
 
-    uri = create_mongodb_uri_string(args.db_user, args.db_password, args.db_hostname, args.db_port,
-                                    args.db_authentication, args.ssl)
+    if uri is None:
+        uri = create_mongodb_uri_string(args.db_user, args.db_password, args.db_hostname, args.db_port,
+                                        args.db_authentication, args.ssl)
+    run_stats.enable_command_monitoring()
     connect(args.db_database, host=uri)
 
+    if args.sink != 'mongo':
+        try:
+            SINKS[args.sink].check()
+        except ImportError as e:
+            log.error(str(e))
+            sys.exit(1)
+        if not args.sink_path:
+            log.error('--sink %s requires --sink-path' % args.sink)
+            sys.exit(1)
+        # a file is written by one process from the start, the MongoDB sink is required for workers and --resume
+        if args.workers > 1 or args.resume:
+            log.error('--sink %s supports neither --workers nor --resume' % args.sink)
+            sys.exit(1)
+
+    if args.export_snapshot:
+        log.info("Exporting project %s to snapshot %s", args.project_name, args.export_snapshot)
+        export_snapshot(args.export_snapshot, args.project_name)
+        log.info("Finished export in {:.5f}s".format(timeit.default_timer() - start))
+        return
+    if args.snapshot:
+        # the labels are still written to the sink, by default the MongoDB
+        data_source.use(SnapshotDataSource(args.snapshot, raw=not args.documents))
+    else:
+        data_source.use(MongoDataSource(raw=not args.documents))
+
     # Get the id of the project for which the code entities shall be merged
     try:
-        project_id = Project.objects(name=args.project_name).get().id
+        project_id = data_source.project(args.project_name).id
     except DoesNotExist:
         log.error('Project %s not found!' % args.project_name)
         sys.exit(1)
 
-    vcs = VCSSystem.objects(project_id=project_id).get()
+    vcs = data_source.vcs_system(project_id)
 
     log.info("Starting commit labeling")
 
     # import every approach defined or all
+    import_start = timeit.default_timer()
     if args.approaches == 'all':
         # just list every module in the package and import it
         basepath = os.path.dirname(os.path.abspath(__file__))
@@ -75,34 +231,174 @@ def main(args):
         # if we have a list of approaches import only those
         for app in args.approaches.split(','):
             __import__('approaches.{}'.format(app))
+    log.info("Loaded approaches in {:.5f}s".format(timeit.default_timer() - import_start))
 
     # add specific configs
-    labelshark = LabelSHARK()
-    commit_count = Commit.objects(vcs_system_id=vcs.id).count()
+    config = dict(vars(args))
+    config['project_id'] = project_id
+    config['vcs_system_id'] = vcs.id
+    config['its'] = data_source.issue_systems(project_id)
+    labelshark = LabelSHARK(run_stats)
+    labelshark.configure(config)
+    run_stats.add_source('its_cache', its_cache.stats)
+    run_stats.add_source('issue_store', issue_store.stats)
+    run_stats.add_source('file_paths', file_paths.stats)
+    run_stats.add_source('message_flags', message_flags.stats)
+    if args.pipeline:
+        run_stats.add_source('pipeline', queue_stats.stats)
 
-    for i,commit in enumerate(Commit.objects(vcs_system_id=vcs.id).only('id', 'revision_hash', 'vcs_system_id', 'message', 'linked_issue_ids', 'parents', 'fixed_issue_ids', 'szz_issue_ids').timeout(False)):
-        if i%100 == 0:
-            log.info("%i/%i  commits finished", i, commit_count)
-        labelshark.set_commit(commit)
-        labels = labelshark.get_labels()
+    # the fingerprints belong to the labels in the MongoDB, the other sinks get the labels of every commit
+    label_state = LabelState(vcs.id, full=args.full or args.sink != 'mongo')
+    label_state.load()
 
-        #log.info('commit: {}, labels: {}'.format(commit.revision_hash, labels))
+    checkpoint_path = args.checkpoint
+    if checkpoint_path is None:
+        shard_suffix = '_{}'.format(args.shard.replace('/', 'of')) if args.shard else ''
+        checkpoint_path = 'labelshark_{}{}.checkpoint.json'.format(args.project_name, shard_suffix)
+    checkpoint = Checkpoint(checkpoint_path, vcs.id,
+                            [app.__module__.replace('approaches.', '') for app in labelshark.approaches], args.shard)
+    if args.resume and checkpoint.load():
+        log.info("Resuming from checkpoint %s, skipping %i labeled commit ranges", checkpoint_path,
+                 len(checkpoint.ranges))
 
-        # save the labels
-        if labels:
-            tmp = {'set__labels__{}'.format(k): v for k, v in labels}
-            Commit.objects(id=commit.id).upsert_one(**tmp)
+    first_id, last_id = None, None
+    if args.shard or args.workers > 1:
+        commit_ids = data_source.commit_ids(vcs.id)
+        if args.shard:
+            try:
+                shard, num_shards = parse_shard(args.shard)
+            except ValueError as e:
+                log.error(str(e))
+                sys.exit(1)
+            shard_range = split_ranges(commit_ids, num_shards)[shard]
+            commit_ids = [commit_id for commit_id in commit_ids if shard_range[0] <= commit_id <= shard_range[1]]
+            first_id, last_id = shard_range
+            log.info("Labeling shard %i/%i with %i commits", shard, num_shards, len(commit_ids))
+        # the shards are split over all commits, the commits labeled before are only dropped afterwards
+        commit_ids = [commit_id for commit_id in commit_ids
+                      if not any(first <= commit_id <= last for first, last in checkpoint.ranges)]
+        commit_count = len(commit_ids)
+    else:
+        commit_count = data_source.count_commits(vcs.id, checkpoint.ranges)
+
+    if args.workers > 1:
+        # more ranges than workers so that slow ranges do not leave the other workers idle
+        ranges = split_ranges(commit_ids, args.workers * 4)
+        # pymongo connections do not survive a fork, every worker connects on its own
+        disconnect()
+        ctx = multiprocessing.get_context('fork')
+        result = {'commits': 0, 'written': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0, 'current': 0, 'outdated': 0}
+        worker_stats = {}
+        baseline = run_stats.snapshot()
+        with ctx.Pool(args.workers, initializer=_init_worker,
+                      initargs=(uri, args, labelshark, label_state, vcs.id, list(checkpoint.ranges))) as pool:
+            for commit_range, range_result, pid, snapshot in pool.imap_unordered(_label_range, ranges):
+                for k, v in range_result.items():
+                    result[k] += v
+                worker_stats[pid] = snapshot
+                checkpoint.add(*commit_range)
+                log.info("%i/%i  commits finished", result['commits'], commit_count)
+        connect(args.db_database, host=uri)
+        # the workers inherit the statistics of the parent from before the fork, only their own share is added
+        snapshot = run_stats.merge([run_stats.subtract(worker_snapshot, baseline)
+                                    for worker_snapshot in worker_stats.values()] + [run_stats.snapshot()])
+    else:
+        # one projection with the commit fields of every approach
+        pages = data_source.commit_pages(vcs.id, labelshark.projection(), args.page_size, first_id, last_id,
+                                         list(checkpoint.ranges))
+        result = label_commits(labelshark, pages, args, label_state, commit_count,
+                               checkpoint if args.sink == 'mongo' else None)
+        snapshot = run_stats.snapshot()
+    # the run is complete, a later --resume starts from the beginning
+    if args.sink == 'mongo':
+        checkpoint.remove()
+
+    log.info("Wrote labels for %i commits, %i unchanged, %i skipped, %i failed", result['written'],
+             result['unchanged'], result['skipped'], result['failed'])
+    log.info("Skipped %i up to date approach labels, computed %i", result['current'], result['outdated'])
 
     end = timeit.default_timer() - start
+    summary = run_stats.summary(snapshot, result['commits'], end)
+    summary['labels'] = {k: result[k] for k in ('written', 'unchanged', 'skipped', 'failed')}
+    run_stats.log_summary(log, summary)
+    if args.stats_json:
+        run_stats.write_json(args.stats_json, summary)
     log.info("Finished commit labeling in {:.5f}s".format(end))
 
 
-if __name__ == '__main__':
+def build_parser():
+    """Returns the parser of the command line arguments."""
     parser = get_base_argparser('Analyze the given URI. An URI should be a GIT Repository address.', '1.0.0')
     parser.add_argument('-n', '--project-name', help='Name of the project.', required=True)
     parser.add_argument('-ap', '--approaches',
                         help='Comma separated list of python module names that implement approaches or all for every approach.',
                         required=False, default='all')
+    parser.add_argument('-bs', '--batch-size', help='Number of commits that are passed to the approaches at once.',
+                        required=False, default=100, type=int)
+    parser.add_argument('-wbs', '--write-batch-size', help='Number of commits whose labels are written with one bulk write.',
+                        required=False, default=1000, type=int)
+    parser.add_argument('--issue-cache-size', help='Maximum number of issues kept in memory by the issue based approaches.',
+                        required=False, default=100000, type=int)
+    parser.add_argument('--preload-issues', help='Load the issues of every issue system of the project at the start.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--file-cache-size', help='Maximum number of file paths kept in memory by the diff based '
+                                                  'approaches.', required=False, default=200000, type=int)
+    parser.add_argument('--preload-file-paths', help='Load the paths of every file of the VCS system at the start.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--message-table-size', help='Maximum number of commits whose message flags are kept in '
+                                                     'memory by the message based approaches.',
+                        required=False, default=200000, type=int)
+    parser.add_argument('--preload-messages', help='Classify the messages of every commit of the VCS system with one '
+                                                   'pass at the start, the commits are then loaded without messages.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--bz-index-path', help='Directory in which the Bugzilla event index of every issue system is '
+                                                'stored and reused by later runs until the events change.',
+                        required=False, default=None)
+    parser.add_argument('--preload-classifiers', help='Load the fastText classifiers at the start instead of on first use, '
+                                                      'e.g., to share them between worker processes.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('-w', '--workers', help='Number of worker processes that label commit ranges in parallel.',
+                        required=False, default=1, type=int)
+    parser.add_argument('--shard', help='Only label the i-th of N commit ranges given as i/N with 0 <= i < N, '
+                                        'e.g., $SLURM_ARRAY_TASK_ID/$SLURM_ARRAY_TASK_COUNT.',
+                        required=False, default=None)
+    parser.add_argument('--page-size', help='Number of commits that are read with one query, the checkpoint '
+                                            'advances after every page.', required=False, default=1000, type=int)
+    parser.add_argument('--pipeline', help='Read the next pages of commits and write the labels in background threads '
+                                           'while the current commits are labeled.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--read-queue-depth', help='Number of pages of commits that are read ahead with --pipeline.',
+                        required=False, default=2, type=int)
+    parser.add_argument('--write-queue-depth', help='Number of bulk writes that may wait for the writer thread with '
+                                                    '--pipeline.', required=False, default=2, type=int)
+    parser.add_argument('--resume', help='Continue after the commits that a previous run with the same approaches '
+                                         'and shard labeled according to its checkpoint.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--checkpoint', help='Path of the checkpoint file, defaults to '
+                                             'labelshark_<project>[_<shard>].checkpoint.json.',
+                        required=False, default=None)
+    parser.add_argument('--snapshot', help='Directory of a snapshot from which the commits and related documents are '
+                                           'read instead of the MongoDB, the labels are still written to the --sink.',
+                        required=False, default=None)
+    parser.add_argument('--export-snapshot', help='Export every document of the project that labelSHARK reads to a '
+                                                  'snapshot in this directory and exit.',
+                        required=False, default=None)
+    parser.add_argument('--documents', help='Pass pycoshark documents instead of lightweight records to the approaches, '
+                                            'e.g., for approaches that need the methods of the documents.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--sink', help='Where the labels are written: mongo writes them to the commits, jsonl and parquet '
+                                       'write the labels of every commit to the file given by --sink-path.',
+                        required=False, default='mongo', choices=sorted(SINKS))
+    parser.add_argument('--sink-path', help='Path of the file for the jsonl and parquet sinks.', required=False,
+                        default=None)
+    parser.add_argument('--full', help='Label every commit again, even if its labels are up to date.',
+                        required=False, default=False, action='store_true')
+    parser.add_argument('--stats-json', help='Path of a JSON file to which the run statistics are written.',
+                        required=False, default=None)
     parser.add_argument('-ll', '--log_level', help='Log Level for stdout INFO or DEBUG.', required=False,
                         default='INFO')
-    main(parser.parse_args())
+    return parser
+
+
+if __name__ == '__main__':
+    main(build_parser().parse_args())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The stats module collects timing, MongoDB command and throughput statistics of a labeling run."""
+
+import contextlib
+import json
+import threading
+import timeit
+from collections import OrderedDict
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the started MongoDB commands for the currently active scope, e.g., the running approach.
+
+    The scope is kept per thread, commands of the background reader and writer threads count for labelSHARK.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    @property
+    def scope(self):
+        return getattr(self._local, 'scope', None)
+
+    @scope.setter
+    def scope(self, scope):
+        self._local.scope = scope
+
+    def started(self, event):
+        scope = self.scope
+        # the labeling thread and the background reader and writer threads count at the same time
+        with self._lock:
+            self.counts[scope] = self.counts.get(scope, 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class RunStatistics(object):
+    """Statistics of a labeling run.
+
+    For every approach the wall time, the number of labeled commits and the number of MongoDB commands are
+    recorded. MongoDB commands outside of an approach, e.g., reading the commits and writing the labels, are
+    counted for labelSHARK itself. Additionally, sources can be registered that provide counters, e.g., the
+    hits and misses of caches.
+    """
+
+    def __init__(self):
+        self._command_counter = CommandCounter()
+        self._monitoring = False
+        self._sources = OrderedDict()
+        self.approaches = OrderedDict()
+
+    def enable_command_monitoring(self):
+        """Registers the command listener, has to be called before the connection to the MongoDB is created.
+
+        pymongo keeps the listeners for the whole process, so the listener is only registered once.
+        """
+        if not self._monitoring:
+            monitoring.register(self._command_counter)
+            self._monitoring = True
+
+    def add_source(self, name, source):
+        """Registers a source of counters.
+
+        :param str name: name of the source
+        :param source: callable that returns a dict of counters
+        """
+        self._sources[name] = source
+
+    @contextlib.contextmanager
+    def measure(self, name, num_commits):
+        """Measures the wall time and the MongoDB commands of the approach within the context.
+
+        :param str name: name of the approach
+        :param int num_commits: number of commits that are labeled within the context
+        """
+        stats = self.approaches.setdefault(name, {'commits': 0, 'time': 0.0})
+        previous_scope = self._command_counter.scope
+        self._command_counter.scope = name
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            stats['time'] += timeit.default_timer() - start
+            stats['commits'] += num_commits
+            self._command_counter.scope = previous_scope
+
+    def snapshot(self):
+        """Returns the current statistics as dict."""
+        approaches = OrderedDict()
+        for name, stats in self.approaches.items():
+            approaches[name] = dict(stats, commands=self._command_counter.counts.get(name, 0))
+        return {'approaches': approaches,
+                'commands': self._command_counter.counts.get(None, 0),
+                'counters': OrderedDict((name, source()) for name, source in self._sources.items())}
+
+    @staticmethod
+    def subtract(snapshot, baseline):
+        """Returns the statistics of the snapshot that were added after the baseline.
+
+        Forked worker processes start with the statistics of the parent process, their own share is their
+        snapshot minus the snapshot of the parent at the fork.
+        """
+        ret = {'approaches': OrderedDict(), 'commands': snapshot['commands'] - baseline['commands'],
+               'counters': OrderedDict()}
+        for name, stats in snapshot['approaches'].items():
+            base = baseline['approaches'].get(name, {})
+            ret['approaches'][name] = {k: v - base.get(k, 0) for k, v in stats.items()}
+        for name, counters in snapshot['counters'].items():
+            base = baseline['counters'].get(name, {})
+            ret['counters'][name] = OrderedDict((k, v - base.get(k, 0)) for k, v in counters.items())
+        return ret
+
+    @staticmethod
+    def merge(snapshots):
+        """Sums up the snapshots of several processes."""
+        ret = {'approaches': OrderedDict(), 'commands': 0, 'counters': OrderedDict()}
+        for snapshot in snapshots:
+            ret['commands'] += snapshot['commands']
+            for name, stats in snapshot['approaches'].items():
+                total = ret['approaches'].setdefault(name, {'commits': 0, 'time': 0.0, 'commands': 0})
+                for k, v in stats.items():
+                    total[k] += v
+            for name, counters in snapshot['counters'].items():
+                total = ret['counters'].setdefault(name, OrderedDict())
+                for k, v in counters.items():
+                    total[k] = total.get(k, 0) + v
+        return ret
+
+    @staticmethod
+    def summary(snapshot, num_commits, total_time):
+        """Adds the throughput to a snapshot.
+
+        :param dict snapshot: snapshot of the statistics
+        :param int num_commits: number of commits of the run
+        :param float total_time: wall time of the run in seconds
+        """
+        commands = snapshot['commands'] + sum(stats['commands'] for stats in snapshot['approaches'].values())
+        ret = {'commits': num_commits, 'time': total_time,
+               'commits_per_second': num_commits / total_time if total_time > 0 else 0.0,
+               'commands': commands, 'labelshark_commands': snapshot['commands'],
+               'approaches': OrderedDict(), 'counters': snapshot['counters']}
+        for name, stats in snapshot['approaches'].items():
+            ret['approaches'][name] = dict(stats)
+            ret['approaches'][name]['commits_per_second'] = stats['commits'] / stats['time'] if stats['time'] > 0 else 0.0
+            ret['approaches'][name]['commands_per_commit'] = stats['commands'] / stats['commits'] if stats['commits'] > 0 else 0.0
+        return ret
+
+    @staticmethod
+    def log_summary(log, summary):
+        """Logs the summary as table."""
+        log.info('{:<20} {:>10} {:>10} {:>12} {:>10} {:>16}'.format('approach', 'commits', 'time [s]', 'commits/s',
+                                                                    'commands', 'commands/commit'))
+        for name, stats in summary['approaches'].items():
+            log.info('{:<20} {:>10} {:>10.2f} {:>12.2f} {:>10} {:>16.2f}'.format(
+                name, stats['commits'], stats['time'], stats['commits_per_second'], stats['commands'],
+                stats['commands_per_commit']))
+        log.info('{:<20} {:>10} {:>10} {:>12} {:>10}'.format('labelSHARK', '', '', '', summary['labelshark_commands']))
+        log.info('{:<20} {:>10} {:>10.2f} {:>12.2f} {:>10}'.format(
+            'total', summary['commits'], summary['time'], summary['commits_per_second'], summary['commands']))
+        for name, counters in summary['counters'].items():
+            log.info('{}: {}'.format(name, ', '.join('{} {}'.format(k, v) for k, v in counters.items())))
+
+    @staticmethod
+    def write_json(path, summary):
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+run_stats = RunStatistics()
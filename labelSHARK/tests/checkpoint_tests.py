@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from bson import ObjectId
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from checkpoint import Checkpoint  # noqa: E402
+
+
+class TestCheckpoint(unittest.TestCase):
+    """A resumed run must skip every written range and together with it cover every commit."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'checkpoint.json')
+        self.vcs_system_id = ObjectId()
+        self.commit_ids = sorted(ObjectId() for _ in range(30))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def checkpoint(self, approaches=('szz', 'documentation'), shard=None):
+        return Checkpoint(self.path, self.vcs_system_id, list(approaches), shard)
+
+    def pages(self, exclude, page_size=4):
+        # the commits are read ordered by their id without the excluded ranges, like data_source.commit_pages
+        commit_ids = [commit_id for commit_id in self.commit_ids
+                      if not any(first <= commit_id <= last for first, last in exclude)]
+        return [commit_ids[i:i + page_size] for i in range(0, len(commit_ids), page_size)]
+
+    def covered(self, ranges):
+        return [commit_id for commit_id in self.commit_ids if any(first <= commit_id <= last for first, last in ranges)]
+
+    def test_no_checkpoint(self):
+        checkpoint = self.checkpoint()
+        self.assertFalse(checkpoint.load())
+        self.assertEqual(checkpoint.ranges, [])
+
+    def test_advance_extends_one_range(self):
+        checkpoint = self.checkpoint()
+        for page in self.pages([]):
+            checkpoint.advance(page[0], page[-1])
+        self.assertEqual(checkpoint.ranges, [[self.commit_ids[0], self.commit_ids[-1]]])
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_resume(self):
+        # the first run stops after three pages
+        checkpoint = self.checkpoint()
+        for page in self.pages([])[:3]:
+            checkpoint.advance(page[0], page[-1])
+
+        resumed = self.checkpoint()
+        self.assertTrue(resumed.load())
+        self.assertEqual(resumed.ranges, [[self.commit_ids[0], self.commit_ids[11]]])
+        pages = self.pages(resumed.ranges)
+        self.assertEqual(pages[0][0], self.commit_ids[12])
+        for page in pages:
+            resumed.advance(page[0], page[-1])
+        self.assertEqual(self.covered(resumed.ranges), self.commit_ids)
+
+    def test_advance_over_excluded_ranges(self):
+        # ranges written by workers of an earlier run, the pages of the resumed run skip them
+        checkpoint = self.checkpoint()
+        checkpoint.add(self.commit_ids[5], self.commit_ids[9])
+        checkpoint.add(self.commit_ids[20], self.commit_ids[24])
+
+        resumed = self.checkpoint()
+        self.assertTrue(resumed.load())
+        pages = self.pages(resumed.ranges)
+        labeled = [commit_id for page in pages for commit_id in page]
+        self.assertEqual(len(labeled), 20)
+        self.assertFalse(set(labeled) & set(self.covered(resumed.ranges)))
+
+        # the run stops in the middle, the range it advanced may span the excluded ranges
+        for page in pages[:4]:
+            resumed.advance(page[0], page[-1])
+        again = self.checkpoint()
+        self.assertTrue(again.load())
+        self.assertEqual(self.covered(again.ranges), self.commit_ids[:26])
+        for page in self.pages(again.ranges):
+            again.advance(page[0], page[-1])
+        self.assertEqual(self.covered(again.ranges), self.commit_ids)
+
+    def test_other_settings_are_ignored(self):
+        checkpoint = self.checkpoint(shard='0/2')
+        checkpoint.add(self.commit_ids[0], self.commit_ids[9])
+        self.assertFalse(self.checkpoint(shard='1/2').load())
+        self.assertFalse(self.checkpoint(approaches=('szz',), shard='0/2').load())
+        # the order of the approaches does not matter
+        self.assertTrue(self.checkpoint(approaches=('documentation', 'szz'), shard='0/2').load())
+
+    def test_stored_as_json(self):
+        checkpoint = self.checkpoint()
+        checkpoint.add(self.commit_ids[0], self.commit_ids[1])
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertEqual(data['ranges'], [[str(self.commit_ids[0]), str(self.commit_ids[1])]])
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(self.path))
+        checkpoint.remove()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from datasource import data_source  # noqa: E402
+from approaches.util.commitcontext import FilePathCache, CommitContextStore, file_paths  # noqa: E402
+
+File = namedtuple('File', ['id', 'path'])
+FileAction = namedtuple('FileAction', ['id', 'commit_id', 'file_id', 'parent_revision_hash'])
+Hunk = namedtuple('Hunk', ['id', 'file_action_id', 'content'])
+Commit = namedtuple('Commit', ['id', 'vcs_system_id', 'parents'])
+
+
+class FileBackend(object):
+    """Data source with the files, file actions and hunks in memory that records every query."""
+
+    def __init__(self, files, file_actions=(), hunks=()):
+        self._files = files
+        self._file_actions = list(file_actions)
+        self._hunks = list(hunks)
+        self.queries = []
+
+    def files(self, file_ids):
+        self.queries.append(('files', sorted(file_ids)))
+        return [File(file_id, self._files[file_id]) for file_id in file_ids if file_id in self._files]
+
+    def files_of_vcs_system(self, vcs_system_id):
+        self.queries.append(('files_of_vcs_system', vcs_system_id))
+        return [File(file_id, path) for file_id, path in sorted(self._files.items())]
+
+    def file_actions(self, commit_ids):
+        self.queries.append(('file_actions', sorted(commit_ids)))
+        return [file_action for file_action in self._file_actions if file_action.commit_id in commit_ids]
+
+    def hunks(self, file_action_ids):
+        self.queries.append(('hunks', sorted(file_action_ids)))
+        return [hunk for hunk in self._hunks if hunk.file_action_id in file_action_ids]
+
+    def hunk_counts(self, file_action_ids):
+        self.queries.append(('hunk_counts', sorted(file_action_ids)))
+        counts = {}
+        for hunk in self._hunks:
+            if hunk.file_action_id in file_action_ids:
+                counts[hunk.file_action_id] = counts.get(hunk.file_action_id, 0) + 1
+        return counts
+
+
+class TestFilePathCache(unittest.TestCase):
+    """The cache fetches every missing path with one query and keeps the most recently used paths."""
+
+    def setUp(self):
+        self.backend = FileBackend({i: 'src/F{}.java'.format(i) for i in range(10)})
+        self.previous = data_source.backend
+        data_source.use(self.backend)
+        self.cache = FilePathCache(max_size=3)
+
+    def tearDown(self):
+        data_source.use(self.previous)
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.cache.get_many([0, 1, 42]), {0: 'src/F0.java', 1: 'src/F1.java'})
+        self.assertEqual(self.cache.get_many([1]), {1: 'src/F1.java'})
+        self.assertEqual(self.cache.stats(), {'size': 2, 'hits': 1, 'misses': 3})
+        self.assertEqual(self.backend.queries, [('files', [0, 1, 42])])
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.get_many([0, 1, 2])
+        # 0 is used again, so 1 is the least recently used path
+        self.cache.get_many([0])
+        self.cache.get_many([3])
+        self.backend.queries = []
+        self.cache.get_many([0, 2, 3])
+        self.assertEqual(self.backend.queries, [])
+        self.cache.get_many([1])
+        self.assertEqual(self.backend.queries, [('files', [1])])
+
+    def test_larger_request_than_cache(self):
+        self.assertEqual(len(self.cache.get_many(range(8))), 8)
+        self.assertEqual(self.cache.stats()['size'], 3)
+
+    def test_preload(self):
+        self.cache.configure({'preload_file_paths': True, 'file_cache_size': 5})
+        self.cache.get_many([0, 1], vcs_system_id='vcs')
+        self.cache.get_many([2], vcs_system_id='vcs')
+        self.assertEqual(self.backend.queries, [('files_of_vcs_system', 'vcs')])
+        self.assertEqual(self.cache.stats(), {'size': 5, 'hits': 3, 'misses': 0})
+        # paths that did not fit are fetched lazily
+        self.cache.get_many([7], vcs_system_id='vcs')
+        self.assertEqual(self.backend.queries[1:], [('files', [7])])
+
+
+class TestCommitContextStore(unittest.TestCase):
+    """The contexts of a batch are loaded with one query per kind of document."""
+
+    def setUp(self):
+        file_actions = [FileAction('fa1', 'c1', 1, 'p1'), FileAction('fa2', 'c1', 2, 'p1'),
+                        FileAction('fa3', 'c2', 1, 'c1'), FileAction('fa4', 'c2', 3, 'other')]
+        hunks = [Hunk('h1', 'fa1', '+a'), Hunk('h2', 'fa1', '+b'), Hunk('h3', 'fa3', '-c')]
+        self.backend = FileBackend({1: 'src/A.java', 2: 'doc/r.md', 3: 'test/BTest.java'}, file_actions, hunks)
+        self.previous = data_source.backend
+        data_source.use(self.backend)
+        file_paths.clear()
+        self.store = CommitContextStore()
+        self.commits = [Commit('c1', 'vcs', ['p1']), Commit('c2', 'vcs', ['c1'])]
+
+    def tearDown(self):
+        file_paths.clear()
+        data_source.use(self.previous)
+
+    def test_load(self):
+        contexts = self.store.load(self.commits)
+        # only the diff to the first parent is used
+        self.assertEqual([[fa.id for fa in context.file_actions] for context in contexts], [['fa1', 'fa2'], ['fa3']])
+        self.assertEqual(contexts[0].path(contexts[0].file_actions[1]), 'doc/r.md')
+        self.assertEqual(self.backend.queries, [('file_actions', ['c1', 'c2']), ('files', [1, 2])])
+
+        # the commits of the current batch are not loaded again
+        self.assertIs(self.store.get(self.commits[1]), contexts[1])
+        self.assertEqual(len(self.backend.queries), 2)
+
+    def test_hunks(self):
+        contexts = self.store.load(self.commits)
+        self.store.prefetch_hunks(contexts[0].file_actions)
+        self.assertEqual([hunk.id for hunk in contexts[0].hunks(contexts[0].file_actions[0])], ['h1', 'h2'])
+        self.assertEqual(contexts[0].hunks(contexts[0].file_actions[1]), [])
+        self.assertEqual([hunk.id for hunk in contexts[1].hunks(contexts[1].file_actions[0])], ['h3'])
+        self.assertEqual(self.backend.queries[2:], [('hunks', ['fa1', 'fa2']), ('hunks', ['fa3'])])
+
+    def test_input_states(self):
+        contexts = self.store.load(self.commits)
+        self.store.prefetch_hunks(contexts[0].file_actions)
+        states = self.store.input_states(self.commits)
+        self.assertEqual(states, {'c1': [['fa1', 'src/A.java', 2], ['fa2', 'doc/r.md', 0]],
+                                  'c2': [['fa3', 'src/A.java', 1]]})
+        # the prefetched hunks are counted without a query
+        self.assertEqual(self.backend.queries[-1], ('hunk_counts', ['fa3']))
+
+    def test_new_batch_replaces_the_contexts(self):
+        self.store.load(self.commits[:1])
+        self.store.load(self.commits[1:])
+        self.assertEqual([query for query in self.backend.queries if query[0] == 'file_actions'],
+                         [('file_actions', ['c1']), ('file_actions', ['c2'])])
+        # the file path of the first batch is still cached
+        self.assertEqual(self.backend.queries[-1], ('file_actions', ['c2']))
+
+
+if __name__ == '__main__':
+    unittest.main()
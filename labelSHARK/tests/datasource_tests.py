@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+import mongoengine
+from bson import ObjectId, json_util
+from pycoshark.mongomodels import Project, VCSSystem, IssueSystem, Commit, Issue, Event, FileAction, File, Hunk, \
+    CodeEntityState, Refactoring
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from datasource import data_source, MongoDataSource, SnapshotDataSource, SnapshotTable, SNAPSHOT_FIELDS, \
+    export_snapshot  # noqa: E402
+from records import record_type  # noqa: E402
+from smartshark_plugin import build_parser, main  # noqa: E402
+from approaches.util.labelutils import its_cache  # noqa: E402
+from approaches.util.issuestore import issue_store  # noqa: E402
+from approaches.util.commitcontext import commit_contexts, file_paths  # noqa: E402
+from approaches.util.bzindex import bz_index  # noqa: E402
+from approaches.util.messageflags import message_flags  # noqa: E402
+
+URI = 'mongomock://localhost'
+DATABASE = 'labelshark_datasource_test'
+
+
+def rows(docs, fields):
+    """Returns the values of the fields of the documents, records of both backends are compared by these."""
+    return [tuple(getattr(doc, field) for field in fields) for doc in docs]
+
+
+def clear_caches():
+    # the shared caches would otherwise pass the documents of one backend to the next run
+    for cache in (its_cache, issue_store, commit_contexts, file_paths, bz_index, message_flags):
+        cache.clear()
+
+
+def reset_caches():
+    """Restores the default configuration and counters of the shared caches that main configured."""
+    clear_caches()
+    defaults = vars(build_parser().parse_args(['-n', 'proj']))
+    for cache in (issue_store, file_paths, bz_index, message_flags):
+        cache.configure(defaults)
+    for cache in (its_cache, issue_store, file_paths, message_flags):
+        cache.hits = cache.misses = 0
+
+
+def create_project(rnd, name='proj', num_commits=60):
+    """Creates a project with every kind of document that labelSHARK reads and returns its commits."""
+    project = Project(name=name).save()
+    vcs = VCSSystem(project_id=project.id, url='http://git/{}'.format(name), repository_type='git').save()
+    issue_systems = [IssueSystem(project_id=project.id, url='https://issues.apache.org/jira/projects/X').save(),
+                     IssueSystem(project_id=project.id, url='https://bz.apache.org/bugzilla/').save(),
+                     IssueSystem(project_id=project.id, url='https://api.github.com/repos/x/y/issues').save()]
+    issues = []
+    for i in range(40):
+        parent = rnd.choice(issues).id if issues and rnd.random() < 0.3 else None
+        issue = Issue(issue_system_id=issue_systems[i % 3].id, external_id='{}-{}'.format(name, i),
+                      title='title {}'.format(i), desc='desc', parent_issue_id=parent,
+                      issue_type=rnd.choice(['Bug', 'bug', 'New Feature', 'Improvement', None]),
+                      status=rnd.choice(['resolved', 'closed', 'open', 'Closed']),
+                      resolution=rnd.choice(['fixed', 'Fixed', None, "won't fix"]),
+                      issue_type_verified=rnd.choice(['bug', None])).save()
+        issues.append(issue)
+        for j in range(rnd.randint(0, 4)):
+            # some events without creation date and some with the same date
+            Event(issue_id=issue.id, external_id='{}-{}-{}'.format(name, i, j),
+                  created_at=rnd.choice([None, datetime(2020, 1, 1), datetime(2020, 1, rnd.randint(2, 9))]),
+                  status=rnd.choice(['status', 'Resolution', 'comment']),
+                  new_value=rnd.choice(['Resolved', 'closed', 'fixed', 'open'])).save()
+    files = [File(vcs_system_id=vcs.id, path=path.format(k))
+             for k, path in enumerate(rnd.choice(['src/A{}.java', 'test/BTest{}.java', 'doc/r{}.md'])
+                                      for _ in range(20))]
+    files = [f.save() for f in files]
+    hunks = ['+ int x = 1; // TODO fix\n- y();\n', '+ /** doc */\n+ a();', '- // FIXME old\n', '+ call();\n']
+    messages = ['refactor foo', 'Fix bug', 'rename method x', 'moved icons', 'add feature', None]
+    commits = []
+    for k in range(num_commits):
+        commit = Commit(vcs_system_id=vcs.id, revision_hash='{}{:036x}'.format(name[:4].ljust(4, '0'), k),
+                        parents=[commits[-1].revision_hash] if commits else [], message=rnd.choice(messages),
+                        linked_issue_ids=[rnd.choice(issues).id for _ in range(rnd.choice([0, 0, 1, 2]))],
+                        fixed_issue_ids=[rnd.choice(issues).id for _ in range(rnd.choice([0, 0, 1]))],
+                        szz_issue_ids=[rnd.choice(issues).id for _ in range(rnd.choice([0, 1]))]).save()
+        commits.append(commit)
+        for f in rnd.sample(files, rnd.randint(0, 3)):
+            file_action = FileAction(file_id=f.id, commit_id=commit.id, mode='M',
+                                     parent_revision_hash=commit.parents[0] if commit.parents else None).save()
+            for _ in range(rnd.randint(1, 2)):
+                Hunk(file_action_id=file_action.id, new_start=1, new_lines=1, old_start=1, old_lines=1,
+                     content=rnd.choice(hunks)).save()
+            CodeEntityState(s_key=str(ObjectId()), long_name=f.path, commit_id=commit.id, file_id=f.id,
+                            ce_type=rnd.choice(['file', 'file', 'class']),
+                            imports=rnd.choice([['org.junit.Test'], ['java.util.List']])).save()
+        if rnd.random() < 0.2:
+            Refactoring(commit_id=commit.id, type='rename').save()
+    return commits
+
+
+class TestSnapshotTable(unittest.TestCase):
+    """The table keeps the offsets of the documents and indexes them by their keys."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.docs = [{'_id': ObjectId(), 'commit_id': c, 'content': content}
+                     for c, content in [('c1', '+a'), ('c2', '+b\n+c'), ('c1', None), ('c3', 'ü')]]
+        with open(os.path.join(self.path, 'hunk.jsonl'), 'w') as f:
+            # an empty line is skipped, the last document has no line break
+            f.write('\n'.join([json_util.dumps(doc) for doc in self.docs[:2]] + ['']
+                              + [json_util.dumps(doc) for doc in self.docs[2:]]))
+        self.table = SnapshotTable(os.path.join(self.path, 'hunk.jsonl'), dict, ('commit_id', '_id'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_offsets(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(list(self.table.all()), self.docs)
+        self.assertEqual(self.table.all_ids(), [doc['_id'] for doc in self.docs])
+
+    def test_index(self):
+        self.assertEqual(self.table.ids('commit_id', 'c1'), [self.docs[0]['_id'], self.docs[2]['_id']])
+        self.assertEqual(self.table.ids('commit_id', 'other'), [])
+        self.assertTrue(self.table.contains('commit_id', 'c3'))
+        self.assertFalse(self.table.contains('commit_id', 'other'))
+        self.assertEqual(self.table.find('_id', self.docs[1]['_id']), [self.docs[1]])
+        self.assertEqual(self.table.find_many('commit_id', ['c3', 'other', 'c1', 'c3']),
+                         [self.docs[3], self.docs[0], self.docs[2]])
+
+    def test_record(self):
+        record = record_type(Hunk, ('id', 'content'))
+        hunk = self.table.find('commit_id', 'c2', record)[0]
+        self.assertEqual((hunk.id, hunk.content), (self.docs[1]['_id'], '+b\n+c'))
+        # the type of the table is not changed by the type of a query
+        self.assertEqual(self.table.find('commit_id', 'c2'), [self.docs[1]])
+
+    def test_missing_and_empty_file(self):
+        open(os.path.join(self.path, 'empty.jsonl'), 'w').close()
+        for name in ('empty.jsonl', 'missing.jsonl'):
+            table = SnapshotTable(os.path.join(self.path, name), dict, ('commit_id',))
+            self.assertEqual(len(table), 0)
+            self.assertEqual(table.find('commit_id', 'c1'), [])
+            self.assertEqual(list(table.all()), [])
+
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class TestSnapshot(unittest.TestCase):
+    """A snapshot has to return the same documents as the MongoDB and lead to the same labels."""
+
+    @classmethod
+    def setUpClass(cls):
+        mongoengine.connect(DATABASE, host=URI)
+        cls.log_level = logging.getLogger('labelSHARK').level
+        rnd = random.Random(1)
+        cls.commits = create_project(rnd)
+        other_commits = create_project(rnd, name='other', num_commits=5)
+
+        # commits that reference their code entity states, also of a commit of the project and of another project
+        # the file is only a test file because of the imports of the shared state
+        cls.shared = CodeEntityState(s_key='shared', long_name='src/Shared.java', commit_id=other_commits[0].id,
+                                     file_id=ObjectId(), ce_type='file', imports=['org.junit.Test']).save()
+        shared_file = File(vcs_system_id=cls.commits[0].vcs_system_id, path='src/Shared.java').save()
+        own = CodeEntityState.objects(commit_id=cls.commits[1].id, ce_type='file').first()
+        for commit, states in [(cls.commits[10], [cls.shared.id]), (cls.commits[11], [cls.shared.id]),
+                               (cls.commits[12], [own.id])]:
+            file_action = FileAction(file_id=shared_file.id, commit_id=commit.id, mode='M',
+                                     parent_revision_hash=commit.parents[0]).save()
+            Hunk(file_action_id=file_action.id, new_start=1, new_lines=1, old_start=1, old_lines=1,
+                 content='+ call();\n').save()
+            commit.code_entity_states = states
+            commit.save()
+
+        cls.path = tempfile.mkdtemp()
+        cls.snapshot_path = os.path.join(cls.path, 'snapshot')
+        export_snapshot(cls.snapshot_path, 'proj', chunk_size=7)
+        cls.project = Project.objects(name='proj').get()
+        cls.vcs_id = cls.commits[0].vcs_system_id
+        cls.its_ids = list(IssueSystem.objects(project_id=cls.project.id).scalar('id'))
+        cls.issue_ids = list(Issue.objects(issue_system_id__in=cls.its_ids).scalar('id'))
+        cls.file_action_ids = list(FileAction.objects(commit_id__in=[c.id for c in cls.commits]).scalar('id'))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+        mongoengine.connection.get_connection().drop_database(DATABASE)
+        mongoengine.disconnect()
+        reset_caches()
+        logging.getLogger('labelSHARK').setLevel(cls.log_level)
+
+    def setUp(self):
+        self.previous = data_source.backend
+        self.mongo = MongoDataSource()
+        self.snapshot = SnapshotDataSource(self.snapshot_path)
+
+    def tearDown(self):
+        data_source.use(self.previous)
+        clear_caches()
+
+    def assertSameRows(self, query, fields, ordered=False):
+        expected, actual = rows(query(self.mongo), fields), rows(query(self.snapshot), fields)
+        if not ordered:
+            expected, actual = sorted(expected, key=repr), sorted(actual, key=repr)
+        self.assertEqual(actual, expected)
+        return actual
+
+    def test_project(self):
+        self.assertEqual(self.snapshot.project('proj').id, self.project.id)
+        self.assertEqual(self.snapshot.vcs_system(self.project.id).id, self.vcs_id)
+        self.assertEqual(sorted(its.id for its in self.snapshot.issue_systems(self.project.id)), sorted(self.its_ids))
+        self.assertEqual(self.snapshot.issue_system(self.its_ids[1]).url, 'https://bz.apache.org/bugzilla/')
+        with self.assertRaises(mongoengine.DoesNotExist):
+            self.snapshot.project('other')
+
+    def test_commits(self):
+        self.assertEqual(self.snapshot.commit_ids(self.vcs_id), self.mongo.commit_ids(self.vcs_id))
+        exclude = [(self.commits[3].id, self.commits[8].id), (self.commits[50].id, self.commits[50].id)]
+        self.assertEqual(self.snapshot.count_commits(self.vcs_id, exclude), 53)
+        self.assertEqual(self.snapshot.count_commits(self.vcs_id), self.mongo.count_commits(self.vcs_id))
+
+        fields = SNAPSHOT_FIELDS[Commit]
+        for args in [(7,), (7, self.commits[5].id, self.commits[40].id, exclude), (100, None, None, exclude)]:
+            pages = [rows(page, fields) for page in self.snapshot.commit_pages(self.vcs_id, fields, *args)]
+            expected = [rows(page, fields) for page in self.mongo.commit_pages(self.vcs_id, fields, *args)]
+            self.assertEqual(pages, expected)
+        self.assertEqual(len(pages[0]), 53)
+
+        self.assertSameRows(lambda ds: ds.commit_messages(self.vcs_id), ('id', 'vcs_system_id', 'message'))
+        commit_ids = [c.id for c in self.commits[::5]] + [ObjectId()]
+        self.assertSameRows(lambda ds: ds.commit_messages(self.vcs_id, commit_ids), ('id', 'message'))
+
+    def test_issues(self):
+        fields = SNAPSHOT_FIELDS[Issue]
+        self.assertSameRows(lambda ds: ds.issues(self.issue_ids[:10] + [ObjectId()], fields), fields)
+        self.assertEqual(len(self.assertSameRows(lambda ds: ds.issues_of_systems(self.its_ids, fields), fields)), 40)
+        self.assertEqual(self.snapshot.event_marks(self.issue_ids), self.mongo.event_marks(self.issue_ids))
+        # the snapshot only has the events of the project
+        events = Event.objects(issue_id__in=self.issue_ids)
+        self.assertEqual(self.snapshot.event_stamp(), {'events': events.count(),
+                                                       'latest_event_id': str(max(events.scalar('id')))})
+        for its_id in self.its_ids:
+            self.assertEqual(self.snapshot.resolved_and_fixed_bugs(its_id), self.mongo.resolved_and_fixed_bugs(its_id))
+
+    def test_events_ordered_by_creation(self):
+        with_events = 0
+        for issue_id in self.issue_ids:
+            events = self.assertSameRows(lambda ds: ds.events(issue_id), SNAPSHOT_FIELDS[Event], ordered=True)
+            dates = [event[-1] for event in events]
+            # missing creation dates first, then by date and by id for equal dates
+            self.assertEqual(events, sorted(events, key=lambda e: (e[-1] is not None, e[-1] or datetime.min, e[0])))
+            with_events += len(dates) > 1 and None in dates and len(set(dates)) < len(dates)
+        self.assertGreater(with_events, 0)
+
+    def test_files(self):
+        commit_ids = [c.id for c in self.commits]
+        self.assertSameRows(lambda ds: ds.file_actions(commit_ids),
+                            ('id', 'commit_id', 'file_id', 'parent_revision_hash'))
+        file_ids = list(File.objects(vcs_system_id=self.vcs_id).scalar('id'))
+        self.assertSameRows(lambda ds: ds.files(file_ids[:5] + [ObjectId()]), ('id', 'path'))
+        self.assertSameRows(lambda ds: ds.files_of_vcs_system(self.vcs_id), ('id', 'path'))
+        self.assertSameRows(lambda ds: ds.hunks(self.file_action_ids), ('id', 'file_action_id', 'content'))
+        self.assertEqual(self.snapshot.hunk_counts(self.file_action_ids + [ObjectId()]),
+                         self.mongo.hunk_counts(self.file_action_ids + [ObjectId()]))
+        self.assertEqual(self.snapshot.refactoring_counts(commit_ids), self.mongo.refactoring_counts(commit_ids))
+
+    def test_code_entity_states(self):
+        fields = ('id', 'commit_id', 'long_name', 'imports')
+        commit_ids = [c.id for c in self.commits]
+        long_names = list(File.objects(vcs_system_id=self.vcs_id).scalar('path'))
+        self.assertGreater(len(self.assertSameRows(lambda ds: ds.file_states_by_commit(commit_ids, long_names),
+                                                   fields)), 0)
+        state_ids = [state_id for c in Commit.objects(vcs_system_id=self.vcs_id) for state_id in c.code_entity_states]
+        self.assertEqual(len(self.assertSameRows(lambda ds: ds.file_states_by_id(state_ids, long_names), fields)),
+                         len(set(state_ids)))
+
+    def test_exported_code_entity_states(self):
+        with open(os.path.join(self.snapshot_path, 'code_entity_state.jsonl')) as f:
+            exported = [json_util.loads(line) for line in f]
+        exported_ids = [doc['_id'] for doc in exported]
+        # the states of the commits and the shared state of the other project, every state only once
+        expected = list(CodeEntityState.objects(commit_id__in=[c.id for c in self.commits], ce_type='file')
+                        .scalar('id')) + [self.shared.id]
+        self.assertEqual(sorted(exported_ids), sorted(expected))
+        self.assertEqual(len(exported_ids), len(set(exported_ids)))
+        self.assertEqual(exported_ids[-1], self.shared.id)
+        self.assertEqual(set(exported[0]), {'_id', 'commit_id', 'long_name', 'imports', 'ce_type'})
+
+    def label(self, name, *args):
+        """Labels the project with main and returns the labels of every commit from the JSONL sink."""
+        clear_caches()
+        path = os.path.join(self.path, '{}.jsonl'.format(name))
+        main(build_parser().parse_args(['-n', 'proj', '--db-database', DATABASE, '--sink', 'jsonl', '--sink-path',
+                                        path, '--checkpoint', os.path.join(self.path, 'checkpoint.json'), '-ll',
+                                        'WARNING'] + list(args)), uri=URI)
+        with open(path) as f:
+            return {entry['commit_id']: entry['labels'] for entry in map(json.loads, f)}
+
+    def test_same_labels_as_mongodb(self):
+        # different batch sizes, so that no approach keeps the data of the commits of the last batch
+        expected = self.label('mongo', '-bs', '7')
+        self.assertEqual(len(expected), 60)
+        for args in [('-bs', '9'), ('-bs', '11', '--documents'), ('-bs', '13', '--preload-issues',
+                                                                   '--preload-file-paths', '--preload-messages')]:
+            self.assertEqual(self.label('snapshot', '--snapshot', self.snapshot_path, *args), expected, args)
+        # the shared state of the other project makes the commits test changes
+        self.assertTrue(expected[str(self.commits[10].id)]['testchange_javacode'])
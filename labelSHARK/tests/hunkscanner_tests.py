@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import re
+import sys
+import unittest
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from approaches.util.hunkscanner import scan_java_hunk  # noqa: E402
+
+# the regular expressions of the documentation approach before the hunk scanner
+JAVA_STRING = re.compile(r"(\"(?:[^\"\\]|\\\"|\\)*\")")
+MULTILINE_COMMENT = re.compile(r"^(-|\+)\s*((/\*)|(\*)).*$", re.MULTILINE)
+JAVA_INLINECOMMENT = re.compile(r"^(-|\+).*//.*$", re.MULTILINE)
+TECHNICALDEPT_ADD = re.compile(r"^\+.*//\s*(TODO|XXX|FIXME).*$", re.MULTILINE)
+TECHNICALDEPT_REMOVE = re.compile(r"^-.*//\s*(TODO|XXX|FIXME).*$", re.MULTILINE)
+
+CORPUS = [
+    '',
+    '+',
+    '+ int a = 1;\n- int a = 2;\n',
+    '+/**\n+ * Returns the answer.\n+ */\n+public int answer() {\n',
+    '- /* old comment */\n+ // new comment\n',
+    '+ foo(); // TODO remove\n- bar(); // FIXME\n',
+    '+ foo(); //   XXX\n',
+    '+ String s = "// TODO not a comment";\n',
+    '+ String s = "a\n+ // TODO inside a string over two lines";\n',
+    '+ String s = "escaped \\" // TODO";\n',
+    '+ String s = "unterminated // TODO\n',
+    '+\n   * starts after an empty line\n',
+    '+\n\n\t\n*\n',
+    '-  \n  /* comment after whitespace lines\n',
+    '+ x(); //\n  TODO on the next line\n',
+    '+ x(); //\n+ /* removed comment\n TODO after the removed comment\n',
+    '+ x(); //\n+ y();\n TODO\n',
+    '+///TODO\n',
+    '+ a // b // FIXME\n',
+    ' context // TODO\n',
+    '\\ No newline at end of file\n+ // TODO\n',
+    '+ x(); // TODO\r\n- y(); // XXX\r\n',
+    '+ *\n+ x(); // TODO\n',
+    '+ /* a */ x(); // TODO\n',
+    '-// todo lower case\n',
+    '+ * unicode whitespace\n',
+    '+ a(); // TODO\n',
+]
+
+TOKENS = ['+', '-', ' ', '  ', '\t', '\n', '\n', '\n', '\r', '//', '/', '*', '/*', '*/', '"', '\\"', '\\', 'TODO',
+          'XXX', 'FIXME', 'x', 'foo();', 'int a = 1;', ' ']
+
+
+def reference(content):
+    content = re.sub(JAVA_STRING, '', content)
+    javadoc = MULTILINE_COMMENT.search(content) is not None
+    content = re.sub(MULTILINE_COMMENT, '', content)
+    return (javadoc, JAVA_INLINECOMMENT.search(content) is not None,
+            TECHNICALDEPT_ADD.search(content) is not None, TECHNICALDEPT_REMOVE.search(content) is not None)
+
+
+def random_hunks(seed, num):
+    rnd = random.Random(seed)
+    for _ in range(num):
+        yield ''.join(rnd.choice(TOKENS) for _ in range(rnd.randint(0, 40)))
+
+
+class TestHunkScanner(unittest.TestCase):
+    """The hunk scanner has to find the same as the regular expressions it replaced."""
+
+    def test_corpus(self):
+        for content in CORPUS:
+            self.assertEqual(tuple(scan_java_hunk(content)), reference(content), repr(content))
+
+    def test_random_hunks(self):
+        for content in random_hunks(42, 20000):
+            self.assertEqual(tuple(scan_java_hunk(content)), reference(content), repr(content))
+
+    def test_flags(self):
+        flags = scan_java_hunk('+/**\n+ * doc\n+ */\n+ x(); // TODO\n- y(); // FIXME\n')
+        self.assertTrue(flags.javadoc)
+        self.assertTrue(flags.inline)
+        self.assertTrue(flags.technicaldept_add)
+        self.assertTrue(flags.technicaldept_remove)
+
+
+if __name__ == '__main__':
+    unittest.main()
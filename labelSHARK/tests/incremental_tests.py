@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+from bson import ObjectId
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from core import LabelSHARK, BaseLabelApproach  # noqa: E402
+from incremental import LabelState  # noqa: E402
+from writer import _is_stored  # noqa: E402
+
+Commit = namedtuple('Commit', ['id', 'revision_hash', 'message'])
+
+
+class FakeCollection(object):
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return [doc for doc in self.docs if doc['vcs_system_id'] == query['vcs_system_id']]
+
+
+class StoredLabelState(LabelState):
+    """LabelState with the fingerprints of a previous run instead of the MongoDB."""
+
+    def __init__(self, vcs_system_id, docs, full=False):
+        super().__init__(vcs_system_id, full)
+        self._collection = FakeCollection(docs)
+
+    @property
+    def collection(self):
+        return self._collection
+
+
+class MessageApproach(BaseLabelApproach):
+    """Labels commits by their message and an input document that is not part of the commit."""
+
+    __module__ = 'approaches.message'
+    commit_fields = ('message',)
+
+    def __init__(self, inputs=None):
+        self.inputs = inputs
+        self.labeled = []
+
+    def input_state(self, commits):
+        if self.inputs is None:
+            return None
+        return {commit.id: self.inputs.get(commit.id) for commit in commits}
+
+    def label_batch(self, commits):
+        self.labeled.extend(commit.id for commit in commits)
+        return {commit.id: [('fix', 'fix' in commit.message)] for commit in commits}
+
+    def set_commit(self, commit):
+        pass
+
+    def get_labels(self):
+        return []
+
+
+class TestLabelState(unittest.TestCase):
+    """Labels are only computed again if the commit fields or the input state of the approach changed."""
+
+    def setUp(self):
+        self.vcs_system_id = ObjectId()
+        self.commits = [Commit(ObjectId(), '{:040x}'.format(i), 'fix {}'.format(i)) for i in range(10)]
+        self.inputs = {commit.id: {'status': 'open'} for commit in self.commits}
+
+    def run_labels(self, approach, docs=(), full=False):
+        labelshark = LabelSHARK()
+        labelshark.approaches = [approach]
+        label_state = StoredLabelState(self.vcs_system_id, list(docs), full)
+        label_state.load()
+        labels = labelshark.label_batch(self.commits, label_state)
+        # the stored documents of the next run, only commits with recorded fingerprints get one
+        stored = []
+        for commit in self.commits:
+            fingerprints = label_state.pop(commit.id)
+            if fingerprints is not None:
+                stored.append({'_id': commit.id, 'vcs_system_id': self.vcs_system_id, 'fingerprints': fingerprints})
+        return labels, label_state, stored
+
+    def test_unchanged_inputs_are_skipped(self):
+        labels, label_state, stored = self.run_labels(MessageApproach(self.inputs))
+        self.assertEqual(len(stored), 10)
+        self.assertEqual(labels[self.commits[0].id], [('message_fix', True)])
+        self.assertEqual(label_state.outdated, 10)
+
+        approach = MessageApproach(self.inputs)
+        labels, label_state, _ = self.run_labels(approach, stored)
+        self.assertEqual(approach.labeled, [])
+        self.assertEqual(label_state.current, 10)
+        self.assertTrue(all(not commit_labels for commit_labels in labels.values()))
+
+    def test_changed_inputs_are_labeled_again(self):
+        _, _, stored = self.run_labels(MessageApproach(self.inputs))
+
+        self.inputs[self.commits[2].id] = {'status': 'closed'}
+        self.commits[5] = self.commits[5]._replace(message='feature')
+        approach = MessageApproach(self.inputs)
+        labels, label_state, rewritten = self.run_labels(approach, stored)
+        self.assertEqual(approach.labeled, [self.commits[2].id, self.commits[5].id])
+        self.assertEqual((label_state.current, label_state.outdated), (8, 2))
+        self.assertEqual(labels[self.commits[5].id], [('message_fix', False)])
+
+        # the new fingerprints replace the stored ones
+        fingerprints = {doc['_id']: doc['fingerprints'] for doc in stored}
+        for doc in rewritten:
+            self.assertNotEqual(doc['fingerprints'], fingerprints[doc['_id']])
+            fingerprints[doc['_id']] = doc['fingerprints']
+        approach = MessageApproach(self.inputs)
+        self.run_labels(approach, [dict(doc, fingerprints=fingerprints[doc['_id']]) for doc in stored])
+        self.assertEqual(approach.labeled, [])
+
+    def test_new_version_is_labeled_again(self):
+        _, _, stored = self.run_labels(MessageApproach(self.inputs))
+        approach = MessageApproach(self.inputs)
+        approach.version = '2'
+        self.run_labels(approach, stored)
+        self.assertEqual(len(approach.labeled), 10)
+
+    def test_full_run_ignores_stored_fingerprints(self):
+        _, _, stored = self.run_labels(MessageApproach(self.inputs))
+        approach = MessageApproach(self.inputs)
+        self.run_labels(approach, stored, full=True)
+        self.assertEqual(len(approach.labeled), 10)
+
+    def test_unknown_inputs_are_never_skipped(self):
+        labels, label_state, stored = self.run_labels(MessageApproach())
+        self.assertEqual(stored, [])
+        self.assertEqual(labels[self.commits[0].id], [('message_fix', True)])
+
+        approach = MessageApproach()
+        _, label_state, _ = self.run_labels(approach, stored)
+        self.assertEqual(len(approach.labeled), 10)
+        self.assertEqual((label_state.current, label_state.outdated), (0, 10))
+
+    def test_other_vcs_systems_are_not_loaded(self):
+        _, _, stored = self.run_labels(MessageApproach(self.inputs))
+        self.vcs_system_id = ObjectId()
+        approach = MessageApproach(self.inputs)
+        self.run_labels(approach, stored)
+        self.assertEqual(len(approach.labeled), 10)
+
+
+class TestIsStored(unittest.TestCase):
+
+    def test_is_stored(self):
+        stored = {'szz_bugfix': True, 'szz_count': 1}
+        self.assertTrue(_is_stored(stored, 'szz_bugfix', True))
+        self.assertFalse(_is_stored(stored, 'szz_bugfix', False))
+        self.assertFalse(_is_stored(stored, 'szz_featureadd', False))
+
+    def test_type_has_to_match(self):
+        # True == 1 in python, the labels are still written again
+        self.assertFalse(_is_stored({'szz_bugfix': 1}, 'szz_bugfix', True))
+        self.assertFalse(_is_stored({'szz_count': True}, 'szz_count', 1))
+        self.assertFalse(_is_stored({'szz_bugfix': None}, 'szz_bugfix', False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import random
+import sys
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from core import BaseLabelApproach  # noqa: E402
+from datasource import data_source  # noqa: E402
+from approaches.issuefasttext import IssueFasttext  # noqa: E402
+from approaches.util.issuestore import issue_store, ISSUE_FIELDS  # noqa: E402
+from approaches.util.labelutils import its_cache  # noqa: E402
+
+Issue = namedtuple('Issue', ISSUE_FIELDS)
+IssueSystem = namedtuple('IssueSystem', ['id', 'url'])
+Commit = namedtuple('Commit', ['id', 'linked_issue_ids'])
+
+
+class IssueBackend(object):
+    """Data source with the issues of one JIRA issue system in memory."""
+
+    def __init__(self, issues):
+        self._issues = {issue.id: issue for issue in issues}
+
+    def issues(self, issue_ids, fields):
+        return [self._issues[issue_id] for issue_id in issue_ids if issue_id in self._issues]
+
+    def issue_system(self, issue_system_id):
+        return IssueSystem(issue_system_id, 'https://issues.apache.org/jira/projects/X')
+
+    def events(self, issue_id):
+        return []
+
+
+class StubClassifier(object):
+    """Classifier that predicts a bug if the title contains crash and records the titles of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(list(X['title']))
+        return np.array([[0.1, 0.9] if 'crash' in title else [0.9, 0.1] for title in X['title']])
+
+
+def issue(issue_id, title, issue_type='Bug', parent_issue_id=None):
+    return Issue(issue_id, 'jira', issue_type, 'closed', 'fixed', title, 'desc\nof {}'.format(issue_id),
+                 parent_issue_id, None)
+
+
+class TestIssueFasttext(unittest.TestCase):
+    """The batch labels have to be the same as the labels of single commits, with every issue scored once."""
+
+    def setUp(self):
+        rnd = random.Random(1)
+        issues = []
+        for i in range(60):
+            parent = rnd.choice(issues).id if issues and rnd.random() < 0.3 else None
+            issues.append(issue(i, '{} {}'.format(rnd.choice(['crash in', 'typo in', 'slow']), i),
+                                rnd.choice(['Bug', 'Bug', 'Improvement']), parent))
+        # the child is scored first and is no bug, the parent with its own title is
+        issues += [issue('parent', 'crash on start'), issue('child', 'typo in docs', parent_issue_id='parent')]
+        self.commits = [Commit(i, [rnd.choice(issues).id for _ in range(rnd.choice([0, 1, 1, 2, 3]))])
+                        for i in range(80)]
+        self.commits.append(Commit('parent_commit', ['child']))
+
+        self.previous = data_source.backend
+        data_source.use(IssueBackend(issues))
+        issue_store.clear()
+        its_cache.clear()
+
+    def tearDown(self):
+        for cache in (issue_store, its_cache):
+            cache.clear()
+            cache.hits = cache.misses = 0
+        data_source.use(self.previous)
+
+    def approach(self):
+        # without the classifier files the approach warns when it is created
+        logger = logging.getLogger('IssueFasttext')
+        logger.disabled = True
+        try:
+            approach = IssueFasttext()
+        finally:
+            logger.disabled = False
+        approach._enabled = True
+        approach._text_clf = StubClassifier()
+        approach._title_clf = StubClassifier()
+        return approach
+
+    def label(self, approach, batch_size):
+        labels = {}
+        for i in range(0, len(self.commits), batch_size):
+            labels.update(approach.label_batch(self.commits[i:i + batch_size]))
+        return labels
+
+    def test_same_as_single_commits(self):
+        single = self.approach()
+        expected = BaseLabelApproach.label_batch(single, self.commits)
+        for batch_size in (1, 7, 100):
+            self.assertEqual(self.label(self.approach(), batch_size), expected, batch_size)
+        self.assertEqual(set(value for labels in expected.values() for _, value in labels), {True, False})
+
+    def test_parent_scored_with_own_title(self):
+        approach = self.approach()
+        self.commits = self.commits[-1:]
+        self.assertEqual(self.label(approach, 10), {'parent_commit': [('bugfix', True)]})
+        self.assertEqual(approach._title_clf.calls, [['typo in docs'], ['crash on start']])
+        self.assertEqual(approach._text_clf.calls, approach._title_clf.calls)
+
+    def test_every_issue_scored_once(self):
+        approach = self.approach()
+        self.label(approach, 7)
+        titles = [title for call in approach._title_clf.calls for title in call]
+        self.assertEqual(len(titles), len(set(titles)))
+        self.assertEqual(len(titles), len(approach._predictions))
+        # the issues of a batch are scored together in rounds, not one by one
+        self.assertLess(len(approach._title_clf.calls), len(titles))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from datasource import data_source  # noqa: E402
+from approaches.util.issuestore import IssueStore, ISSUE_FIELDS  # noqa: E402
+
+Issue = namedtuple('Issue', ISSUE_FIELDS)
+Commit = namedtuple('Commit', ['id', 'linked_issue_ids'])
+
+
+class IssueBackend(object):
+    """Data source with the issues in memory that records every query."""
+
+    def __init__(self, issues, events=None):
+        self._issues = {issue.id: issue for issue in issues}
+        self._events = events or {}
+        self.queries = []
+
+    def issues(self, issue_ids, fields):
+        self.queries.append(('issues', sorted(issue_ids)))
+        return [self._issues[issue_id] for issue_id in issue_ids if issue_id in self._issues]
+
+    def issues_of_systems(self, issue_system_ids, fields):
+        self.queries.append(('issues_of_systems', sorted(issue_system_ids)))
+        return [issue for issue in self._issues.values() if issue.issue_system_id in issue_system_ids]
+
+    def event_marks(self, issue_ids):
+        self.queries.append(('event_marks', sorted(issue_ids)))
+        return {issue_id: self._events[issue_id] for issue_id in issue_ids if issue_id in self._events}
+
+
+def issue(issue_id, parent_issue_id=None, status='open'):
+    return Issue(issue_id, 'its', 'bug', status, None, 'title', 'desc', parent_issue_id, None)
+
+
+class TestIssueStore(unittest.TestCase):
+    """The store fetches every missing issue with one query and keeps the most recently used issues."""
+
+    def setUp(self):
+        self.backend = IssueBackend([issue(i) for i in range(10)] + [issue(10, parent_issue_id=3)],
+                                    events={1: [2, 'e2']})
+        self.previous = data_source.backend
+        data_source.use(self.backend)
+        self.store = IssueStore(max_size=4)
+
+    def tearDown(self):
+        data_source.use(self.previous)
+
+    def test_hits_and_misses(self):
+        self.assertEqual([i.id for i in self.store.get_many([0, 1, 1, 99])], [0, 1])
+        self.assertEqual((self.store.hits, self.store.misses), (0, 3))
+        self.assertEqual(self.store.get(1).id, 1)
+        self.assertIsNone(self.store.get(99))
+        # missing issues are not stored, they are fetched again
+        self.assertEqual((self.store.hits, self.store.misses), (1, 4))
+        self.assertEqual(self.backend.queries, [('issues', [0, 1, 99]), ('issues', [99])])
+
+    def test_least_recently_used_is_evicted(self):
+        self.store.get_many([0, 1, 2, 3])
+        # 0 is used again, so 1 is the least recently used issue
+        self.store.get(0)
+        self.store.get(4)
+        self.assertEqual(len(self.store), 4)
+        self.backend.queries = []
+        self.store.get_many([0, 2, 3, 4])
+        self.assertEqual(self.backend.queries, [])
+        self.store.get(1)
+        self.assertEqual(self.backend.queries, [('issues', [1])])
+        self.assertEqual(self.store.stats(), {'size': 4, 'hits': 5, 'misses': 6})
+
+    def test_larger_request_than_store(self):
+        issues = self.store.get_many(range(8))
+        self.assertEqual([i.id for i in issues], list(range(8)))
+        self.assertEqual(len(self.store), 4)
+
+    def test_load_resolves_parents(self):
+        self.store.load([10])
+        self.assertEqual(self.backend.queries, [('issues', [10]), ('issues', [3])])
+        self.assertEqual(self.store.get_parent(self.store.get(10)).id, 3)
+        self.assertIsNone(self.store.get_parent(self.store.get(3)))
+        self.assertEqual(len(self.backend.queries), 2)
+
+    def test_preload(self):
+        self.store.configure({'preload_issues': True, 'its': [namedtuple('IssueSystem', ['id'])('its')]})
+        self.assertEqual(len(self.store), 4)
+        self.store.configure({'preload_issues': True, 'its': [namedtuple('IssueSystem', ['id'])('its')]})
+        self.assertEqual(len(self.backend.queries), 1)
+
+    def test_input_states(self):
+        commits = [Commit('a', [10]), Commit('b', [1]), Commit('c', [])]
+        states = self.store.input_states(commits, 'linked_issue_ids')
+        self.assertEqual(states['a'], [list(issue(10, parent_issue_id=3)) + [0, None], list(issue(3)) + [0, None]])
+        self.assertEqual(states['b'], [list(issue(1)) + [2, 'e2']])
+        self.assertEqual(states['c'], [])
+
+        # the event marks are only fetched once
+        self.backend.queries = []
+        self.store.input_states(commits, 'linked_issue_ids')
+        self.assertEqual([query for query in self.backend.queries if query[0] == 'event_marks'], [])
+
+    def test_clear(self):
+        self.store.get_many([0, 1])
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
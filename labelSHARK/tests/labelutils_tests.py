@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import sys
+import unittest
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import mongoengine
+import pycoshark.utils
+from bson import ObjectId
+from pycoshark.mongomodels import Issue as IssueDocument, Event as EventDocument
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from datasource import data_source, MongoDataSource  # noqa: E402
+from approaches.util import labelutils  # noqa: E402
+from approaches.util.labelutils import IssueSystemCache, its_type_from_url  # noqa: E402
+
+IssueSystem = namedtuple('IssueSystem', ['id', 'url'])
+Issue = namedtuple('Issue', ['id', 'issue_system_id', 'issue_type', 'status', 'resolution'])
+Event = namedtuple('Event', ['status', 'new_value'])
+
+
+class IssueSystemBackend(object):
+    """Data source with the issue systems and events in memory that records every query."""
+
+    def __init__(self, issue_systems, events=None):
+        self._issue_systems = {its.id: its for its in issue_systems}
+        self._events = events or {}
+        self.queries = []
+
+    def issue_system(self, issue_system_id):
+        self.queries.append(('issue_system', issue_system_id))
+        return self._issue_systems[issue_system_id]
+
+    def events(self, issue_id):
+        self.queries.append(('events', issue_id))
+        return self._events.get(issue_id, [])
+
+
+class TestIssueSystemCache(unittest.TestCase):
+    """Every issue system is only resolved once per run."""
+
+    def setUp(self):
+        self.backend = IssueSystemBackend([IssueSystem('jira', 'https://issues.apache.org/jira/projects/X'),
+                                           IssueSystem('bz', 'https://bz.apache.org/bugzilla/'),
+                                           IssueSystem('gh', 'https://api.github.com/repos/x/y/issues'),
+                                           IssueSystem('other', 'https://tracker.example.org')],
+                                          events={'i2': [Event('status', 'Closed'), Event('resolution', 'Fixed')]})
+        self.previous = data_source.backend
+        data_source.use(self.backend)
+        labelutils.its_cache.clear()
+        self.cache = IssueSystemCache()
+
+    def tearDown(self):
+        labelutils.its_cache.clear()
+        data_source.use(self.previous)
+
+    def test_types(self):
+        self.assertEqual([self.cache.get_type(its_id) for its_id in ('jira', 'bz', 'gh', 'other')],
+                         ['jira', 'bugzilla', 'github', None])
+        self.assertEqual(self.cache.get_url('other'), 'https://tracker.example.org')
+        self.assertEqual(its_type_from_url('https://github.com/x/y'), 'github')
+
+    def test_hits_and_misses(self):
+        for _ in range(3):
+            self.cache.get_type('jira')
+        self.cache.get_url('jira')
+        self.cache.get_type('bz')
+        self.assertEqual(self.cache.stats(), {'size': 2, 'hits': 3, 'misses': 2})
+        self.assertEqual(self.backend.queries, [('issue_system', 'jira'), ('issue_system', 'bz')])
+
+    def test_clear(self):
+        self.cache.get_type('jira')
+        self.cache.clear()
+        self.cache.get_type('jira')
+        self.assertEqual(len(self.backend.queries), 2)
+
+    def test_checks_use_the_shared_cache(self):
+        issues = [Issue('i1', 'jira', 'Bug', 'closed', 'fixed'), Issue('i2', 'jira', 'Bug', 'open', None),
+                  Issue('i3', 'jira', 'New Feature', 'resolved', "won't fix")]
+        self.assertEqual([labelutils.isbugfix(issue) for issue in issues], [True, True, False])
+        self.assertEqual([labelutils.isfeatureadd(issue) for issue in issues], [False, False, False])
+        # the events are only read if the issue itself is not resolved
+        self.assertEqual(self.backend.queries, [('issue_system', 'jira'), ('events', 'i2')])
+        self.assertEqual(labelutils.its_cache.stats()['hits'], 5)
+
+
+
+class TestJiraResolvedAndFixed(unittest.TestCase):
+    """The copy for snapshots has to give the same results as pycoshark, which is used on the MongoDB."""
+
+    def test_constants(self):
+        for name in ('_CLOSED_STATUS', '_RESOLVED_TYPES', '_WONT_FIX_TYPES'):
+            self.assertEqual(set(getattr(labelutils, name)), set(getattr(pycoshark.utils, name)), name)
+
+    @unittest.skipIf(mongomock is None, 'mongomock is not installed')
+    def test_same_as_pycoshark(self):
+        mongoengine.connect('labelshark_test', host='mongomock://localhost')
+        previous = data_source.backend
+        data_source.use(MongoDataSource())
+        try:
+            rnd = random.Random(1)
+            values = ['Resolved', 'closed', 'Fixed', 'open', "Won't Fix", 'duplicate', 'done', None]
+            issue_system_id = ObjectId()
+            issues = []
+            for i in range(300):
+                issue = IssueDocument(issue_system_id=issue_system_id, external_id=str(i), status=rnd.choice(values),
+                                      resolution=rnd.choice(values)).save()
+                start = datetime(2020, 1, 1)
+                for j in range(rnd.randint(0, 4)):
+                    EventDocument(issue_id=issue.id, external_id='{}_{}'.format(i, j),
+                                  created_at=start + timedelta(days=rnd.randint(0, 100)),
+                                  status=rnd.choice(['status', 'Resolution', 'comment', None]),
+                                  new_value=rnd.choice(values)).save()
+                issues.append(issue)
+            results = [labelutils.snapshot_jira_is_resolved_and_fixed(issue) for issue in issues]
+            self.assertEqual(results, [pycoshark.utils.jira_is_resolved_and_fixed(issue) for issue in issues])
+            self.assertEqual(results, [labelutils.jira_is_resolved_and_fixed(issue) for issue in issues])
+            self.assertTrue(any(results) and not all(results))
+        finally:
+            data_source.use(previous)
+            IssueDocument.drop_collection()
+            EventDocument.drop_collection()
+            mongoengine.disconnect()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import re
+import sys
+import unittest
+from collections import namedtuple
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from datasource import data_source  # noqa: E402
+from approaches.refactoring import RefactoringLabels  # noqa: E402
+from approaches.util.messageflags import classify, MessageFlags, message_flags  # noqa: E402
+
+Commit = namedtuple('Commit', ['id', 'vcs_system_id', 'message'])
+
+# message and the expected matches of the refactoring keywords, fix or bug and merge
+EXPECTED = [
+    ('', (False, False, False)),
+    ('Refactor the parser', (True, False, False)),
+    ('refactoring', (True, False, False)),
+    ('Fix NPE in reader, refactor later', (False, True, False)),
+    ('rename  method getValue', (True, False, False)),
+    ('Rename Variable', (True, False, False)),
+    ('moved icons to resources', (False, False, False)),
+    ('moved the version to 1.2', (False, False, False)),
+    ('move parser to util', (True, False, False)),
+    ('simplify the configuration', (True, False, False)),
+    ('simple', (True, False, False)),
+    ('simplified', (False, False, False)),
+    ('typo in variable name', (True, False, False)),
+    ('Merge branch master', (False, False, True)),
+    ('merge method bodies, fixes #12', (True, False, True)),
+    ('pull up method', (True, False, False)),
+    ('extract interface', (True, False, False)),
+    ('REMOVE DUPLICATE code', (True, False, False)),
+    ('\nrefactor after a newline', (False, False, False)),
+    (' refactor after a space', (False, False, False)),
+    ('getter and setter', (True, False, False)),
+    ('a bug in the getter', (False, True, False)),
+    ('bugfix', (False, False, False)),
+]
+
+
+class TestMessageFlags(unittest.TestCase):
+    """The flags of every message have to be the expected matches of the keyword patterns."""
+
+    def setUp(self):
+        self.patterns = [RefactoringLabels()._keywords, re.compile(r'.*\b(fix|bug)\b'), re.compile(r'merge')]
+
+    def assert_flags(self, messages, flags):
+        for (message, expected), message_flags in zip(messages, flags):
+            self.assertEqual(tuple(bool(message_flags & 1 << i) for i in range(len(self.patterns))), expected,
+                             repr(message))
+
+    def test_expected_flags(self):
+        self.assert_flags(EXPECTED, classify([message for message, _ in EXPECTED], self.patterns))
+
+    def test_repeated_messages(self):
+        # equal messages are classified once, but every message gets its flags
+        messages = EXPECTED * 3 + list(reversed(EXPECTED))
+        flags = classify([message for message, _ in messages], self.patterns)
+        self.assertEqual(len(flags), len(messages))
+        self.assert_flags(messages, flags)
+
+    def test_no_patterns(self):
+        self.assertEqual(classify(['refactor', 'fix'], []), [0, 0])
+
+    def test_same_as_per_commit_regex(self):
+        # random messages from the words of the keywords, compared with the regex of every single message
+        words = ['refactor', 'Rename', 'method', 'moved', 'icons', 'version', 'fix', 'bug', 'merge', 'class',
+                 'typo', 'in', 'variable', 'Simplify', 'the', 'pull', 'up', 'remove', 'duplicate', '\n', ' ', '#1']
+        rnd = random.Random(1)
+        messages = [' '.join(rnd.choice(words) for _ in range(rnd.randint(0, 6))) for _ in range(2000)]
+        flags = classify(messages, self.patterns)
+        for message, message_flags in zip(messages, flags):
+            expected = tuple(pattern.match(message.lower()) is not None for pattern in self.patterns)
+            self.assertEqual(tuple(bool(message_flags & 1 << i) for i in range(len(self.patterns))), expected,
+                             repr(message))
+
+
+class MessageBackend(object):
+    """Data source with the commit messages in memory that records every query."""
+
+    def __init__(self, commits):
+        self._commits = commits
+        self.queries = []
+
+    def commit_messages(self, vcs_system_id, commit_ids=None):
+        self.queries.append(('commit_messages', None if commit_ids is None else sorted(commit_ids)))
+        return [commit for commit in self._commits
+                if commit.vcs_system_id == vcs_system_id and (commit_ids is None or commit.id in commit_ids)]
+
+
+class TestMessageFlagsTable(unittest.TestCase):
+    """The table classifies every message once, either with the preload or with the batch of its commit."""
+
+    def setUp(self):
+        self.commits = [Commit(i, 'vcs', message) for i, (message, _) in enumerate(EXPECTED)]
+        self.backend = MessageBackend(self.commits)
+        self.previous = data_source.backend
+        data_source.use(self.backend)
+        self.table = MessageFlags(max_size=10, chunk_size=4)
+        self.refactoring = 1 << self.table.register(RefactoringLabels()._keywords)
+        self.merge = 1 << self.table.register(re.compile(r'merge'))
+
+    def tearDown(self):
+        data_source.use(self.previous)
+
+    def assert_flags(self, flags, commits):
+        for commit in commits:
+            expected = EXPECTED[commit.id][1]
+            self.assertEqual((bool(flags[commit.id] & self.refactoring), bool(flags[commit.id] & self.merge)),
+                             (expected[0], expected[2]), repr(commit.message))
+
+    def test_batches(self):
+        self.assert_flags(self.table.get_many(self.commits[:8]), self.commits[:8])
+        self.assert_flags(self.table.get_many(self.commits[4:12]), self.commits[4:12])
+        self.assertEqual(self.table.stats(), {'size': 10, 'hits': 4, 'misses': 12})
+        # the messages of the batches are used, nothing is read
+        self.assertEqual(self.backend.queries, [])
+
+    def test_preload(self):
+        self.table.configure({'preload_messages': True, 'message_table_size': 30})
+        commits = [commit._replace(message=None) for commit in self.commits]
+        self.assert_flags(self.table.get_many(commits[:5]), commits[:5])
+        self.assert_flags(self.table.get_many(commits), commits)
+        self.assertEqual(self.backend.queries, [('commit_messages', None)])
+        self.assertEqual(self.table.stats(), {'size': len(EXPECTED), 'hits': 5 + len(EXPECTED), 'misses': 0})
+
+    def test_preload_into_a_full_table(self):
+        self.table.configure({'preload_messages': True, 'message_table_size': 8})
+        commits = [commit._replace(message=None) for commit in self.commits]
+        self.assert_flags(self.table.get_many(commits), commits)
+        self.assertEqual(self.table.stats()['size'], 8)
+        # the commits that did not fit are read by their ids
+        self.assertEqual(len(self.backend.queries), 2)
+        self.assertEqual(self.backend.queries[1][0], 'commit_messages')
+
+    def test_register_after_the_first_commit(self):
+        self.table.get_many(self.commits[:1])
+        self.assertEqual(self.table.register(re.compile(r'merge')), 1)
+        with self.assertRaises(Exception):
+            self.table.register(re.compile(r'fix'))
+
+
+class TestRefactoringKeywords(unittest.TestCase):
+    """The keyword label is the same for a batch and for single commits."""
+
+    def setUp(self):
+        self.previous = data_source.backend
+        data_source.use(self)
+        self.approach = RefactoringLabels()
+        self.approach.configure({})
+        self.commits = [Commit(i, 'vcs', message) for i, (message, _) in enumerate(EXPECTED)]
+
+    def tearDown(self):
+        message_flags.clear()
+        data_source.use(self.previous)
+
+    def refactoring_counts(self, commit_ids):
+        return {commit_id: 1 for commit_id in commit_ids if commit_id % 3 == 0}
+
+    def test_batch_and_single_commits(self):
+        labels = self.approach.label_batch(self.commits)
+        for commit, (_, expected) in zip(self.commits, EXPECTED):
+            self.approach.set_commit(commit)
+            self.assertEqual(self.approach.get_labels(), labels[commit.id])
+            self.assertEqual(labels[commit.id], [('keyword', expected[0]), ('codebased', commit.id % 3 == 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import sys
+import threading
+import unittest
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from pipeline import read_ahead, InstrumentedQueue, queue_stats  # noqa: E402
+
+
+class Pages(object):
+    """Iterable of pages that counts how many pages were read and can fail after some pages."""
+
+    def __init__(self, num, fail_after=None):
+        self.num = num
+        self.fail_after = fail_after
+        self.read = 0
+
+    def __iter__(self):
+        for i in range(self.num):
+            if i == self.fail_after:
+                raise ValueError('page {} failed'.format(i))
+            self.read += 1
+            yield i
+
+
+def reader_threads(name):
+    return [thread for thread in threading.enumerate() if thread.name == 'labelSHARK-{}'.format(name)]
+
+
+class TestReadAhead(unittest.TestCase):
+
+    def test_every_item_in_order(self):
+        self.assertEqual(list(read_ahead(Pages(50), 3, name='order')), list(range(50)))
+        self.assertEqual(list(read_ahead(Pages(0), 3, name='order')), [])
+
+    def test_read_ahead_is_bounded(self):
+        pages = Pages(100)
+        for i, page in enumerate(read_ahead(pages, 2, name='bounded')):
+            # up to depth items in the queue, one the reader waits to put and the item of the caller
+            self.assertLessEqual(pages.read, i + 4)
+        self.assertEqual(pages.read, 100)
+
+    def test_error_is_raised_by_the_caller(self):
+        received = []
+        with self.assertRaises(ValueError):
+            for page in read_ahead(Pages(10, fail_after=4), 2, name='error'):
+                received.append(page)
+        # every item before the error is still received
+        self.assertEqual(received, [0, 1, 2, 3])
+
+    def test_shutdown_when_the_caller_stops(self):
+        pages = Pages(1000)
+        items = read_ahead(pages, 2, name='shutdown')
+        self.assertEqual(next(items), 0)
+        items.close()
+        for thread in reader_threads('shutdown'):
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        self.assertLess(pages.read, 10)
+
+    def test_shutdown_when_the_caller_fails(self):
+        pages = Pages(1000)
+        with self.assertRaises(KeyError):
+            for _ in read_ahead(pages, 1, name='caller_error'):
+                raise KeyError('labeling failed')
+        for thread in reader_threads('caller_error'):
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        self.assertLess(pages.read, 10)
+
+
+class TestInstrumentedQueue(unittest.TestCase):
+
+    def test_stalls(self):
+        items = InstrumentedQueue('stalls', 1)
+        items.put(1)
+        items.get()
+        self.assertEqual(queue_stats.stats()['stalls_producer_stalls'], 0)
+        self.assertEqual(queue_stats.stats()['stalls_consumer_stalls'], 0)
+
+        # a get on the empty queue waits for the producer, a put on the full queue for the consumer
+        with self.assertRaises(queue.Empty):
+            items.get(timeout=0.01)
+        items.put(1)
+        with self.assertRaises(queue.Full):
+            items.put(2, timeout=0.01)
+        stats = queue_stats.stats()
+        self.assertEqual((stats['stalls_producer_stalls'], stats['stalls_consumer_stalls']), (1, 1))
+        self.assertGreater(stats['stalls_producer_wait'], 0)
+        self.assertGreater(stats['stalls_consumer_wait'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+from bson import ObjectId
+from pycoshark.mongomodels import Commit
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from records import record_type  # noqa: E402
+
+FIELDS = ('id', 'revision_hash', 'message', 'linked_issue_ids', 'parents', 'fixed_issue_ids')
+
+
+class TestRecords(unittest.TestCase):
+    """A record has to look like a document that was loaded with the same fields."""
+
+    def setUp(self):
+        self.son = {'_id': ObjectId(), 'revision_hash': 'a' * 40, 'message': 'fix the parser',
+                    'linked_issue_ids': [ObjectId()], 'parents': ['b' * 40], 'fixed_issue_ids': None}
+
+    def test_same_values_as_document(self):
+        record = record_type(Commit, FIELDS)(self.son)
+        document = Commit._from_son(self.son)
+        for field in FIELDS + ('szz_issue_ids', 'code_entity_states', 'author_id'):
+            self.assertEqual(getattr(record, field), getattr(document, field), field)
+
+    def test_equality(self):
+        record_type_ = record_type(Commit, FIELDS)
+        self.assertEqual(record_type_(self.son), record_type_(dict(self.son, message='other')))
+        self.assertEqual(len({record_type_(self.son), record_type_(self.son)}), 1)
+        self.assertNotEqual(record_type_(self.son), record_type_(dict(self.son, _id=ObjectId())))
+
+    def test_read_only(self):
+        record = record_type(Commit, FIELDS)(self.son)
+        with self.assertRaises(AttributeError):
+            record.message = 'changed'
+        with self.assertRaises(AttributeError):
+            record.not_a_field
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from smartshark_plugin import split_ranges, parse_shard  # noqa: E402
+
+
+class TestSplitRanges(unittest.TestCase):
+    """The ranges must cover every commit id exactly once and differ by at most one commit in size."""
+
+    def covered(self, commit_ids, ranges):
+        return [commit_id for first_id, last_id in ranges for commit_id in commit_ids
+                if first_id <= commit_id <= last_id]
+
+    def test_even_split(self):
+        self.assertEqual(split_ranges(list(range(9)), 3), [(0, 2), (3, 5), (6, 8)])
+
+    def test_rest_goes_to_the_first_ranges(self):
+        commit_ids = list(range(0, 20, 2))
+        ranges = split_ranges(commit_ids, 3)
+        self.assertEqual(ranges, [(0, 6), (8, 12), (14, 18)])
+        self.assertEqual(self.covered(commit_ids, ranges), commit_ids)
+
+    def test_more_ranges_than_commits(self):
+        self.assertEqual(split_ranges([1, 2], 5), [(1, 1), (2, 2)])
+
+    def test_no_commits(self):
+        self.assertEqual(split_ranges([], 4), [])
+
+    def test_single_range(self):
+        self.assertEqual(split_ranges(list(range(7)), 1), [(0, 6)])
+
+    def test_sizes(self):
+        for num_commits in range(0, 30):
+            for num in range(1, 8):
+                commit_ids = list(range(num_commits))
+                ranges = split_ranges(commit_ids, num)
+                self.assertEqual(self.covered(commit_ids, ranges), commit_ids)
+                sizes = [last_id - first_id + 1 for first_id, last_id in ranges]
+                if sizes:
+                    self.assertLessEqual(max(sizes) - min(sizes), 1)
+
+
+class TestParseShard(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(parse_shard('0/1'), (0, 1))
+        self.assertEqual(parse_shard('2/3'), (2, 3))
+        self.assertEqual(parse_shard(' 1 / 4 '), (1, 4))
+
+    def test_out_of_range(self):
+        for shard in ('3/3', '-1/3', '0/0', '1/-2'):
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+    def test_bad_format(self):
+        for shard in ('', '1', '1/2/3', 'a/b', '1/', '/2', '1.0/2'):
+            with self.assertRaises(ValueError):
+                parse_shard(shard)
+
+
+if __name__ == '__main__':
+    unittest.main()
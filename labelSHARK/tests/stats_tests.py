@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import unittest
+
+from pymongo import monitoring
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from stats import RunStatistics  # noqa: E402
+
+
+class TestRunStatistics(unittest.TestCase):
+    """The statistics of forked workers must only count what the workers added themselves."""
+
+    def setUp(self):
+        self.stats = RunStatistics()
+
+    @staticmethod
+    def snapshot(commits, commands, hits):
+        return {'approaches': {'szz': {'commits': commits, 'time': 1.0, 'commands': commands}}, 'commands': commands,
+                'counters': {'cache': {'size': 80, 'hits': hits, 'misses': 80}}}
+
+    def test_workers_add_their_own_share(self):
+        parent = self.snapshot(5, 3, 10)
+        # every worker starts with the statistics of the parent
+        workers = [self.snapshot(15, 4, 30), self.snapshot(25, 5, 40)]
+        merged = self.stats.merge([self.stats.subtract(worker, parent) for worker in workers] + [parent])
+        self.assertEqual(merged['approaches']['szz'], {'commits': 35, 'time': 1.0, 'commands': 6})
+        self.assertEqual(merged['commands'], 6)
+        self.assertEqual(merged['counters']['cache'], {'size': 80, 'hits': 60, 'misses': 80})
+
+    def test_concurrent_command_counts(self):
+        counter = self.stats._command_counter
+
+        def count():
+            for _ in range(20000):
+                counter.started(None)
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.counts[None], 80000)
+
+    def test_listener_registered_once(self):
+        self.stats.enable_command_monitoring()
+        self.stats.enable_command_monitoring()
+        listeners = monitoring._LISTENERS.command_listeners
+        self.assertEqual(sum(1 for listener in listeners if listener is self.stats._command_counter), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import namedtuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+# add ./labelSHARK to path so that we can import like we would do in an installation
+sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(1, os.path.abspath('./labelSHARK'))
+
+from incremental import LabelState  # noqa: E402
+from writer import MongoLabelWriter, JsonlLabelWriter, ParquetLabelWriter, pyarrow  # noqa: E402
+
+Commit = namedtuple('Commit', ['id', 'revision_hash', 'labels'])
+
+
+class TestFileSinks(unittest.TestCase):
+    """The file sinks have to write the labels of every commit, independent of the batch size."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.commits = [Commit(ObjectId(), '{:040x}'.format(i), {}) for i in range(25)]
+        self.labels = {c.id: [('szz_bugfix', i % 2 == 0), ('doc_javadoc', i % 3 == 0)] for i, c in
+                       enumerate(self.commits)}
+        # a commit without labels is skipped, a commit with only some labels is still written
+        self.labels[self.commits[3].id] = []
+        self.labels[self.commits[4].id] = [('szz_bugfix', True)]
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, writer_type, path, queue_depth=0):
+        with writer_type(path, batch_size=10, queue_depth=queue_depth) as writer:
+            for commit in self.commits:
+                writer.add(commit, self.labels[commit.id])
+        self.assertEqual(writer.written, 24)
+        self.assertEqual(writer.skipped, 1)
+
+    def expected(self):
+        return {str(c.id): dict(self.labels[c.id]) for c in self.commits if self.labels[c.id]}
+
+    def test_jsonl(self):
+        path = os.path.join(self.path, 'labels.jsonl')
+        self.write(JsonlLabelWriter, path, queue_depth=2)
+        with open(path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual({line['commit_id']: line['labels'] for line in lines}, self.expected())
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        path = os.path.join(self.path, 'labels.parquet')
+        self.write(ParquetLabelWriter, path)
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.num_row_groups, 3)
+        rows = parquet_file.read().to_pylist()
+        self.assertEqual({r['commit_id']: {k: v for k, v in r.items() if k not in ('commit_id', 'revision_hash')
+                                           and v is not None} for r in rows}, self.expected())
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_declared_labels(self):
+        # a declared label gets its column even if the first batch has no value for it, e.g., because the approach
+        # failed, an undeclared label that is not in the first batch is dropped
+        path = os.path.join(self.path, 'labels.parquet')
+        with ParquetLabelWriter(path, batch_size=10, label_keys=['szz_bugfix', 'refactoring_keyword']) as writer:
+            for i, commit in enumerate(self.commits):
+                labels = [('szz_bugfix', True)]
+                if i >= 10:
+                    labels += [('refactoring_keyword', True), ('doc_javadoc', True)]
+                writer.add(commit, labels)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column_names, ['commit_id', 'revision_hash', 'refactoring_keyword', 'szz_bugfix'])
+        self.assertEqual(table.column('refactoring_keyword').to_pylist(), [None] * 10 + [True] * 15)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_without_labels(self):
+        path = os.path.join(self.path, 'labels.parquet')
+        with ParquetLabelWriter(path, label_keys=['szz_bugfix']):
+            pass
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column_names, ['commit_id', 'revision_hash', 'szz_bugfix'])
+        self.assertEqual(table.num_rows, 0)
+
+
+
+class CommitCollection(object):
+    """Commit collection that records the bulk writes and fails the writes of some commits like an unordered bulk
+    write, i.e., every other operation is still written."""
+
+    def __init__(self, collection, failing_ids=()):
+        self.collection = collection
+        self.failing_ids = set(failing_ids)
+        self.ops = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.append(ops)
+        if not any(op._filter['_id'] in self.failing_ids for op in ops):
+            return self.collection.bulk_write(ops, ordered=ordered)
+        errors = []
+        for i, op in enumerate(ops):
+            if op._filter['_id'] in self.failing_ids:
+                errors.append({'index': i, 'code': 2, 'errmsg': 'label write failed'})
+            else:
+                self.collection.bulk_write([op])
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': 0, 'nUpserted': 0, 'nMatched': 0,
+                                  'nModified': len(ops) - len(errors), 'nRemoved': 0, 'upserted': []})
+
+
+class MockLabelState(LabelState):
+    """LabelState that writes the fingerprints to a mongomock collection."""
+
+    def __init__(self, vcs_system_id, collection):
+        super().__init__(vcs_system_id, full=True)
+        self._collection = collection
+
+    @property
+    def collection(self):
+        return self._collection
+
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class TestMongoLabelWriter(unittest.TestCase):
+    """Only changed labels are written and only the fingerprints of written labels are stored."""
+
+    def setUp(self):
+        db = mongomock.MongoClient().labelshark
+        self.commits = [Commit(ObjectId(), '{:040x}'.format(i), {'szz_bugfix': True, 'doc_javadoc': 1})
+                        for i in range(6)]
+        db.commit.insert_many([{'_id': c.id, 'labels': dict(c.labels)} for c in self.commits])
+        self.db = db
+        self.label_state = MockLabelState(ObjectId(), db.label_state)
+
+    def write(self, labels, failing_ids=()):
+        collection = CommitCollection(self.db.commit, failing_ids)
+        with MongoLabelWriter(collection, batch_size=10, label_state=self.label_state) as writer:
+            for commit in self.commits:
+                self.label_state.record(commit.id, 'szz', 'fingerprint')
+                writer.add(commit, labels[commit.id])
+        return writer, collection
+
+    def stored_labels(self):
+        return {doc['_id']: doc['labels'] for doc in self.db.commit.find()}
+
+    def fingerprints(self):
+        return {doc['_id']: doc['fingerprints'] for doc in self.db.label_state.find()}
+
+    def test_only_changed_labels(self):
+        # True and 1 are equal, but not the same label
+        labels = {c.id: [('szz_bugfix', True), ('doc_javadoc', True), ('refactoring_keyword', False)]
+                  for c in self.commits}
+        writer, collection = self.write(labels)
+        self.assertEqual(len(collection.ops), 1)
+        self.assertEqual([op._doc for op in collection.ops[0]],
+                         [{'$set': {'labels.doc_javadoc': True, 'labels.refactoring_keyword': False}}] * 6)
+        self.assertEqual(set(map(repr, self.stored_labels().values())),
+                         {repr({'szz_bugfix': True, 'doc_javadoc': True, 'refactoring_keyword': False})})
+        self.assertEqual((writer.written, writer.unchanged, writer.failed), (6, 0, 0))
+
+    def test_unchanged_commits(self):
+        labels = {c.id: [('szz_bugfix', True), ('doc_javadoc', 1)] for c in self.commits}
+        writer, collection = self.write(labels)
+        # nothing is written, but the labels are up to date for the next run
+        self.assertEqual(collection.ops, [])
+        self.assertEqual((writer.written, writer.unchanged, writer.failed), (0, 6, 0))
+        self.assertEqual(self.fingerprints(), {c.id: {'szz': 'fingerprint'} for c in self.commits})
+
+    def test_failed_writes(self):
+        # the unchanged commit shifts the index of the later writes in the bulk write
+        labels = {c.id: [('szz_bugfix', False)] for c in self.commits}
+        labels[self.commits[1].id] = [('szz_bugfix', True)]
+        failing_ids = [self.commits[2].id, self.commits[4].id]
+        with self.assertLogs('MongoLabelWriter', level='ERROR') as logs:
+            writer, collection = self.write(labels, failing_ids)
+        self.assertEqual(len(collection.ops[0]), 5)
+        self.assertEqual((writer.written, writer.unchanged, writer.failed), (3, 1, 2))
+        self.assertIn('writing labels failed for 2 of 5 commits', logs.output[0])
+        self.assertTrue(any(str(self.commits[4].id) in line for line in logs.output[1:]))
+
+        stored = self.stored_labels()
+        self.assertEqual([stored[c.id]['szz_bugfix'] for c in self.commits], [False, True, True, False, True, False])
+        # the failed commits keep their old fingerprints, so that they are labeled again
+        self.assertEqual(set(self.fingerprints()), {c.id for c in self.commits} - set(failing_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
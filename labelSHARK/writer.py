@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The writer module buffers the collected labels and writes them in batches to a sink.
+
+The labels are written to the MongoDB by default (MongoLabelWriter), they can also be streamed to a JSON lines
+file (JsonlLabelWriter) or a Parquet file (ParquetLabelWriter), e.g., to export the label table of a project.
+"""
+
+import json
+import logging
+import threading
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from pipeline import InstrumentedQueue
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class LabelWriter(object):
+    """Write buffer for commit labels, base class of the sinks.
+
+    Labels are collected per commit and written in batches once the buffer reaches batch_size. If a
+    queue_depth is given, the batches are written in a background thread while the next labels are computed.
+    Can be used as a context manager which writes the remaining labels on exit.
+
+    Subclasses implement _entry, which converts the labels of a commit into what is buffered, and _write, which
+    writes a batch of buffered entries.
+    """
+
+    def __init__(self, batch_size=1000, label_state=None, queue_depth=0):
+        """
+        :param int batch_size: number of commits which are written at once
+        :param label_state: optional LabelState, the recorded fingerprints are popped when the labels are added
+        :param int queue_depth: maximum number of batches waiting for the background thread, 0 writes in the
+                                calling thread
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self._batch_size = batch_size
+        self._label_state = label_state
+        self._entries = []
+        self._commit_ids = []
+        self._fingerprints = []
+        self.written = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.failed = 0
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if queue_depth > 0:
+            self._queue = InstrumentedQueue('write', queue_depth)
+            self._thread = threading.Thread(target=self._run, name='labelSHARK-write', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def check(cls):
+        """Raises an ImportError if a dependency of the sink is missing."""
+        pass
+
+    def add(self, commit, labels):
+        """Adds the labels of one commit to the buffer.
+
+        :param commit: the commit, needs the id, the revision_hash and the stored labels
+        :param list labels: list of (approach_key, value) tuples
+        """
+        fingerprints = self._label_state.pop(commit.id) if self._label_state is not None else None
+        if not labels:
+            self.skipped += 1
+            return
+        self._entries.append(self._entry(commit, labels))
+        self._commit_ids.append(commit.id)
+        self._fingerprints.append(fingerprints)
+        if len(self._entries) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes every buffered entry at once."""
+        if not self._entries:
+            return
+        entries, commit_ids, fingerprints = self._entries, self._commit_ids, self._fingerprints
+        self._entries, self._commit_ids, self._fingerprints = [], [], []
+        self._submit(self._write, entries, commit_ids, fingerprints)
+
+    def call_after_writes(self, func, *args):
+        """Calls the function once every label that was added before is written, e.g., to advance a checkpoint.
+
+        The function is not called if a write raised an exception.
+        """
+        self.flush()
+        self._submit(func, *args)
+
+    def close(self):
+        """Writes the remaining labels and waits for the background thread."""
+        try:
+            self.flush()
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+            self._raise_error()
+        finally:
+            self._close()
+
+    def _submit(self, func, *args):
+        if self._queue is None:
+            func(*args)
+        else:
+            self._raise_error()
+            self._queue.put((func, args))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # after an error nothing is written anymore, the error is raised in the labeling thread
+            if self._error is None:
+                func, args = item
+                try:
+                    func(*args)
+                except Exception as e:
+                    self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _entry(self, commit, labels):
+        raise NotImplementedError()
+
+    def _write(self, entries, commit_ids, fingerprints):
+        raise NotImplementedError()
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class MongoLabelWriter(LabelWriter):
+    """Writes the labels to the commits in the MongoDB.
+
+    Labels are collected as UpdateOne operations and flushed as unordered bulk writes. Only the labels that
+    differ from the stored labels of the commit are written and commits without changes are not written at all.
+    The fingerprints of the label state are written after the labels.
+    """
+
+    def __init__(self, collection, batch_size=1000, label_state=None, queue_depth=0):
+        """
+        :param obj collection: pymongo collection of the commits, e.g., Commit._get_collection()
+        :param int batch_size: number of commits which are written with one bulk operation
+        :param label_state: optional LabelState, the recorded fingerprints are written after the labels
+        :param int queue_depth: maximum number of bulk writes waiting for the background thread, 0 writes in the
+                                calling thread
+        """
+        super().__init__(batch_size, label_state, queue_depth)
+        self._collection = collection
+
+    def _entry(self, commit, labels):
+        if commit.labels:
+            labels = [(k, v) for k, v in labels if not _is_stored(commit.labels, k, v)]
+        if not labels:
+            # the fingerprints of unchanged labels are still written
+            self.unchanged += 1
+            return None
+        update = {'$set': {'labels.{}'.format(k): v for k, v in labels}}
+        return UpdateOne({'_id': commit.id}, update, upsert=True)
+
+    def _write(self, ops, commit_ids, fingerprints):
+        # index of every label write in ops, unchanged commits have no write
+        positions = [i for i, op in enumerate(ops) if op is not None]
+        failed = set()
+        if positions:
+            try:
+                result = self._collection.bulk_write([ops[i] for i in positions], ordered=False)
+                self.written += len(positions)
+                self._log.debug('wrote labels for {} commits ({} modified)'.format(len(positions),
+                                                                                   result.modified_count))
+            except BulkWriteError as e:
+                # unordered: everything except the reported operations went through
+                errors = e.details.get('writeErrors', [])
+                self.written += len(positions) - len(errors)
+                self.failed += len(errors)
+                self._log.error('writing labels failed for {} of {} commits'.format(len(errors), len(positions)))
+                for error in errors:
+                    failed.add(positions[error['index']])
+                    self._log.error('commit {}: {}'.format(commit_ids[positions[error['index']]], error.get('errmsg')))
+
+        # fingerprints only for written labels, otherwise the commit would never be labeled again
+        if self._label_state is not None:
+            state_ops = [self._label_state.update_op(commit_ids[i], fingerprints[i])
+                         for i in range(len(commit_ids)) if i not in failed and fingerprints[i]]
+            if state_ops:
+                try:
+                    self._label_state.collection.bulk_write(state_ops, ordered=False)
+                except BulkWriteError as e:
+                    self._log.error('writing label fingerprints failed for {} of {} commits'.format(
+                        len(e.details.get('writeErrors', [])), len(state_ops)))
+
+
+class JsonlLabelWriter(LabelWriter):
+    """Streams the labels to a JSON lines file with one object per commit.
+
+    Every line has the commit_id, the revision_hash and the labels of the commit, e.g.,
+    {"commit_id": "5a...", "revision_hash": "3f...", "labels": {"adjustedszz_bugfix": true}}.
+    """
+
+    def __init__(self, path, batch_size=1000, label_state=None, queue_depth=0):
+        """
+        :param str path: path of the JSON lines file, an existing file is overwritten
+        :param int batch_size: number of commits which are written at once
+        :param label_state: optional LabelState, the recorded fingerprints are only popped
+        :param int queue_depth: maximum number of batches waiting for the background thread, 0 writes in the
+                                calling thread
+        """
+        self._file = open(path, 'w')
+        super().__init__(batch_size, label_state, queue_depth)
+
+    def _entry(self, commit, labels):
+        return json.dumps({'commit_id': str(commit.id), 'revision_hash': commit.revision_hash, 'labels': dict(labels)})
+
+    def _write(self, entries, commit_ids, fingerprints):
+        self._file.write('\n'.join(entries))
+        self._file.write('\n')
+        self._file.flush()
+        self.written += len(entries)
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetLabelWriter(LabelWriter):
+    """Writes the labels as a commits x labels table to a Parquet file, every batch is one row group.
+
+    The table has the columns commit_id and revision_hash and one column per label, commits without a label
+    have a null value in its column. The label columns are the label_keys declared by the approaches and every
+    other label of the first batch, the schema of a Parquet file is fixed once the first row group is written.
+    Undeclared labels that are not in the first batch are dropped with an error.
+    """
+
+    def __init__(self, path, batch_size=1000, label_state=None, queue_depth=0, label_keys=None):
+        """
+        :param str path: path of the Parquet file, an existing file is overwritten
+        :param int batch_size: number of commits of every row group
+        :param label_state: optional LabelState, the recorded fingerprints are only popped
+        :param int queue_depth: maximum number of batches waiting for the background thread, 0 writes in the
+                                calling thread
+        :param list label_keys: keys of the labels that always get a column, see LabelSHARK.label_keys
+        """
+        self.check()
+        self._path = path
+        self._label_keys = list(label_keys or [])
+        self._parquet_writer = None
+        self._schema = None
+        self._dropped = set()
+        super().__init__(batch_size, label_state, queue_depth)
+
+    @classmethod
+    def check(cls):
+        if pyarrow is None:
+            raise ImportError('the parquet sink requires pyarrow, e.g., pip install pyarrow')
+
+    def _entry(self, commit, labels):
+        return str(commit.id), commit.revision_hash, dict(labels)
+
+    def _write(self, entries, commit_ids, fingerprints):
+        if self._schema is None:
+            self._schema = self._create_schema(entries)
+            self._parquet_writer = pyarrow.parquet.ParquetWriter(self._path, self._schema)
+        columns = {'commit_id': [entry[0] for entry in entries], 'revision_hash': [entry[1] for entry in entries]}
+        for name in self._schema.names[2:]:
+            columns[name] = [entry[2].get(name) for entry in entries]
+        for entry in entries:
+            for name in entry[2].keys() - self._schema.names:
+                if name not in self._dropped:
+                    self._dropped.add(name)
+                    self._log.error('label {} is neither declared nor in the first row group, its values are dropped'
+                                    .format(name))
+        self._parquet_writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._schema))
+        self.written += len(entries)
+
+    def _create_schema(self, entries):
+        names = sorted(set(self._label_keys).union(name for entry in entries for name in entry[2]))
+        fields = [pyarrow.field('commit_id', pyarrow.string()), pyarrow.field('revision_hash', pyarrow.string())]
+        for name in names:
+            label_type = pyarrow.array([entry[2].get(name) for entry in entries]).type
+            # labels without a value in the first batch, e.g., of an approach that failed for every commit, are
+            # assumed to be boolean like every other label
+            fields.append(pyarrow.field(name, pyarrow.bool_() if pyarrow.types.is_null(label_type) else label_type))
+        return pyarrow.schema(fields)
+
+    def _close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        elif self._schema is None:
+            # no labels at all, an empty file with the commit columns and the declared label columns
+            pyarrow.parquet.write_table(self._create_schema([]).empty_table(), self._path)
+
+
+SINKS = {'mongo': MongoLabelWriter, 'jsonl': JsonlLabelWriter, 'parquet': ParquetLabelWriter}
+
+
+def _is_stored(stored_labels, key, value):
+    # True and 1 are equal in python, but not in the MongoDB
+    return key in stored_labels and stored_labels[key] == value and type(stored_labels[key]) is type(value)
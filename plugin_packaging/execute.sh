@@ -34,4 +34,9 @@ if [ ! -z ${9+x} ] && [ ${9} != "None" ]; then
     COMMAND="$COMMAND --log-level ${9}"
 fi
 
+# slurm array jobs label one commit range each
+if [ ! -z "$SLURM_ARRAY_TASK_COUNT" ]; then
+    COMMAND="$COMMAND --shard $((SLURM_ARRAY_TASK_ID - SLURM_ARRAY_TASK_MIN))/$SLURM_ARRAY_TASK_COUNT"
+fi
+
 $COMMAND
@@ -17,6 +17,8 @@ setup(
     description='Commit labeling for smartSHARK.',
     install_requires=['pandas', 'mongoengine', 'pymongo', 'pycoshark>=1.3.1', 'skift',
                       'fasttext @ https://github.com/facebookresearch/fastText/tarball/master#egg-fasttext-0.10.0',],
+    extras_require={'parquet': ['pyarrow'], 'test': ['mongomock']},
+    tests_require=['mongomock'],
     dependency_links=['https://github.com/facebookresearch/fastText/tarball/master#egg-fasttext-0.10.0'],
     author='atrautsch',
     author_email='alexander.trautsch@cs.uni-goettingen.de',